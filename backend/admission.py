@@ -0,0 +1,296 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import record_admission_queue_depth, record_admission_shed, record_admission_wait
+from resilience import UpstreamOverloadedError
+
+# 各组件的优先级，数字越小越先放行：意图识别便宜且在交互路径上；
+# 菜谱生成和对话摘要所在的请求已经完成了前面的调用，优先让它们做完，
+# 而不是被新请求的需求解析挤掉；图片生成最慢也最不急
+PRIORITIES = {
+    "intent": 0,
+    "generator": 1,
+    "summarizer": 1,
+    "parser": 2,
+    "optimizer": 2,
+    "vision": 2,
+    "image": 3,
+}
+DEFAULT_PRIORITY = 2
+# 还没有实际用量时，每次调用预估消耗的 token 数
+INITIAL_TOKEN_ESTIMATE = 1000
+
+
+class TokenBucket:
+    """
+    令牌桶：每分钟补充 per_minute 个令牌，最多积累 burst_s 秒的量
+
+    per_minute 为 0 时不限制。放行时按预估量扣除，拿到实际用量后再多退少补，
+    所以余量可能暂时为负。
+    """
+
+    def __init__(self, per_minute: float, burst_s: float):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60
+        self.capacity = max(self.rate * burst_s, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """还要等多少秒才有 amount 个令牌（超过桶容量的按装满计算）"""
+        if not self.per_minute:
+            return 0.0
+        self._refill()
+        return max(min(amount, self.capacity) - self.level, 0.0) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.per_minute:
+            self._refill()
+            self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        if self.per_minute:
+            self._refill()
+            self.level = min(self.level + amount, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.level + (now - self.updated) * self.rate, self.capacity)
+        self.updated = now
+
+
+class AdmissionScheduler:
+    """
+    一个上游服务商的调用准入：按每分钟请求数和 token 数限流，超出时按优先级排队
+
+    - 没有排队且两个令牌桶都有余量时直接放行，否则进入按 (优先级, 到达顺序) 排序的队列，
+      队首等到令牌足够时放行；队首没放行前后面的调用也不放行，避免大调用一直被小调用插队
+    - 队列满时，新调用比队列中最低优先级的调用更重要则挤掉后者，否则直接拒绝；
+      排队超过 max_wait_s 或调用方剩余的时间也会被拒绝。被拒绝时抛出 UpstreamOverloadedError（429），
+      retry_after 为按当前排队估算的等待时间
+    - token 数按组件最近的实际用量预估，调用返回后用实际用量多退少补
+    - 上游返回 429 时暂停放行 Retry-After 秒，让排队的调用等待，而不是继续打到上游
+
+    限额是单个进程的；多个实例或 worker 共用一个账号时，按账号限额除以实例数配置。
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        requests_per_min: float,
+        tokens_per_min: float,
+        burst_s: float,
+        max_queue: int,
+        max_wait_s: float,
+    ):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_min, burst_s)
+        self.tokens = TokenBucket(tokens_per_min, burst_s)
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        # 堆中的元素：(优先级, 序号, 组件, 预估 token 数, future)
+        self._queue: List[Tuple[int, int, str, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused_until = 0.0
+        self._estimates: Dict[str, float] = {}
+        self.admitted = 0
+        self.queued = 0
+        self.throttled = 0
+        self.total_wait_s = 0.0
+        self.shed: Dict[str, int] = {}
+
+    async def acquire(self, component: str, timeout: Optional[float] = None) -> float:
+        """
+        等待放行一次 component 的上游调用
+
+        Args:
+            timeout: 调用方最多能等多久（秒），不超过 max_wait_s
+
+        Returns:
+            这次调用预扣的 token 数，调用返回后传给 settle
+
+        Raises:
+            UpstreamOverloadedError: 队列已满、被更高优先级的调用挤掉或排队超时
+        """
+        tokens = self.estimate(component)
+        if not self._queue and self._wait_time(tokens) == 0:
+            self._admit(component, tokens, 0.0)
+            return tokens
+
+        priority = PRIORITIES.get(component, DEFAULT_PRIORITY)
+        if len(self._queue) >= self.max_queue:
+            worst = max(self._queue)
+            if worst[0] <= priority:
+                raise self._reject(component, "queue_full")
+            worst[4].set_exception(self._reject(worst[2], "evicted"))
+            self._remove(worst)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), component, tokens, future)
+        heapq.heappush(self._queue, entry)
+        self.queued += 1
+        self._dispatch()
+
+        wait = self.max_wait_s if timeout is None else min(timeout, self.max_wait_s)
+        start = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=max(wait, 0.0))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # 已经放行但调用方不再需要，退回预扣的令牌
+                self.settle(component, tokens, 0)
+            else:
+                self._remove(entry)
+            raise
+        if not future.done():
+            self._remove(entry)
+            raise self._reject(component, "wait_timeout")
+        future.result()
+        self._admit(component, tokens, time.monotonic() - start, already_taken=True)
+        return tokens
+
+    def try_acquire(self, component: str) -> Optional[float]:
+        """不排队：有余量时放行并返回预扣的 token 数，否则返回 None（用于对冲这类可有可无的调用）"""
+        tokens = self.estimate(component)
+        if self._queue or self._wait_time(tokens) > 0:
+            return None
+        self._admit(component, tokens, 0.0)
+        return tokens
+
+    def settle(self, component: str, reserved: float, used: Optional[float]) -> None:
+        """
+        用实际用量修正预扣的 token 数，并更新这个组件的预估值
+
+        used 为 None 表示拿不到实际用量（例如流式调用），按预估值计算
+        """
+        if used is None:
+            return
+        if used > 0:
+            previous = self._estimates.get(component)
+            self._estimates[component] = used if previous is None else previous * 0.8 + used * 0.2
+        self.tokens.give_back(reserved - used)
+        if reserved > used:
+            self._dispatch()
+
+    def throttle(self, retry_after: float) -> None:
+        """上游返回 429 时调用，retry_after 秒内不再放行"""
+        self.throttled += 1
+        until = time.monotonic() + retry_after
+        if until > self._paused_until:
+            self._paused_until = until
+            print(f"🚦 上游 {self.provider} 限流，{retry_after:.1f} 秒内暂停放行")
+
+    def estimate(self, component: str) -> float:
+        """component 一次调用预估消耗的 token 数"""
+        return self._estimates.get(component, INITIAL_TOKEN_ESTIMATE)
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self.admitted
+        return {
+            "requests_per_min": self.requests.per_minute,
+            "tokens_per_min": self.tokens.per_minute,
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "admitted": admitted,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "shed": dict(self.shed),
+            "avg_wait_ms": round(self.total_wait_s / admitted * 1000, 1) if admitted else None,
+            "token_estimates": {name: round(value) for name, value in self._estimates.items()},
+        }
+
+    def _wait_time(self, tokens: float) -> float:
+        return max(
+            self._paused_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+            0.0,
+        )
+
+    def _admit(self, component: str, tokens: float, waited_s: float, already_taken: bool = False) -> None:
+        if not already_taken:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        self.admitted += 1
+        self.total_wait_s += waited_s
+        record_admission_wait(self.provider, component, waited_s)
+
+    def _dispatch(self) -> None:
+        """放行队首所有令牌已经足够的调用，否则定时到令牌足够时再检查"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            _, _, _, tokens, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                break
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            future.set_result(None)
+        record_admission_queue_depth(self.provider, len(self._queue))
+
+    def _remove(self, entry: tuple) -> None:
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        if not entry[4].done():
+            entry[4].cancel()
+        # 队首可能换了一个，重新检查
+        self._dispatch()
+
+    def _reject(self, component: str, reason: str) -> UpstreamOverloadedError:
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        record_admission_shed(self.provider, component, reason)
+        print(f"🚦 {self.provider} 限流，拒绝 {component} 的调用（{reason}）")
+        return UpstreamOverloadedError("请求过多，请稍后再试", self._retry_after())
+
+    def _retry_after(self) -> float:
+        """按当前排队估算还要多久才能放行新的调用"""
+        backlog = self._wait_time(0)
+        if self.requests.rate:
+            backlog += len(self._queue) / self.requests.rate
+        if self.tokens.rate:
+            queued_tokens = sum(entry[3] for entry in self._queue)
+            backlog = max(backlog, queued_tokens / self.tokens.rate)
+        return max(backlog, 1.0)
+
+
+_SCHEDULERS: Dict[str, AdmissionScheduler] = {}
+
+
+def get_scheduler(provider: str) -> AdmissionScheduler:
+    """
+    返回服务商（openai、dashscope）的准入调度器，同一个服务商的所有组件共用
+
+    限额读取 RATE_LIMIT_<服务商大写>_RPM / _TPM，默认为 0（不按限额限流，只在上游返回 429 后暂停放行）；
+    账号的实际限额因等级而异，需要显式配置。排队读取 ADMISSION_QUEUE_SIZE、ADMISSION_MAX_WAIT_S
+    """
+    if provider not in _SCHEDULERS:
+        prefix = f"RATE_LIMIT_{provider.upper()}"
+        _SCHEDULERS[provider] = AdmissionScheduler(
+            provider,
+            requests_per_min=float(os.getenv(f"{prefix}_RPM", "0")),
+            tokens_per_min=float(os.getenv(f"{prefix}_TPM", "0")),
+            burst_s=float(os.getenv("RATE_LIMIT_BURST_S", "10")),
+            max_queue=int(os.getenv("ADMISSION_QUEUE_SIZE", "100")),
+            max_wait_s=float(os.getenv("ADMISSION_MAX_WAIT_S", "10")),
+        )
+    return _SCHEDULERS[provider]
+
+
+def admission_stats() -> Optional[Dict[str, Any]]:
+    """各服务商的限额、排队数、放行和拒绝次数，还没有调用过上游时返回 None"""
+    if not _SCHEDULERS:
+        return None
+    return {provider: scheduler.stats() for provider, scheduler in _SCHEDULERS.items()}
@@ -0,0 +1,147 @@
+"""
+流量突增时的上游限流排队：准入调度器对 429 和各接口延迟的影响
+
+模拟上游按 MOCK_RATE_LIMIT_RPM 限流（10 秒滑动窗口，超出时返回 429 和 Retry-After: 1）。
+同时发起 --spike 个 /api/v1/recipes/generate 请求（每个两次上游调用）和 --intents 个需要调用
+LLM 的 /api/v1/intent/analyze 请求，分别以两种配置启动后端：
+
+- off: 不按限额限流（RATE_LIMIT_OPENAI_RPM=0），所有调用直接打到上游，收到 429 后才暂停放行
+- admission: 按上游限额的 90% 限流，超出的调用按优先级排队（意图识别优先），队列满时直接返回 429
+
+输出各接口的状态码分布和 p50/p95 延迟、上游收到的调用数和返回 429 的次数，以及准入调度器的排队和拒绝次数。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_admission --spike 100 --intents 40 --upstream-rpm 600
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.bench_suite import NO_CACHE_ENV, percentile
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+CLIENT_TIMEOUT_S = 30
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, n: int) -> tuple:
+    """返回 (接口, 状态码或 "client_timeout", 耗时秒)"""
+    start = time.perf_counter()
+    try:
+        if endpoint == "generate":
+            response = await client.post(
+                "/api/v1/recipes/generate",
+                json={"description": f"家里有牛肉和洋葱，第{n}份", "use_cache": False},
+            )
+        else:
+            # 词典和本地模型都判断不了的消息，会调用 LLM
+            response = await client.post("/api/v1/intent/analyze", json={"message": f"帮我看看这个{n}"})
+        status: Any = response.status_code
+    except httpx.TimeoutException:
+        status = "client_timeout"
+    return endpoint, status, time.perf_counter() - start
+
+
+async def run_spike(spike: int, intents: int) -> Dict[str, Any]:
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{APP_PORT}",
+        timeout=CLIENT_TIMEOUT_S,
+        limits=httpx.Limits(max_connections=None),
+    ) as client, httpx.AsyncClient(base_url=f"http://127.0.0.1:{MOCK_PORT}") as mock:
+        before = (await mock.get("/mock/stats")).json()
+        calls = [send(client, "generate", n) for n in range(spike)]
+        # 意图识别请求均匀穿插在突增的请求中
+        step = max(spike // max(intents, 1), 1)
+        for i in range(intents):
+            calls.insert(i * (step + 1), send(client, "intent", i))
+        results: List[tuple] = await asyncio.gather(*calls)
+        after = (await mock.get("/mock/stats")).json()
+        stats = (await client.get("/api/v1/stats")).json()
+
+    report: Dict[str, Any] = {
+        "upstream_calls": after["chat_completions"] - before["chat_completions"],
+        "upstream_429": after["rate_limited"] - before["rate_limited"],
+        "admission": (stats.get("admission") or {}).get("openai"),
+    }
+    for endpoint in ("generate", "intent"):
+        rows = [(status, elapsed) for name, status, elapsed in results if name == endpoint]
+        latencies = [elapsed for _, elapsed in rows]
+        report[endpoint] = {
+            "statuses": dict(Counter(status for status, _ in rows)),
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+        }
+    return report
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--spike", type=int, default=100, help="同时发起的菜谱生成请求数")
+    arg_parser.add_argument("--intents", type=int, default=40, help="同时发起的意图识别请求数")
+    arg_parser.add_argument("--upstream-rpm", type=int, default=600, help="模拟上游的每分钟请求数限额")
+    arg_parser.add_argument("--latency-ms", default="300", help="模拟上游延迟")
+    args = arg_parser.parse_args()
+
+    configs = {
+        "off": {"RATE_LIMIT_OPENAI_RPM": "0", "RATE_LIMIT_OPENAI_TPM": "0"},
+        "admission": {
+            "RATE_LIMIT_OPENAI_RPM": str(int(args.upstream_rpm * 0.9)),
+            "RATE_LIMIT_OPENAI_TPM": "0",
+        },
+    }
+    mock_process = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={"MOCK_LATENCY_MS": args.latency_ms, "MOCK_RATE_LIMIT_RPM": str(args.upstream_rpm)},
+    )
+    reports = {}
+    try:
+        for name, config in configs.items():
+            env = {
+                **mock_upstream_env(),
+                **NO_CACHE_ENV,
+                # 让意图识别请求都走 LLM
+                "INTENT_MODEL_THRESHOLD": "1.01",
+                **config,
+            }
+            app = start_server("main:app", APP_PORT, env=env)
+            try:
+                reports[name] = asyncio.run(run_spike(args.spike, args.intents))
+            finally:
+                stop_server(app)
+            # 等上游的限流窗口过去，两种配置从相同的状态开始
+            time.sleep(10)
+    finally:
+        stop_server(mock_process)
+
+    print(f"{'配置':<10} {'接口':<9} {'p50 ms':>8} {'p95 ms':>8}  状态码")
+    for name, report in reports.items():
+        for endpoint in ("generate", "intent"):
+            result = report[endpoint]
+            print(
+                f"{name:<12} {endpoint:<10} {result['p50'] * 1000:>8.0f} {result['p95'] * 1000:>8.0f}  "
+                f"{result['statuses']}"
+            )
+    print()
+    for name, report in reports.items():
+        admission = report["admission"] or {}
+        print(
+            f"{name}: 上游调用 {report['upstream_calls']} 次，其中 429 {report['upstream_429']} 次；"
+            f"排队 {admission.get('queued', 0)} 次，拒绝 {admission.get('shed') or {}}，"
+            f"平均排队 {admission.get('avg_wait_ms') or 0:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
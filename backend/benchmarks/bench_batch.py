@@ -0,0 +1,96 @@
+"""
+批量生成与逐个调用 /api/v1/recipes/generate 的耗时对比
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_batch --items 50 --concurrency 1,8,16 --latency-ms 500
+"""
+
+import argparse
+import json
+import time
+
+import httpx
+
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+BASE_URL = f"http://127.0.0.1:{APP_PORT}"
+
+
+def descriptions(count: int, run: str) -> list:
+    # 每轮、每个条目的描述都不相同，避免命中需求缓存或被请求合并
+    return [f"我有牛肉和洋葱，{run}第{i}道菜，半小时内" for i in range(count)]
+
+
+def run_sequential(items: list) -> float:
+    start = time.perf_counter()
+    with httpx.Client(base_url=BASE_URL, timeout=120) as client:
+        for description in items:
+            client.post(
+                "/api/v1/recipes/generate",
+                json={"description": description, "use_cache": False},
+            ).raise_for_status()
+    return time.perf_counter() - start
+
+
+def run_batch(items: list, concurrency: int) -> dict:
+    start = time.perf_counter()
+    first_result = None
+    summary = {}
+    with httpx.stream(
+        "POST",
+        f"{BASE_URL}/api/v1/recipes/generate-batch",
+        json={"items": items, "concurrency": concurrency, "use_cache": False},
+        timeout=600,
+    ) as response:
+        for line in response.iter_lines():
+            if first_result is None:
+                first_result = time.perf_counter() - start
+            data = json.loads(line)
+            if data.get("done"):
+                summary = data
+    return {
+        "elapsed_s": time.perf_counter() - start,
+        "first_result_s": first_result,
+        "failed": summary.get("failed"),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--items", type=int, default=50)
+    arg_parser.add_argument("--concurrency", default="1,8,16")
+    arg_parser.add_argument("--latency-ms", default="500", help="模拟上游延迟")
+    args = arg_parser.parse_args()
+
+    mock = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={"MOCK_LATENCY_MS": args.latency_ms},
+    )
+    app = start_server("main:app", APP_PORT, env=mock_upstream_env())
+
+    try:
+        print(f"条目数: {args.items}  模拟延迟: {args.latency_ms}ms")
+        print(f"{'方式':<14} {'总耗时(s)':>10} {'首个结果(s)':>12} {'失败':>6}")
+        sequential = run_sequential(descriptions(args.items, "逐个"))
+        print(f"{'逐个调用':<14} {sequential:>10.2f} {'-':>12} {0:>6}")
+        for level in [int(level) for level in args.concurrency.split(",")]:
+            result = run_batch(descriptions(args.items, f"并发{level}"), level)
+            print(
+                f"{f'批量 并发{level}':<14} {result['elapsed_s']:>10.2f} "
+                f"{result['first_result_s']:>12.2f} {result['failed']:>6}"
+            )
+    finally:
+        stop_server(app)
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+请求合并（single-flight）效果测试
+
+同时发出一批完全相同的请求，统计模拟上游实际收到的调用次数。
+分别在开启和关闭合并（SINGLE_FLIGHT_ENABLED）的情况下各启动一次后端。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_coalescing --burst 20 --latency-ms 300
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+SAMPLE_RECIPE = {
+    "dish_name": "洋葱炒牛肉",
+    "ingredients": [{"name": "牛肉", "amount": 300, "unit": "g"}],
+    "instructions": [{"step": 1, "description": "牛肉切片炒熟。"}],
+}
+
+# 每个端点的请求体；generate 关闭缓存，确保每一批都需要调用上游
+ENDPOINTS = {
+    "generate": ("/api/v1/recipes/generate", {"description": "我有牛肉和洋葱，半小时内", "use_cache": False}),
+    "optimize": (
+        "/api/v1/recipes/optimize",
+        {"current_recipe": SAMPLE_RECIPE, "user_request": "少放点油", "conversation_history": []},
+    ),
+    # 本地分类器无法确定、需要调用 LLM 的消息
+    "intent": ("/api/v1/intent/analyze", {"message": "能推荐个汤吗"}),
+}
+
+
+async def upstream_calls(client: httpx.AsyncClient) -> int:
+    response = await client.get(f"http://127.0.0.1:{MOCK_PORT}/mock/stats")
+    return response.json()["chat_completions"]
+
+
+async def run_burst(endpoint: str, burst: int) -> dict:
+    path, payload = ENDPOINTS[endpoint]
+    async with httpx.AsyncClient(timeout=120) as client:
+        before = await upstream_calls(client)
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *[
+                client.post(f"http://127.0.0.1:{APP_PORT}{path}", json=payload)
+                for _ in range(burst)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+        after = await upstream_calls(client)
+
+    return {
+        "elapsed_s": elapsed,
+        "upstream_calls": after - before,
+        "failures": sum(1 for r in responses if r.status_code != 200),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--burst", type=int, default=20, help="每批同时发出的相同请求数")
+    arg_parser.add_argument("--latency-ms", default="300", help="模拟上游延迟")
+    args = arg_parser.parse_args()
+
+    mock = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={"MOCK_LATENCY_MS": args.latency_ms},
+    )
+    try:
+        print(f"每批 {args.burst} 个相同请求  模拟延迟: {args.latency_ms}ms")
+        print(f"{'合并':>6} {'端点':>10} {'上游调用':>8} {'耗时(s)':>8} {'失败':>4}")
+        for enabled in ("false", "true"):
+            app = start_server(
+                "main:app",
+                APP_PORT,
+                env={**mock_upstream_env(), "SINGLE_FLIGHT_ENABLED": enabled},
+            )
+            try:
+                for endpoint in ENDPOINTS:
+                    result = asyncio.run(run_burst(endpoint, args.burst))
+                    print(
+                        f"{enabled:>6} {endpoint:>10} {result['upstream_calls']:>8} "
+                        f"{result['elapsed_s']:>8.2f} {result['failures']:>4}"
+                    )
+                if enabled == "true":
+                    stats = httpx.get(f"http://127.0.0.1:{APP_PORT}/api/v1/stats").json()
+                    print(f"合并计数: {stats['single_flight']}")
+            finally:
+                stop_server(app)
+    finally:
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
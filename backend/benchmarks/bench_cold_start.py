@@ -0,0 +1,189 @@
+"""
+Lambda 冷启动耗时
+
+每次测量启动一个全新的 Python 解释器（相当于一个新的 Lambda 执行环境），依次记录：
+
+- import：导入 lambda_handler（main + mangum）的耗时，对应 Lambda 的 Init 阶段
+- first：通过 Mangum handler 处理第一个请求的耗时（包含组件的延迟创建）
+- second：同一个解释器中第二个相同请求的耗时（热请求，作为对照）
+- 峰值常驻内存（VmHWM，仅支持 Linux）
+
+请求使用 API Gateway HTTP API（payload 2.0）格式的事件直接调用 handler，不经过 uvicorn；
+需要上游的接口调用本地模拟上游。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --runs 10 --routes stats,intent,generate
+
+对比改造前的代码：
+
+    git worktree add /tmp/baseline <commit>
+    python -m benchmarks.bench_cold_start --app-dir /tmp/baseline/backend
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.harness import (
+    BACKEND_DIR,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+# 路由名 -> (方法, 路径, 请求体)
+ROUTES = {
+    "stats": ("GET", "/api/v1/stats", None),
+    "intent": ("POST", "/api/v1/intent/analyze", {"message": "帮我做一道红烧肉"}),
+    "generate": (
+        "POST",
+        "/api/v1/recipes/generate",
+        {"description": "我有鸡蛋和番茄，做一道快手菜", "use_cache": False},
+    ),
+    "image": (
+        "POST",
+        "/api/v1/recipes/generate-image",
+        {"recipe_json": {"dish_name": "番茄炒蛋", "ingredients": [{"name": "番茄"}]}},
+    ),
+}
+
+# 在子进程中运行：导入 handler，调用两次，输出 JSON
+CHILD_SCRIPT = r"""
+import json, sys, time
+
+start = time.perf_counter()
+from lambda_handler import handler
+import_ms = (time.perf_counter() - start) * 1000
+
+method, path, body = json.loads(sys.argv[1])
+event = {
+    "version": "2.0",
+    "routeKey": "$default",
+    "rawPath": path,
+    "rawQueryString": "",
+    "headers": {"content-type": "application/json", "host": "localhost"},
+    "requestContext": {
+        "http": {"method": method, "path": path, "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1", "userAgent": "bench"},
+        "domainName": "localhost",
+        "stage": "$default",
+    },
+    "body": json.dumps(body) if body is not None else None,
+    "isBase64Encoded": False,
+}
+
+
+class Context:
+    function_name = "bench"
+    aws_request_id = "bench"
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+timings = []
+for _ in range(2):
+    start = time.perf_counter()
+    response = handler(event, Context())
+    timings.append((time.perf_counter() - start) * 1000)
+
+peak_kb = None
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                peak_kb = int(line.split()[1])
+except OSError:
+    pass
+
+print(json.dumps({
+    "import_ms": import_ms,
+    "first_ms": timings[0],
+    "second_ms": timings[1],
+    "status": response["statusCode"],
+    "peak_rss_kb": peak_kb,
+    "openai_loaded": "openai" in sys.modules,
+    "dashscope_loaded": "dashscope" in sys.modules,
+}))
+"""
+
+
+def run_once(app_dir: str, route: str, env: dict) -> dict:
+    process_env = os.environ.copy()
+    process_env.update(env)
+    process_env["PYTHONPATH"] = app_dir
+    # 按 Lambda 环境的默认值配置（例如缓存默认使用 SQLite）
+    process_env["AWS_LAMBDA_FUNCTION_NAME"] = "bench-cold-start"
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, json.dumps(ROUTES[route])],
+        cwd=app_dir,
+        env=process_env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{route} 子进程失败:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--app-dir", default=BACKEND_DIR, help="被测后端代码所在目录")
+    arg_parser.add_argument("--routes", default=",".join(ROUTES))
+    arg_parser.add_argument("--runs", type=int, default=5, help="每个路由启动的解释器数量")
+    arg_parser.add_argument("--latency-ms", default="0", help="模拟上游延迟")
+    arg_parser.add_argument(
+        "--no-dashscope-key", action="store_true", help="不设置 DASHSCOPE_API_KEY，检查文本接口能否正常启动"
+    )
+    args = arg_parser.parse_args()
+
+    env = mock_upstream_env()
+    # 设置了 AWS_LAMBDA_FUNCTION_NAME 时缓存默认使用 SQLite，改用内存缓存，
+    # 避免上一次运行写入磁盘的结果让首个请求命中缓存
+    env["REQUIREMENTS_CACHE_BACKEND"] = "memory"
+    env["RECIPE_CACHE_BACKEND"] = "memory"
+    if args.no_dashscope_key:
+        env["DASHSCOPE_API_KEY"] = ""
+
+    routes = [route.strip() for route in args.routes.split(",") if route.strip()]
+    mock = start_server(
+        "benchmarks.mock_upstream:app", MOCK_PORT, env={"MOCK_LATENCY_MS": args.latency_ms}
+    )
+    try:
+        # 预热一次，让字节码缓存（__pycache__）就绪，和部署包里的情况一致
+        try:
+            run_once(args.app_dir, routes[0], env)
+        except RuntimeError:
+            pass
+
+        print(f"代码目录: {args.app_dir}  每个路由 {args.runs} 个新解释器  模拟延迟 {args.latency_ms}ms")
+        for route in routes:
+            try:
+                runs = [run_once(args.app_dir, route, env) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"  {route:<10} ❌ {str(e).strip().splitlines()[-1]}")
+                continue
+
+            def median(key: str) -> float:
+                return statistics.median(run[key] for run in runs)
+
+            total = statistics.median(run["import_ms"] + run["first_ms"] for run in runs)
+            sdks = [name for name in ("openai", "dashscope") if runs[0][f"{name}_loaded"]]
+            print(
+                f"  {route:<10} import {median('import_ms'):>7.1f}ms  "
+                f"首个请求 {median('first_ms'):>7.1f}ms  合计 {total:>7.1f}ms  "
+                f"第二个请求 {median('second_ms'):>6.1f}ms  "
+                f"峰值内存 {median('peak_rss_kb') / 1024:>5.1f}MB  "
+                f"状态 {runs[0]['status']}  已加载SDK: {', '.join(sdks) or '无'}"
+            )
+    finally:
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+并发基准测试：在本地模拟上游上测量单个 uvicorn worker 能同时处理多少请求
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_concurrency --levels 1,10,50,100,200
+
+对比其他版本的代码（例如改造前的同步实现）：
+
+    git worktree add /tmp/baseline <commit>
+    python -m benchmarks.bench_concurrency --app-dir /tmp/baseline/backend
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.harness import (
+    APP_PORT,
+    BACKEND_DIR,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+ENDPOINTS = {
+    "intent": ("/api/v1/intent/analyze", {"message": "我有牛肉和洋葱，想做个菜"}),
+    "generate": ("/api/v1/recipes/generate", {"description": "我有牛肉和洋葱，半小时内"}),
+}
+
+
+async def run_level(endpoint: str, concurrency: int) -> dict:
+    """同时发出 concurrency 个请求，返回耗时与吞吐量"""
+    path, payload = ENDPOINTS[endpoint]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{APP_PORT}", limits=limits, timeout=300
+    ) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *[client.post(path, json=payload) for _ in range(concurrency)]
+        )
+        elapsed = time.perf_counter() - start
+
+    failures = sum(1 for r in responses if r.status_code != 200)
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": concurrency / elapsed,
+        "failures": failures,
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--app-dir", default=BACKEND_DIR, help="后端代码目录")
+    arg_parser.add_argument("--endpoint", choices=ENDPOINTS, default="generate")
+    arg_parser.add_argument("--levels", default="1,10,50,100")
+    arg_parser.add_argument("--latency-ms", default="500", help="模拟上游延迟")
+    args = arg_parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+
+    mock = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={"MOCK_LATENCY_MS": args.latency_ms},
+    )
+    app = start_server("main:app", APP_PORT, cwd=args.app_dir, env=mock_upstream_env())
+
+    try:
+        print(f"端点: {args.endpoint}  模拟延迟: {args.latency_ms}ms  worker数: 1")
+        print(f"{'并发':>6} {'耗时(s)':>10} {'吞吐(req/s)':>12} {'失败':>6}")
+        for level in levels:
+            result = asyncio.run(run_level(args.endpoint, level))
+            print(
+                f"{result['concurrency']:>6} {result['elapsed_s']:>10.2f} "
+                f"{result['throughput_rps']:>12.1f} {result['failures']:>6}"
+            )
+    finally:
+        stop_server(app)
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
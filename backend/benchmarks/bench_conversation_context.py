@@ -0,0 +1,118 @@
+"""
+多轮菜谱优化对话中，提示词里对话上下文的长度
+
+模拟一段 20 轮的优化对话（第一轮提出"不吃辣、不要香菜"），每一轮按三种方式构建补丁模式的提示词：
+
+- window: 只保留最近 4 条消息（没有摘要器时的行为）
+- full: 放入全部对话历史
+- summary: 较早的对话折叠为约束摘要 + 最近的消息原文（ConversationSummarizer）
+
+输出每轮提示词的 token 数（按字符数估算，中文大约一个字一个 token），以及第一轮的约束在最后一轮
+是否还在提示词里。摘要调用的是本地模拟上游，模拟上游的"摘要"只是把用户消息拼接起来，
+这里只衡量长度，不衡量摘要质量。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_conversation_context --turns 20
+"""
+
+import argparse
+import asyncio
+import os
+
+from benchmarks.harness import MOCK_PORT, mock_upstream_env, start_server, stop_server
+from benchmarks.mock_upstream import MOCK_RECIPE
+
+USER_REQUESTS = [
+    "我不吃辣，也不要放香菜",
+    "牛肉改成切丁",
+    "腌制时间能缩短吗",
+    "洋葱换成青椒",
+    "少放点油",
+    "能不能加个鸡蛋",
+    "分量改成三人份",
+    "生抽换成低钠的",
+    "做法简单一点",
+    "加点胡萝卜增加颜色",
+    "能用空气炸锅吗",
+    "蛋白质再高一点",
+    "不要用料酒",
+    "出锅前加什么提味",
+    "能提前一晚准备吗",
+    "换成黑胡椒味",
+    "时间控制在20分钟内",
+    "再加一种绿叶菜",
+    "热量控制在400以内",
+    "最后给个摆盘建议",
+]
+AI_REPLY = "好的，已经按您的要求调整了菜谱：{request}。其他步骤保持不变，您可以继续提出修改意见。"
+CONSTRAINT = "不吃辣"
+
+
+async def run(turns: int, think_time: float) -> None:
+    # 在导入后端模块前设置，让组件连接本地模拟上游
+    os.environ.update(mock_upstream_env())
+    os.environ["CONVERSATION_SUMMARY_CACHE_BACKEND"] = "memory"
+
+    from cache import create_cache
+    from conversation_summary import ConversationSummarizer
+    from recipe_optimizer import RecipeOptimizer
+
+    window = RecipeOptimizer()
+    summarizer = ConversationSummarizer(create_cache("conversation_summaries", "CONVERSATION_SUMMARY_CACHE"))
+    summarized = RecipeOptimizer(summarizer=summarizer)
+
+    history = []
+    rows = []
+    for turn in range(turns):
+        request = USER_REQUESTS[turn % len(USER_REQUESTS)]
+        contexts = {
+            "window": await window._conversation_context(history),
+            "full": window._format_context(history),
+            "summary": await summarized._conversation_context(history),
+        }
+        sizes = {
+            name: len(summarized._build_patch_prompt(MOCK_RECIPE, request, context))
+            for name, context in contexts.items()
+        }
+        rows.append((turn + 1, len(history), sizes, contexts))
+
+        history.append({"role": "user", "content": request})
+        history.append({"role": "assistant", "content": AI_REPLY.format(request=request)})
+        # 用户两轮之间的间隔，后台摘要在这段时间里完成
+        await asyncio.sleep(think_time)
+
+    print(f"{'轮次':>4} {'历史消息':>8} {'window':>8} {'full':>8} {'summary':>8}")
+    for turn, messages, sizes, _ in rows:
+        print(f"{turn:>4} {messages:>8} {sizes['window']:>8} {sizes['full']:>8} {sizes['summary']:>8}")
+
+    last_contexts = rows[-1][3]
+    print(
+        f"\n最后一轮提示词中是否还有第一轮的约束（{CONSTRAINT}）: "
+        + "  ".join(f"{name} {'是' if CONSTRAINT in context else '否'}" for name, context in last_contexts.items())
+    )
+    stats = summarizer.stats()
+    print(
+        f"摘要调用 {stats['folds']} 次（后台 {stats['background_folds']} 次），"
+        f"共折叠 {stats['messages_folded']} 条消息，失败 {stats['fold_failures']} 次"
+    )
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--turns", type=int, default=20)
+    arg_parser.add_argument("--latency-ms", default="50", help="模拟上游延迟")
+    arg_parser.add_argument("--think-time", type=float, default=0.3, help="两轮之间的间隔（秒）")
+    args = arg_parser.parse_args()
+
+    mock = start_server(
+        "benchmarks.mock_upstream:app", MOCK_PORT, env={"MOCK_LATENCY_MS": args.latency_ms}
+    )
+    try:
+        asyncio.run(run(args.turns, args.think_time))
+    finally:
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
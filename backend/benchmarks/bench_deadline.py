@@ -0,0 +1,148 @@
+"""
+截止时间与降级：上游变慢时 /api/v1/recipes/generate 能否在 Lambda 超时前返回
+
+模拟上游使用长尾延迟分布（lognormal），并按输出长度增加延迟。分别以两种配置启动后端，
+用 /api/v1/recipes/generate（两次调用模式：需求解析 + 菜谱生成）压测：
+
+- off: 请求没有截止时间（REQUEST_DEADLINE_S 很大），只有每次上游调用自己的截止时间和重试（原来的行为）
+- deadline: 默认的截止时间和降级，时间不够时本地解析需求、生成精简菜谱
+
+为了让测试在一两分钟内完成，所有时间按 1/3 缩短：客户端 10 秒超时（相当于 Lambda 的 30 秒上限），
+请求截止时间 9 秒，上游每次尝试 7 秒、总计 8.3 秒，各降级阈值同比例缩短。
+
+输出成功率（客户端超时前拿到 200）、延迟分位数，以及降级的请求占比和各降级项的次数。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_deadline --requests 100 --concurrency 5
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.bench_suite import NO_CACHE_ENV, percentile
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+SCALED_ENV = {
+    "UPSTREAM_TIMEOUT_S": "7",
+    "UPSTREAM_TOTAL_TIMEOUT_S": "8.3",
+    "UPSTREAM_BREAKER_FAILURES": "0",
+}
+CONFIGS = {
+    "off": {"REQUEST_DEADLINE_S": "600"},
+    "deadline": {
+        "REQUEST_DEADLINE_S": "9",
+        "DEADLINE_LOCAL_PARSE_S": "5",
+        "DEADLINE_GENERATE_RESERVE_S": "3.3",
+        "DEADLINE_COMPACT_S": "4",
+    },
+}
+CLIENT_TIMEOUT_S = 10
+
+
+async def send(client: httpx.AsyncClient, n: int) -> tuple:
+    """返回 (状态码或 "client_timeout", 耗时秒, 降级列表)"""
+    start = time.perf_counter()
+    degradations: List[str] = []
+    try:
+        response = await client.post(
+            "/api/v1/recipes/generate",
+            json={"description": f"家里有牛肉和洋葱，想做个快手菜，第{n}份", "use_cache": False},
+        )
+        status: Any = response.status_code
+        if status == 200:
+            degradations = response.json().get("degradations", [])
+    except httpx.TimeoutException:
+        status = "client_timeout"
+    return status, time.perf_counter() - start, degradations
+
+
+async def run_config(requests: int, concurrency: int) -> Dict[str, Any]:
+    numbers = iter(range(requests))
+    results: List[tuple] = []
+
+    async def worker() -> None:
+        for n in numbers:
+            results.append(await send(client, n))
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{APP_PORT}", timeout=CLIENT_TIMEOUT_S
+    ) as client:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    statuses = Counter(status for status, _, _ in results)
+    latencies = [elapsed for _, elapsed, _ in results]
+    degradations = Counter(name for _, _, names in results for name in names)
+    return {
+        "ok": statuses.get(200, 0) / len(results),
+        "degraded": sum(1 for _, _, names in results if names) / len(results),
+        "statuses": dict(statuses),
+        "degradations": dict(degradations),
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "max": max(latencies),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=100)
+    arg_parser.add_argument("--concurrency", type=int, default=5)
+    arg_parser.add_argument("--latency-ms", default="1000", help="模拟上游延迟的中位数")
+    arg_parser.add_argument("--sigma", default="0.9", help="lognormal 分布的形状参数，越大长尾越明显")
+    arg_parser.add_argument("--token-rate", default="300", help="模拟上游的输出速度（token/秒）")
+    arg_parser.add_argument("--configs", default=",".join(CONFIGS))
+    args = arg_parser.parse_args()
+
+    mock_process = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={
+            "MOCK_LATENCY_MS": args.latency_ms,
+            "MOCK_LATENCY_DIST": "lognormal",
+            "MOCK_LATENCY_SIGMA": args.sigma,
+            "MOCK_TOKEN_RATE": args.token_rate,
+            "MOCK_SEED": "42",
+        },
+    )
+    reports = {}
+    try:
+        for name in args.configs.split(","):
+            env = {
+                **mock_upstream_env(),
+                **NO_CACHE_ENV,
+                **SCALED_ENV,
+                "DEADLINE_TOKENS_PER_S": args.token_rate,
+                **CONFIGS[name],
+            }
+            app = start_server("main:app", APP_PORT, env=env)
+            try:
+                reports[name] = asyncio.run(run_config(args.requests, args.concurrency))
+            finally:
+                stop_server(app)
+    finally:
+        stop_server(mock_process)
+
+    print(f"{'配置':<8} {'成功率':>6} {'降级占比':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  状态码")
+    for name, result in reports.items():
+        print(
+            f"{name:<10} {result['ok']:>7.0%} {result['degraded']:>10.0%} {result['p50'] * 1000:>8.0f} "
+            f"{result['p95'] * 1000:>8.0f} {result['max'] * 1000:>8.0f}  {result['statuses']}"
+        )
+    for name, result in reports.items():
+        print(f"{name}: 降级次数 {result['degradations'] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
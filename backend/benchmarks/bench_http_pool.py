@@ -0,0 +1,225 @@
+"""
+共用连接池：每次调用的建连（TCP + TLS 握手）开销对比
+
+本地模拟上游以 HTTPS 启动（自签名证书），模拟一次用户请求依次调用的上游：
+需求解析、菜谱生成、菜谱优化、意图识别（OpenAI 接口），以及下载生成的图片。
+每轮同时发起 --concurrency 个这样的流程，共 --rounds 轮，按三种方式创建 HTTP 客户端：
+
+- new_client: 每次调用都新建客户端（最差情况）
+- before: 每个组件各自持有一个 AsyncOpenAI 客户端（各自的连接池），下载图片每次新建客户端（原来的行为）
+- shared: 所有组件和图片下载共用 http_pool 中的连接池
+
+通过 httpcore 的 trace 扩展统计新建的连接数、TLS 握手次数和耗时，输出每次调用平均的建连时间和延迟。
+本地回环上的握手只需要几毫秒；真实上游每次新建连接还要多付出几个网络往返，节省的时间更多。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_http_pool --rounds 20 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.harness import MOCK_PORT, mock_upstream_env, start_server, stop_server
+
+CHAT_COMPONENTS = ["parser", "generator", "optimizer", "intent"]
+MESSAGES = [{"role": "system", "content": "意图识别"}, {"role": "user", "content": "今天吃什么"}]
+
+
+def write_self_signed_cert(directory: str) -> Tuple[str, str]:
+    """生成 127.0.0.1 的自签名证书，返回 (证书文件, 私钥文件)"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return cert_path, key_path
+
+
+class Clients:
+    """按模式提供各组件使用的 AsyncOpenAI 客户端和下载图片用的 httpx 客户端"""
+
+    def __init__(self, mode: str):
+        from http_pool import _PoolStats
+
+        self.mode = mode
+        self.stats = _PoolStats()
+        self._per_component: Dict[str, Any] = {}
+
+    def _new_http_client(self):
+        import httpx
+
+        stats = self.stats
+
+        async def on_request(request) -> None:
+            stats.requests += 1
+            request.extensions["trace"] = stats.make_trace()
+
+        return httpx.AsyncClient(timeout=30, event_hooks={"request": [on_request]})
+
+    def openai(self, component: str) -> Tuple[Any, bool]:
+        """返回 (客户端, 用完后是否需要关闭)"""
+        from openai import AsyncOpenAI
+
+        if self.mode == "shared":
+            from http_pool import create_openai_client
+
+            return create_openai_client("sk-mock"), False
+        if self.mode == "new_client":
+            return AsyncOpenAI(api_key="sk-mock", http_client=self._new_http_client()), True
+        if component not in self._per_component:
+            self._per_component[component] = AsyncOpenAI(
+                api_key="sk-mock", http_client=self._new_http_client()
+            )
+        return self._per_component[component], False
+
+    def http(self) -> Tuple[Any, bool]:
+        if self.mode == "shared":
+            from http_pool import get_http_client
+
+            return get_http_client(), False
+        return self._new_http_client(), True
+
+    async def close(self) -> None:
+        for client in self._per_component.values():
+            await client.close()
+
+    def summary(self) -> Dict[str, Any]:
+        if self.mode == "shared":
+            from http_pool import http_pool_stats
+
+            return http_pool_stats()
+        return self.stats.to_dict()
+
+
+async def run_flow(clients: Clients, image_url: str, latencies: List[float]) -> None:
+    async def timed(call: Callable) -> None:
+        start = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    for component in CHAT_COMPONENTS:
+        client, owned = clients.openai(component)
+
+        async def chat():
+            await client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+
+        await timed(chat)
+        if owned:
+            await client.close()
+
+    http_client, owned = clients.http()
+
+    async def download():
+        response = await http_client.get(image_url)
+        response.raise_for_status()
+
+    await timed(download)
+    if owned:
+        await http_client.aclose()
+
+
+async def run_mode(mode: str, rounds: int, concurrency: int, image_url: str) -> Dict[str, Any]:
+    clients = Clients(mode)
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(run_flow(clients, image_url, latencies) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await clients.close()
+
+    stats = clients.summary()
+    calls = len(latencies)
+    setup_ms = (stats["avg_connect_ms"] or 0) * stats["connections_opened"] + (
+        stats["avg_tls_ms"] or 0
+    ) * stats["tls_handshakes"]
+    latencies.sort()
+    return {
+        "mode": mode,
+        "calls": calls,
+        "connections": stats["connections_opened"],
+        "tls_handshakes": stats["tls_handshakes"],
+        "setup_ms_per_call": setup_ms / calls,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "total_s": elapsed,
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rounds", type=int, default=20)
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="每轮同时进行的流程数")
+    arg_parser.add_argument("--latency-ms", default="20", help="模拟上游延迟")
+    arg_parser.add_argument("--modes", default="new_client,before,shared")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        tls = write_self_signed_cert(directory)
+        mock = start_server(
+            "benchmarks.mock_upstream:app", MOCK_PORT, env={"MOCK_LATENCY_MS": args.latency_ms}, tls=tls
+        )
+        try:
+            os.environ.update(mock_upstream_env())
+            os.environ["OPENAI_BASE_URL"] = f"https://127.0.0.1:{MOCK_PORT}/v1"
+            # httpx 通过 SSL_CERT_FILE 信任自签名证书，与生产环境使用系统证书的方式相同
+            os.environ["SSL_CERT_FILE"] = tls[0]
+            image_url = f"https://127.0.0.1:{MOCK_PORT}/mock.png"
+            results = [
+                asyncio.run(run_mode(mode, args.rounds, args.concurrency, image_url))
+                for mode in args.modes.split(",")
+            ]
+        finally:
+            stop_server(mock)
+
+    print(
+        f"{'模式':<12} {'调用数':>6} {'新建连接':>8} {'TLS握手':>8} {'建连ms/次':>10} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'总耗时s':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['mode']:<12} {result['calls']:>8} {result['connections']:>10} "
+            f"{result['tls_handshakes']:>10} {result['setup_ms_per_call']:>12.2f} "
+            f"{result['p50']:>8.1f} {result['p95']:>8.1f} {result['total_s']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
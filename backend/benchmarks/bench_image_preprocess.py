@@ -0,0 +1,70 @@
+"""
+图片预处理前后的体积和耗时对比
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_image_preprocess
+    python -m benchmarks.bench_image_preprocess --image ../ingredients.jpeg --max-edge 1024
+
+除了指定的图片，还会用它合成一张手机原图尺寸（4032x3024，带 EXIF 旋转标记）的图片做对比。
+"""
+
+import argparse
+import base64
+import io
+import os
+import time
+
+from PIL import Image
+
+from benchmarks.harness import BACKEND_DIR
+from image_preprocess import preprocess_image
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(BACKEND_DIR), "ingredients.jpeg")
+
+
+def phone_sized(data: bytes) -> bytes:
+    """把示例图片放大到手机原图尺寸，并加上 EXIF 方向标记"""
+    image = Image.open(io.BytesIO(data)).convert("RGB").resize((4032, 3024))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 需要顺时针旋转90度
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def measure(name: str, data: bytes, max_edge: int, output_format: str, rounds: int) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        output, mime_type = preprocess_image(
+            data, max_edge=max_edge, output_format=output_format
+        )
+    elapsed_ms = (time.perf_counter() - start) / rounds * 1000
+
+    before_url = len(base64.b64encode(data)) + len("data:image/jpeg;base64,")
+    after_url = len(base64.b64encode(output)) + len(f"data:{mime_type};base64,")
+    size = Image.open(io.BytesIO(output)).size
+
+    print(f"{name}")
+    print(f"  原图:     {len(data):>10,} bytes  data URL {before_url:>10,} bytes")
+    print(f"  预处理后: {len(output):>10,} bytes  data URL {after_url:>10,} bytes  {size[0]}x{size[1]} {mime_type}")
+    print(f"  减少:     {1 - after_url / before_url:>10.1%}   预处理耗时 {elapsed_ms:.1f} ms")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--image", default=DEFAULT_IMAGE)
+    arg_parser.add_argument("--max-edge", type=int, default=1280)
+    arg_parser.add_argument("--format", default="jpeg", choices=["jpeg", "webp"])
+    arg_parser.add_argument("--rounds", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        data = f.read()
+
+    measure(os.path.basename(args.image), data, args.max_edge, args.format, args.rounds)
+    measure("手机原图尺寸 (4032x3024, EXIF旋转)", phone_sized(data), args.max_edge, args.format, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
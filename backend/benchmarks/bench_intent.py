@@ -0,0 +1,84 @@
+"""
+意图识别本地分类器的覆盖率、准确率和耗时
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_intent
+    python -m benchmarks.bench_intent --threshold 0.9 --verbose
+
+使用不参与训练的标注消息（benchmarks/intent_messages.jsonl），统计有多少消息在本地
+（词典或模型）就能给出结论、本地结论的准确率，以及单次本地分类的耗时。不调用 LLM。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from benchmarks.harness import BACKEND_DIR
+from intent_classifier import IntentClassifier
+
+MESSAGES_PATH = os.path.join(BACKEND_DIR, "benchmarks", "intent_messages.jsonl")
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--messages", default=MESSAGES_PATH)
+    arg_parser.add_argument("--threshold", type=float, default=None)
+    arg_parser.add_argument("--rounds", type=int, default=200)
+    arg_parser.add_argument("--verbose", action="store_true", help="打印本地判断错误和需要 LLM 的消息")
+    args = arg_parser.parse_args()
+
+    with open(args.messages, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    classifier = IntentClassifier(api_key="unused", model_threshold=args.threshold)
+
+    by_path = {}
+    for row in rows:
+        result = classifier.classify_local(row["text"])
+        decided = result["is_recipe_request"] is not None
+        stage = result["decision_path"][-1] if decided else "llm"
+        counts = by_path.setdefault(stage, {"total": 0, "correct": 0})
+        counts["total"] += 1
+        if decided and result["is_recipe_request"] == bool(row["label"]):
+            counts["correct"] += 1
+        elif args.verbose:
+            status = "需要LLM" if not decided else "判断错误"
+            print(f"  [{status}] {row['text']}  {result}")
+
+    timings = []
+    for _ in range(args.rounds):
+        for row in rows:
+            start = time.perf_counter()
+            classifier.classify_local(row["text"])
+            timings.append((time.perf_counter() - start) * 1_000_000)
+
+    total = len(rows)
+    local = total - by_path.get("llm", {}).get("total", 0)
+    local_correct = sum(
+        counts["correct"] for stage, counts in by_path.items() if stage != "llm"
+    )
+
+    print(f"消息数: {total}  模型阈值: {classifier.model_threshold}")
+    for stage in ("lexicon", "model", "llm"):
+        counts = by_path.get(stage, {"total": 0, "correct": 0})
+        line = f"  {stage:<8} {counts['total']:>4} 条 ({counts['total'] / total:.0%})"
+        if stage != "llm" and counts["total"]:
+            line += f"  准确率 {counts['correct'] / counts['total']:.1%}"
+        print(line)
+    print(f"本地给出结论: {local / total:.0%}，准确率 {local_correct / local:.1%}" if local else "本地给出结论: 0%")
+    print(
+        f"本地分类耗时: p50 {statistics.median(timings):.0f} µs  "
+        f"p99 {percentile(timings, 0.99):.0f} µs  max {max(timings):.0f} µs"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+本地需求解析的覆盖率、与 LLM 解析结果的一致率和耗时
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_local_parser
+    python -m benchmarks.bench_local_parser --threshold 0.8 --verbose
+    OPENAI_API_KEY=... python -m benchmarks.bench_local_parser --live
+
+回归语料（benchmarks/parser_corpus.jsonl）每行是一条用户描述和参考解析结果，参考结果按
+解析器系统提示词中的提取规则标注。统计置信度达到阈值、不再调用 LLM 的比例，这部分结果与参考
+结果逐字段的一致率（食材和饮食要求按集合比较），低于阈值的部分如果直接采用本地结果会有多少
+不一致（说明阈值挡住了什么），以及单次本地解析的耗时。
+
+--live 时改为逐条调用 LLM 解析，以 LLM 的实际输出作为参考结果，并统计 LLM 解析的耗时；
+提示词或模型变化后用它检查本地解析是否还与 LLM 一致。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.harness import BACKEND_DIR
+from local_parser import parse_requirements_locally
+from parser import RecipeRequirementsParser
+
+CORPUS_PATH = os.path.join(BACKEND_DIR, "benchmarks", "parser_corpus.jsonl")
+FIELDS = [
+    "ingredients",
+    "max_cook_time_mins",
+    "dietary_requirements",
+    "cuisine_preference",
+    "difficulty_preference",
+    "calorie_preference",
+    "serving_size",
+]
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def normalize(parser: RecipeRequirementsParser, requirements: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """按解析器的校验补充默认值，列表字段转成集合；没有食材时返回 None"""
+    try:
+        validated = parser._validate_and_complete_requirements(requirements)
+    except ValueError:
+        return None
+    validated["ingredients"] = set(validated["ingredients"])
+    validated["dietary_requirements"] = set(validated["dietary_requirements"] or [])
+    return validated
+
+
+def differing_fields(local: Optional[Dict[str, Any]], reference: Optional[Dict[str, Any]]) -> List[str]:
+    if local is None or reference is None:
+        return [] if local is reference else ["ingredients"]
+    return [field for field in FIELDS if local[field] != reference[field]]
+
+
+async def live_references(parser: RecipeRequirementsParser, texts: List[str]) -> tuple:
+    """逐条调用 LLM 解析，返回 (结果列表, 每条耗时 ms)；解析不出食材的结果为空需求"""
+    references, timings = [], []
+    for text in texts:
+        start = time.perf_counter()
+        try:
+            requirements = await parser._request_requirements(text, text)
+        except ValueError:
+            requirements = {"ingredients": []}
+        timings.append((time.perf_counter() - start) * 1000)
+        references.append(requirements)
+    return references, timings
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--corpus", default=CORPUS_PATH)
+    arg_parser.add_argument("--threshold", type=float, default=None, help="默认读取 PARSER_LOCAL_THRESHOLD")
+    arg_parser.add_argument("--rounds", type=int, default=200)
+    arg_parser.add_argument("--live", action="store_true", help="以 LLM 的实际解析结果为参考（需要 OPENAI_API_KEY）")
+    arg_parser.add_argument("--verbose", action="store_true", help="打印与参考结果不一致的描述")
+    args = arg_parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    parser = RecipeRequirementsParser(api_key=None if args.live else "unused")
+    threshold = parser.local_threshold if args.threshold is None else args.threshold
+
+    llm_timings: List[float] = []
+    if args.live:
+        references, llm_timings = asyncio.run(live_references(parser, [row["text"] for row in rows]))
+    else:
+        references = [row["expected"] for row in rows]
+
+    accepted = {"total": 0, "exact": 0, "fields": {field: 0 for field in FIELDS}}
+    rejected = {"total": 0, "exact": 0}
+    for row, reference in zip(rows, references):
+        result = parse_requirements_locally(row["text"])
+        diff = differing_fields(normalize(parser, result["requirements"]), normalize(parser, reference))
+        bucket = accepted if result["confidence"] >= threshold else rejected
+        bucket["total"] += 1
+        if not diff:
+            bucket["exact"] += 1
+        if bucket is accepted:
+            for field in FIELDS:
+                if field not in diff:
+                    accepted["fields"][field] += 1
+        if args.verbose and diff:
+            status = "本地采用" if bucket is accepted else "交给LLM"
+            print(
+                f"  [{status}] {row['text']}  置信度 {result['confidence']}  "
+                f"未识别 {result['unparsed']!r}  不一致字段 {diff}"
+            )
+
+    timings = []
+    for _ in range(args.rounds):
+        for row in rows:
+            start = time.perf_counter()
+            parse_requirements_locally(row["text"])
+            timings.append((time.perf_counter() - start) * 1_000_000)
+
+    total = len(rows)
+    print(f"描述数: {total}  置信度阈值: {threshold}  参考结果: {'LLM 实时解析' if args.live else '语料标注'}")
+    print(f"本地解析（不调用 LLM）: {accepted['total']} 条 ({accepted['total'] / total:.0%})")
+    if accepted["total"]:
+        print(f"  与参考结果完全一致: {accepted['exact'] / accepted['total']:.1%}")
+        for field in FIELDS:
+            print(f"    {field:<22} {accepted['fields'][field] / accepted['total']:.1%}")
+    if rejected["total"]:
+        print(
+            f"交给 LLM: {rejected['total']} 条，其中本地结果与参考一致的 "
+            f"{rejected['exact'] / rejected['total']:.0%}"
+        )
+    print(
+        f"本地解析耗时: p50 {statistics.median(timings):.0f} µs  "
+        f"p99 {percentile(timings, 0.99):.0f} µs  max {max(timings):.0f} µs"
+    )
+    if llm_timings:
+        print(
+            f"LLM 解析耗时: p50 {statistics.median(llm_timings):.0f} ms  "
+            f"p95 {percentile(llm_timings, 0.95):.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+对比 /api/v1/recipes/optimize 的补丁模式（patch）与完整重新生成（full）的延迟和输出 token 数
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_optimize_modes --requests 20 --latency-ms 300 --token-rate 80
+
+模拟上游按输出长度增加延迟（--token-rate），输出 token 数从后端的 /metrics 读取。
+"""
+
+import argparse
+import re
+import statistics
+import time
+
+import httpx
+
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+from benchmarks.mock_upstream import MOCK_RECIPE
+
+BASE_URL = f"http://127.0.0.1:{APP_PORT}"
+
+
+def measure(requests: int) -> list:
+    """顺序发送请求（每次需求不同，避免请求合并），返回每个请求的延迟（秒）"""
+    latencies = []
+    with httpx.Client(base_url=BASE_URL, timeout=120) as client:
+        for i in range(requests):
+            start = time.perf_counter()
+            response = client.post(
+                "/api/v1/recipes/optimize",
+                json={"current_recipe": MOCK_RECIPE, "user_request": f"牛肉改成切丁（第{i}次）"},
+            )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def completion_tokens() -> float:
+    text = httpx.get(f"{BASE_URL}/metrics", timeout=10).text
+    match = re.search(
+        r'recipe_agent_upstream_tokens_total\{component="optimizer",type="completion"\} (\S+)', text
+    )
+    return float(match.group(1)) if match else 0.0
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=20)
+    arg_parser.add_argument("--latency-ms", default="300", help="模拟上游固定延迟")
+    arg_parser.add_argument("--token-rate", default="80", help="模拟输出速度 token/秒")
+    args = arg_parser.parse_args()
+
+    mock = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={"MOCK_LATENCY_MS": args.latency_ms, "MOCK_TOKEN_RATE": args.token_rate},
+    )
+
+    try:
+        print(f"{'模式':>6} {'p50(s)':>8} {'p95(s)':>8} {'平均(s)':>8} {'输出token/次':>12}")
+        for mode in ("full", "patch"):
+            env = mock_upstream_env()
+            env["RECIPE_OPTIMIZE_MODE"] = mode
+            app = start_server("main:app", APP_PORT, env=env)
+            try:
+                latencies = measure(args.requests)
+                tokens = completion_tokens() / args.requests
+                stats = httpx.get(f"{BASE_URL}/api/v1/stats", timeout=10).json()["optimizer"]
+            finally:
+                stop_server(app)
+
+            print(
+                f"{mode:>6} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} "
+                f"{statistics.mean(latencies):>8.2f} {tokens:>12.0f}"
+                + (f"  补丁回退 {stats['patch_fallbacks']} 次" if mode == "patch" else "")
+            )
+    finally:
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+对比 /api/v1/recipes/generate 的两次调用模式（chained）与融合模式（fused）的延迟
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_pipeline_modes --requests 20 --latency-ms 300 --token-rate 80
+"""
+
+import argparse
+import statistics
+import time
+
+import httpx
+
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+PAYLOAD = {"description": "我有牛肉和洋葱，想做个半小时内搞定的快手菜，别太辣"}
+
+
+def measure(requests: int) -> list:
+    """顺序发送请求，返回每个请求的延迟（秒）"""
+    latencies = []
+    with httpx.Client(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=120) as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.post("/api/v1/recipes/generate", json=PAYLOAD)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=20)
+    arg_parser.add_argument("--latency-ms", default="300", help="模拟上游固定延迟")
+    arg_parser.add_argument("--token-rate", default="80", help="模拟输出速度 token/秒")
+    args = arg_parser.parse_args()
+
+    mock = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={"MOCK_LATENCY_MS": args.latency_ms, "MOCK_TOKEN_RATE": args.token_rate},
+    )
+
+    try:
+        print(f"{'模式':>8} {'p50(s)':>8} {'p95(s)':>8} {'平均(s)':>8}")
+        for mode in ("chained", "fused"):
+            env = mock_upstream_env()
+            env["RECIPE_PIPELINE_MODE"] = mode
+            app = start_server("main:app", APP_PORT, env=env)
+            try:
+                latencies = measure(args.requests)
+            finally:
+                stop_server(app)
+
+            print(
+                f"{mode:>8} {percentile(latencies, 50):>8.2f} "
+                f"{percentile(latencies, 95):>8.2f} {statistics.mean(latencies):>8.2f}"
+            )
+    finally:
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
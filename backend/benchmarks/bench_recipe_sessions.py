@@ -0,0 +1,129 @@
+"""
+菜谱会话：只传 recipe_id 与上传完整菜谱的请求体大小对比
+
+生成一道菜谱后连续优化多轮，分别按两种方式发送每一轮的优化请求：
+
+- full: 上传当前菜谱和完整对话历史（原来的前端行为）
+- session: 只传 recipe_id、version 和本轮的要求，菜谱和对话历史从服务端会话中读取
+
+输出每轮请求体的字节数和延迟，最后各生成一次图片，对比请求体大小（full 上传菜谱，session 只传 recipe_id）。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_recipe_sessions --turns 10
+    python -m benchmarks.bench_recipe_sessions --backend sqlite
+"""
+
+import argparse
+import json
+import time
+
+import httpx
+
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+USER_REQUESTS = [
+    "我不吃辣，也不要放香菜",
+    "牛肉改成切丁",
+    "少放点油",
+    "能不能加个鸡蛋",
+    "分量改成三人份",
+    "生抽换成低钠的",
+    "加点胡萝卜增加颜色",
+    "蛋白质再高一点",
+    "不要用料酒",
+    "时间控制在20分钟内",
+]
+AI_REPLY = '我已经根据您的需求"{request}"优化了菜谱。新的菜谱已经体现了您要求的改进。'
+
+
+def post(client: httpx.Client, path: str, body: dict) -> tuple:
+    """返回 (响应JSON, 请求体字节数, 耗时ms)"""
+    content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    start = time.perf_counter()
+    response = client.post(path, content=content, headers={"content-type": "application/json"})
+    elapsed = (time.perf_counter() - start) * 1000
+    response.raise_for_status()
+    return response.json(), len(content), elapsed
+
+
+def run(client: httpx.Client, turns: int) -> None:
+    description = "家里有牛肉和洋葱，想做一道家常菜"
+    recipe, _, _ = post(client, "/api/v1/recipes/generate", {"description": description, "use_cache": False})
+    if "recipe_id" not in recipe:
+        raise RuntimeError("响应中没有 recipe_id，检查 RECIPE_SESSION_BACKEND 是否为 off")
+
+    full_recipe = recipe
+    session_recipe = recipe
+    history = [{"role": "user", "content": description}]
+    rows = []
+    for turn in range(turns):
+        request = USER_REQUESTS[turn % len(USER_REQUESTS)]
+        full_recipe, full_bytes, full_ms = post(
+            client,
+            "/api/v1/recipes/optimize",
+            {"current_recipe": full_recipe, "user_request": request, "conversation_history": history},
+        )
+        session_recipe, session_bytes, session_ms = post(
+            client,
+            "/api/v1/recipes/optimize",
+            {
+                "recipe_id": session_recipe["recipe_id"],
+                "version": session_recipe["version"],
+                "user_request": request,
+            },
+        )
+        history += [
+            {"role": "user", "content": request},
+            {"role": "assistant", "content": AI_REPLY.format(request=request)},
+        ]
+        rows.append((turn + 1, full_bytes, session_bytes, full_ms, session_ms))
+
+    print(f"{'轮次':>4} {'full字节':>10} {'session字节':>12} {'full ms':>9} {'session ms':>11}")
+    for turn, full_bytes, session_bytes, full_ms, session_ms in rows:
+        print(f"{turn:>4} {full_bytes:>10} {session_bytes:>12} {full_ms:>9.1f} {session_ms:>11.1f}")
+    total_full = sum(row[1] for row in rows)
+    total_session = sum(row[2] for row in rows)
+    print(f"\n{turns} 轮共上传: full {total_full} 字节, session {total_session} 字节")
+
+    # 两个菜谱内容相同时第二次请求会命中图片存储，这里只比较请求体大小
+    _, full_bytes, _ = post(client, "/api/v1/recipes/generate-image", {"recipe_json": full_recipe})
+    _, session_bytes, _ = post(
+        client,
+        "/api/v1/recipes/generate-image",
+        {"recipe_id": session_recipe["recipe_id"], "version": session_recipe["version"]},
+    )
+    print(f"生成图片请求体: full {full_bytes} 字节, session {session_bytes} 字节")
+    stats = client.get("/api/v1/stats").json()["recipe_sessions"]
+    print(f"会话存储: {json.dumps(stats, ensure_ascii=False)}")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--turns", type=int, default=10)
+    arg_parser.add_argument("--latency-ms", default="50", help="模拟上游延迟")
+    arg_parser.add_argument("--backend", default="memory", help="RECIPE_SESSION_BACKEND")
+    args = arg_parser.parse_args()
+
+    env = mock_upstream_env()
+    env["RECIPE_SESSION_BACKEND"] = args.backend
+    mock = start_server(
+        "benchmarks.mock_upstream:app", MOCK_PORT, env={"MOCK_LATENCY_MS": args.latency_ms}
+    )
+    app = start_server("main:app", APP_PORT, env=env)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=60) as client:
+            run(client, args.turns)
+    finally:
+        stop_server(app)
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
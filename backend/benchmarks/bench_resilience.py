@@ -0,0 +1,213 @@
+"""
+上游故障下的截止时间、重试、对冲和熔断效果
+
+模拟上游使用长尾延迟分布（lognormal），通过 POST /mock/faults 依次注入以下故障，
+对每种策略启动一次后端，用 /api/v1/recipes/generate（需求解析 + 菜谱生成两次上游调用）压测：
+
+- errors: 20% 的调用返回 500
+- stalls: 5% 的调用卡住不返回
+- tail: 不注入错误，只有长尾延迟
+- outage: 上游持续返回 503，之后恢复；统计故障期间的请求延迟、打到上游的调用数，以及恢复后多久请求重新成功
+
+策略：
+
+- none: 不设截止时间、不重试、不熔断（相当于原来的行为，SDK 自带的重试也已关闭）
+- retry: 默认配置，截止时间 + 带抖动的重试 + 熔断
+- hedge: 在 retry 的基础上启用对冲请求
+
+为了让测试在几十秒内完成，截止时间按比例缩短：每次尝试 2 秒、总计 6 秒，
+客户端 10 秒超时（相当于 Lambda 的 30 秒上限），熔断冷却 2 秒。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_resilience --requests 100 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.bench_suite import NO_CACHE_ENV, percentile
+from benchmarks.harness import (
+    APP_PORT,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+SCALED_ENV = {
+    "UPSTREAM_TIMEOUT_S": "2",
+    "UPSTREAM_TOTAL_TIMEOUT_S": "6",
+    "UPSTREAM_BREAKER_COOLDOWN_S": "2",
+}
+POLICIES = {
+    "none": {
+        "UPSTREAM_TIMEOUT_S": "600",
+        "UPSTREAM_TOTAL_TIMEOUT_S": "600",
+        "UPSTREAM_MAX_RETRIES": "0",
+        "UPSTREAM_BREAKER_FAILURES": "0",
+    },
+    "retry": {},
+    "hedge": {"UPSTREAM_HEDGE": "true"},
+}
+NO_FAULTS = {"error_rate": 0, "error_status": 500, "timeout_rate": 0}
+SCENARIOS = {
+    "errors": {"error_rate": 0.2, "error_status": 500},
+    "stalls": {"timeout_rate": 0.05, "timeout_s": 15},
+    "tail": {},
+}
+CLIENT_TIMEOUT_S = 10
+
+
+async def send(client: httpx.AsyncClient, n: int) -> tuple:
+    """返回 (状态码或 "client_timeout", 耗时秒)"""
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            "/api/v1/recipes/generate",
+            json={"description": f"家里有牛肉和洋葱，第{n}份", "use_cache": False},
+        )
+        status: Any = response.status_code
+    except httpx.TimeoutException:
+        status = "client_timeout"
+    return status, time.perf_counter() - start
+
+
+async def upstream_calls(mock: httpx.AsyncClient) -> int:
+    return (await mock.get("/mock/stats")).json()["chat_completions"]
+
+
+async def run_load(client: httpx.AsyncClient, requests: int, concurrency: int) -> Dict[str, Any]:
+    numbers = iter(range(requests))
+    results: List[tuple] = []
+
+    async def worker() -> None:
+        for n in numbers:
+            results.append(await send(client, n))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    statuses = Counter(status for status, _ in results)
+    latencies = [elapsed for _, elapsed in results]
+    return {
+        "ok": statuses.get(200, 0) / len(results),
+        "statuses": dict(statuses),
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+async def run_outage(client: httpx.AsyncClient, mock: httpx.AsyncClient, requests: int) -> Dict[str, Any]:
+    await mock.post("/mock/faults", json={**NO_FAULTS, "error_rate": 1.0, "error_status": 503})
+    calls_before = await upstream_calls(mock)
+    results = [await send(client, n) for n in range(requests)]
+    calls = await upstream_calls(mock) - calls_before
+
+    await mock.post("/mock/faults", json=NO_FAULTS)
+    recovered_at = time.perf_counter()
+    recovery = None
+    for n in range(200):
+        status, _ = await send(client, n)
+        if status == 200:
+            recovery = time.perf_counter() - recovered_at
+            break
+        await asyncio.sleep(0.1)
+    latencies = [elapsed for _, elapsed in results]
+    return {
+        "statuses": dict(Counter(status for status, _ in results)),
+        "p50": percentile(latencies, 0.50),
+        "upstream_calls": calls,
+        "recovery_s": recovery,
+    }
+
+
+async def run_policy(requests: int, concurrency: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{APP_PORT}", timeout=CLIENT_TIMEOUT_S
+    ) as client, httpx.AsyncClient(base_url=f"http://127.0.0.1:{MOCK_PORT}") as mock:
+        # 先在无故障时预热，对冲需要积累延迟样本
+        await mock.post("/mock/faults", json=NO_FAULTS)
+        await run_load(client, 40, concurrency)
+        for name, faults in SCENARIOS.items():
+            await mock.post("/mock/faults", json={**NO_FAULTS, **faults})
+            results[name] = await run_load(client, requests, concurrency)
+        results["outage"] = await run_outage(client, mock, 20)
+        results["upstream"] = (await client.get("/api/v1/stats")).json()["upstream"]
+    return results
+
+
+def _ms(value) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=100)
+    arg_parser.add_argument("--concurrency", type=int, default=10)
+    arg_parser.add_argument("--latency-ms", default="200", help="模拟上游延迟的中位数")
+    arg_parser.add_argument("--sigma", default="0.8", help="lognormal 分布的形状参数，越大长尾越明显")
+    arg_parser.add_argument("--policies", default=",".join(POLICIES))
+    args = arg_parser.parse_args()
+
+    mock_process = start_server(
+        "benchmarks.mock_upstream:app",
+        MOCK_PORT,
+        env={
+            "MOCK_LATENCY_MS": args.latency_ms,
+            "MOCK_LATENCY_DIST": "lognormal",
+            "MOCK_LATENCY_SIGMA": args.sigma,
+            "MOCK_SEED": "42",
+        },
+    )
+    reports = {}
+    try:
+        for policy in args.policies.split(","):
+            env = {**mock_upstream_env(), **NO_CACHE_ENV, **SCALED_ENV, **POLICIES[policy]}
+            app = start_server("main:app", APP_PORT, env=env)
+            try:
+                reports[policy] = asyncio.run(run_policy(args.requests, args.concurrency))
+            finally:
+                stop_server(app)
+    finally:
+        stop_server(mock_process)
+
+    print(f"{'场景':<8} {'策略':<6} {'成功率':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  状态码")
+    for scenario in SCENARIOS:
+        for policy, report in reports.items():
+            result = report[scenario]
+            print(
+                f"{scenario:<8} {policy:<8} {result['ok']:>7.0%} {_ms(result['p50']):>8} "
+                f"{_ms(result['p95']):>8} {_ms(result['p99']):>8}  {result['statuses']}"
+            )
+
+    print("\n上游持续 503 时的 20 个请求：")
+    print(f"{'策略':<6} {'p50 ms':>8} {'上游调用数':>10} {'恢复耗时s':>10}  状态码")
+    for policy, report in reports.items():
+        outage = report["outage"]
+        recovery = f"{outage['recovery_s']:.1f}" if outage["recovery_s"] is not None else "-"
+        print(
+            f"{policy:<8} {_ms(outage['p50']):>8} {outage['upstream_calls']:>12} {recovery:>12}  "
+            f"{outage['statuses']}"
+        )
+
+    for policy, report in reports.items():
+        upstream = report["upstream"] or {}
+        totals = Counter()
+        for stats in upstream.get("components", {}).values():
+            totals.update({key: stats[key] for key in ("retries", "timeouts", "hedges", "hedge_wins")})
+        breaker = upstream.get("breaker", {})
+        print(
+            f"{policy}: 重试 {totals['retries']} 次，超时 {totals['timeouts']} 次，"
+            f"对冲 {totals['hedges']} 次（先返回 {totals['hedge_wins']} 次），"
+            f"熔断 {breaker.get('times_opened', 0)} 次，直接拒绝 {breaker.get('rejected', 0)} 次"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+"""
+全部 API 端点的负载测试
+
+启动本地模拟上游（OpenAI chat completions + DashScope MultiModalConversation）和后端，
+对 main.py 的每个端点按递增的并发数做闭环压测（每个并发连接发完一个请求立即发下一个），
+统计吞吐量、p50/p95/p99 延迟、错误数和后端进程的峰值常驻内存，结果保存为 JSON，
+方便比较不同版本或不同配置。峰值内存读取 /proc/<pid>/status 的 VmHWM，仅支持 Linux。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --concurrency 1,8,32 --duration 10
+    python -m benchmarks.bench_suite --scenarios generate,intent --latency-dist lognormal
+    python -m benchmarks.bench_suite --error-rate 0.05 --error-status 429
+
+和之前保存的结果对比：
+
+    python -m benchmarks.bench_suite --compare benchmarks/results/suite-20260101-120000.json
+
+默认关闭缓存和请求合并，每个请求都会调用上游，测的是完整链路；--with-caches 保留默认配置。
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from PIL import Image
+
+from benchmarks.harness import (
+    APP_PORT,
+    BACKEND_DIR,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+BASE_URL = f"http://127.0.0.1:{APP_PORT}"
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# 关闭缓存和请求合并，让每个请求都走完整链路
+NO_CACHE_ENV = {
+    "REQUIREMENTS_CACHE_BACKEND": "off",
+    "RECIPE_CACHE_BACKEND": "off",
+    "VISION_CACHE_BACKEND": "off",
+    "SINGLE_FLIGHT_ENABLED": "false",
+}
+
+SAMPLE_RECIPE = {
+    "dish_name": "番茄炒蛋",
+    "description": "酸甜可口的家常菜",
+    "ingredients": [
+        {"name": "番茄", "amount": 2, "unit": "个"},
+        {"name": "鸡蛋", "amount": 3, "unit": "个"},
+    ],
+    "instructions": [
+        {"step": 1, "description": "番茄切块"},
+        {"step": 2, "description": "鸡蛋打散炒熟"},
+        {"step": 3, "description": "下番茄翻炒，加入鸡蛋"},
+    ],
+}
+
+# 每个请求的序号，用于生成互不相同的请求内容；
+# 加上本轮的标识，避免命中上一轮写入磁盘的图片存储
+_sequence = itertools.count()
+_RUN_ID = time.strftime("%H%M%S")
+
+
+class RequestFailed(Exception):
+    pass
+
+
+def _check(response: httpx.Response) -> None:
+    if response.status_code >= 400:
+        raise RequestFailed(f"HTTP {response.status_code}")
+
+
+def _sample_jpeg() -> bytes:
+    image = Image.new("RGB", (1600, 1200), (200, 120, 60))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+SAMPLE_JPEG = _sample_jpeg()
+
+
+# ---- 场景：每个函数发一次请求，失败时抛出异常 ----
+
+
+async def scenario_generate(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    n = next(_sequence)
+    response = await client.post(
+        "/api/v1/recipes/generate",
+        json={"description": f"我有鸡蛋和番茄，做第{n}道快手菜", "use_cache": False},
+    )
+    _check(response)
+
+
+async def scenario_generate_stream(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    n = next(_sequence)
+    start = time.perf_counter()
+    first_byte = None
+    async with client.stream(
+        "POST",
+        "/api/v1/recipes/generate-stream",
+        json={"description": f"我有土豆和牛肉，做第{n}道炖菜", "use_cache": False},
+    ) as response:
+        _check(response)
+        async for _ in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    if first_byte is not None:
+        state.setdefault("ttfb", []).append(first_byte)
+
+
+async def scenario_generate_batch(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    n = next(_sequence)
+    items = [f"我有鸡胸肉和西兰花，第{n}批第{i}道减脂餐" for i in range(5)]
+    async with client.stream(
+        "POST",
+        "/api/v1/recipes/generate-batch",
+        json={"items": items, "use_cache": False},
+    ) as response:
+        _check(response)
+        summary = {}
+        async for line in response.aiter_lines():
+            if line:
+                summary = json.loads(line)
+    if summary.get("failed"):
+        raise RequestFailed(f"{summary['failed']} 个条目失败")
+
+
+def _recipe(n: int) -> Dict[str, Any]:
+    return {**SAMPLE_RECIPE, "dish_name": f"番茄炒蛋{_RUN_ID}-{n}"}
+
+
+async def scenario_generate_image(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    response = await client.post(
+        "/api/v1/recipes/generate-image", json={"recipe_json": _recipe(next(_sequence))}
+    )
+    _check(response)
+    state["image_url"] = response.json().get("image_url")
+
+
+async def scenario_image_job(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    """提交任务后轮询直到完成，计时包含排队和生成"""
+    response = await client.post(
+        "/api/v1/recipes/generate-image/jobs", json={"recipe_json": _recipe(next(_sequence))}
+    )
+    _check(response)
+    job_id = response.json()["job_id"]
+    while True:
+        response = await client.get(f"/api/v1/recipes/generate-image/jobs/{job_id}")
+        _check(response)
+        status = response.json()["status"]
+        if status == "failed":
+            raise RequestFailed("任务失败")
+        if status == "succeeded":
+            return
+        await asyncio.sleep(0.05)
+
+
+async def scenario_get_image(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    image_url = state.get("image_url")
+    if image_url is None:
+        response = await client.post(
+            "/api/v1/recipes/generate-image", json={"recipe_json": SAMPLE_RECIPE}
+        )
+        _check(response)
+        image_url = state["image_url"] = response.json()["image_url"]
+    response = await client.get(httpx.URL(image_url).path)
+    _check(response)
+
+
+async def scenario_analyze(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    response = await client.post(
+        "/api/v1/ingredients/analyze",
+        files={"file": ("fridge.jpg", SAMPLE_JPEG, "image/jpeg")},
+    )
+    _check(response)
+
+
+async def scenario_optimize(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    n = next(_sequence)
+    response = await client.post(
+        "/api/v1/recipes/optimize",
+        json={"current_recipe": SAMPLE_RECIPE, "user_request": f"少放点油，第{n}次修改"},
+    )
+    _check(response)
+
+
+async def scenario_intent(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    # 交替发送本地能判断和本地判断不了、需要调用 LLM 的消息
+    n = next(_sequence)
+    message = "帮我做一道红烧肉" if n % 2 else f"随便来点第{n}份"
+    response = await client.post("/api/v1/intent/analyze", json={"message": message})
+    _check(response)
+
+
+async def scenario_stats(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    _check(await client.get("/api/v1/stats"))
+
+
+async def scenario_metrics(client: httpx.AsyncClient, state: Dict[str, Any]) -> None:
+    _check(await client.get("/metrics"))
+
+
+Scenario = Callable[[httpx.AsyncClient, Dict[str, Any]], Awaitable[None]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "generate": scenario_generate,
+    "generate-stream": scenario_generate_stream,
+    "generate-batch": scenario_generate_batch,
+    "generate-image": scenario_generate_image,
+    "image-job": scenario_image_job,
+    "get-image": scenario_get_image,
+    "analyze": scenario_analyze,
+    "optimize": scenario_optimize,
+    "intent": scenario_intent,
+    "stats": scenario_stats,
+    "metrics": scenario_metrics,
+}
+
+
+# ---- 压测 ----
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def read_memory_kb(pid: int) -> Dict[str, int]:
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0])
+    return values
+
+
+def reset_peak_memory(pid: int) -> bool:
+    """把 VmHWM 重置为当前 RSS，这样每组测试的峰值互不影响（Linux 4.0+）"""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+async def run_level(
+    scenario: Scenario,
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int],
+    timeout: float,
+    state: Dict[str, Any],
+) -> Dict[str, Any]:
+    """closed-loop：concurrency 个连接各自循环发请求，直到时间用完或请求数达到上限"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    started = 0
+    deadline = time.perf_counter() + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=timeout, limits=limits) as client:
+
+        async def worker() -> None:
+            nonlocal started
+            while time.perf_counter() < deadline:
+                if max_requests is not None and started >= max_requests:
+                    return
+                started += 1
+                start = time.perf_counter()
+                try:
+                    await scenario(client, state)
+                    latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    reason = str(e) or type(e).__name__
+                    errors[reason] = errors.get(reason, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies) + sum(errors.values()),
+        "succeeded": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(value * 1000, 1) if value is not None else None
+            for name, value in (
+                ("p50", percentile(latencies, 0.50)),
+                ("p95", percentile(latencies, 0.95)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", max(latencies) if latencies else None),
+                ("mean", statistics.fmean(latencies) if latencies else None),
+            )
+        },
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(name: str, result: Dict[str, Any]) -> None:
+    latency = result["latency_ms"]
+    memory = result.get("peak_rss_mb")
+    line = (
+        f"  {name:<16} c={result['concurrency']:<4} "
+        f"{result['throughput_rps']:>8.1f} req/s  "
+        f"p50 {_fmt_ms(latency['p50'])}  p95 {_fmt_ms(latency['p95'])}  p99 {_fmt_ms(latency['p99'])}"
+    )
+    if "ttfb_p50_ms" in result:
+        line += f"  首字节 p50 {_fmt_ms(result['ttfb_p50_ms'])}"
+    if memory is not None:
+        line += f"  峰值内存 {memory:.1f}MB"
+    errors = sum(result["errors"].values())
+    if errors:
+        line += f"  错误 {errors}"
+    print(line)
+
+
+def _fmt_ms(value: Optional[float]) -> str:
+    return f"{value:>8.1f}ms" if value is not None else "       -  "
+
+
+def compare(previous_path: str, current: Dict[str, Any]) -> None:
+    """按场景和并发数对比吞吐量和 p95"""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+
+    def index(report: Dict[str, Any]) -> Dict[tuple, Dict[str, Any]]:
+        return {
+            (name, level["concurrency"]): level
+            for name, levels in report["scenarios"].items()
+            for level in levels
+        }
+
+    old, new = index(previous), index(current)
+    print(f"\n对比 {previous_path}（commit {previous.get('git_commit')}）")
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        p95_before, p95_after = before["latency_ms"]["p95"], after["latency_ms"]["p95"]
+        rps_change = (
+            f"{(after['throughput_rps'] / before['throughput_rps'] - 1):+.0%}"
+            if before["throughput_rps"]
+            else "-"
+        )
+        p95_change = f"{(p95_after / p95_before - 1):+.0%}" if p95_before and p95_after else "-"
+        print(
+            f"  {key[0]:<16} c={key[1]:<4} "
+            f"吞吐 {before['throughput_rps']:>8.1f} → {after['throughput_rps']:>8.1f} ({rps_change:>5})  "
+            f"p95 {_fmt_ms(p95_before)} → {_fmt_ms(p95_after)} ({p95_change:>5})"
+        )
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景名")
+    arg_parser.add_argument("--concurrency", default="1,4,16,64")
+    arg_parser.add_argument("--duration", type=float, default=5.0, help="每个并发级别的压测时长（秒）")
+    arg_parser.add_argument("--max-requests", type=int, default=None, help="每个并发级别最多发出的请求数")
+    arg_parser.add_argument("--timeout", type=float, default=120.0)
+    arg_parser.add_argument("--latency-ms", default="200", help="模拟上游延迟")
+    arg_parser.add_argument(
+        "--latency-dist",
+        default="lognormal",
+        choices=["fixed", "uniform", "normal", "lognormal", "exponential"],
+    )
+    arg_parser.add_argument("--latency-jitter-ms", default="50")
+    arg_parser.add_argument("--latency-sigma", default="0.5")
+    arg_parser.add_argument("--token-rate", default="0", help="模拟输出速度（token/秒）")
+    arg_parser.add_argument("--error-rate", default="0")
+    arg_parser.add_argument("--error-status", default="500")
+    arg_parser.add_argument("--seed", default="42")
+    arg_parser.add_argument("--with-caches", action="store_true", help="保留缓存和请求合并")
+    arg_parser.add_argument("--app-dir", default=BACKEND_DIR, help="被测后端代码所在目录")
+    arg_parser.add_argument("--output", default=None, help="结果 JSON 路径，默认 benchmarks/results/")
+    arg_parser.add_argument("--compare", default=None, help="与之前保存的结果 JSON 对比")
+    args = arg_parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        arg_parser.error(f"未知场景: {', '.join(unknown)}（可选: {', '.join(SCENARIOS)}）")
+    levels = [int(value) for value in args.concurrency.split(",")]
+
+    mock_env = {
+        "MOCK_LATENCY_MS": args.latency_ms,
+        "MOCK_LATENCY_DIST": args.latency_dist,
+        "MOCK_LATENCY_JITTER_MS": args.latency_jitter_ms,
+        "MOCK_LATENCY_SIGMA": args.latency_sigma,
+        "MOCK_TOKEN_RATE": args.token_rate,
+        "MOCK_ERROR_RATE": args.error_rate,
+        "MOCK_ERROR_STATUS": args.error_status,
+        "MOCK_SEED": args.seed,
+    }
+    app_env = mock_upstream_env()
+    if not args.with_caches:
+        app_env.update(NO_CACHE_ENV)
+
+    report: Dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": levels,
+            "duration_s": args.duration,
+            "max_requests": args.max_requests,
+            "with_caches": args.with_caches,
+            "mock": mock_env,
+        },
+        "scenarios": {},
+    }
+
+    mock = start_server("benchmarks.mock_upstream:app", MOCK_PORT, env=mock_env)
+    app = start_server("main:app", APP_PORT, cwd=args.app_dir, env=app_env)
+    try:
+        baseline = read_memory_kb(app.pid)
+        report["baseline_rss_mb"] = round(baseline["VmRSS"] / 1024, 1)
+        print(
+            f"模拟上游: {args.latency_dist} {args.latency_ms}ms  错误率 {args.error_rate}  "
+            f"缓存: {'开' if args.with_caches else '关'}  启动后内存 {report['baseline_rss_mb']}MB"
+        )
+
+        for name in names:
+            state: Dict[str, Any] = {}
+            results = []
+            for concurrency in levels:
+                peak_resettable = reset_peak_memory(app.pid)
+                result = asyncio.run(
+                    run_level(
+                        SCENARIOS[name],
+                        concurrency,
+                        args.duration,
+                        args.max_requests,
+                        args.timeout,
+                        state,
+                    )
+                )
+                if peak_resettable:
+                    result["peak_rss_mb"] = round(read_memory_kb(app.pid)["VmHWM"] / 1024, 1)
+                if state.get("ttfb"):
+                    result["ttfb_p50_ms"] = round(percentile(state["ttfb"], 0.50) * 1000, 1)
+                    result["ttfb_p95_ms"] = round(percentile(state["ttfb"], 0.95) * 1000, 1)
+                    state["ttfb"] = []
+                print_level(name, result)
+                results.append(result)
+            report["scenarios"][name] = results
+
+        with httpx.Client(timeout=10) as client:
+            report["upstream_calls"] = client.get(f"http://127.0.0.1:{MOCK_PORT}/mock/stats").json()
+        report["final_rss_mb"] = round(read_memory_kb(app.pid)["VmRSS"] / 1024, 1)
+    finally:
+        stop_server(app)
+        stop_server(mock)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 结果已保存: {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+图片识别上传的内存占用测试
+
+每组测试启动一个全新的后端进程，同时上传若干张大尺寸图片，
+从 /proc/<pid>/status 读取进程的峰值常驻内存（VmHWM）。仅支持 Linux。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.bench_upload_memory --concurrency 1,4,8
+
+对比改造前的代码：
+
+    git worktree add /tmp/baseline <commit>
+    python -m benchmarks.bench_upload_memory --app-dir /tmp/baseline/backend
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks.harness import (
+    APP_PORT,
+    BACKEND_DIR,
+    MOCK_PORT,
+    mock_upstream_env,
+    start_server,
+    stop_server,
+)
+
+UPLOAD_PATH = "/api/v1/ingredients/analyze"
+
+
+def noise_jpeg(width: int, height: int) -> bytes:
+    """随机噪声几乎无法压缩，用来模拟体积较大的手机原图"""
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def read_memory_kb(pid: int) -> dict:
+    """读取进程当前和峰值常驻内存（KB）"""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0])
+    return values
+
+
+async def upload(concurrency: int, data: bytes) -> list:
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{APP_PORT}", timeout=300
+    ) as client:
+        responses = await asyncio.gather(
+            *[
+                client.post(
+                    UPLOAD_PATH,
+                    files={"file": (f"upload-{i}.jpg", data, "image/jpeg")},
+                )
+                for i in range(concurrency)
+            ]
+        )
+    return [response.status_code for response in responses]
+
+
+def run(app_dir: str, concurrency: int, data: bytes) -> dict:
+    app = start_server("main:app", APP_PORT, cwd=app_dir, env=mock_upstream_env())
+    try:
+        before = read_memory_kb(app.pid)
+        start = time.perf_counter()
+        statuses = asyncio.run(upload(concurrency, data))
+        elapsed = time.perf_counter() - start
+        after = read_memory_kb(app.pid)
+    finally:
+        stop_server(app)
+
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "idle_mb": before["VmRSS"] / 1024,
+        "peak_mb": after["VmHWM"] / 1024,
+        "growth_mb": (after["VmHWM"] - before["VmRSS"]) / 1024,
+        "statuses": sorted(set(statuses)),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--app-dir", default=BACKEND_DIR, help="后端代码目录")
+    arg_parser.add_argument("--concurrency", default="1,4,8")
+    arg_parser.add_argument("--width", type=int, default=3000)
+    arg_parser.add_argument("--height", type=int, default=2250)
+    args = arg_parser.parse_args()
+
+    data = noise_jpeg(args.width, args.height)
+    mock = start_server("benchmarks.mock_upstream:app", MOCK_PORT)
+
+    try:
+        print(f"代码目录: {args.app_dir}")
+        print(f"上传图片: {args.width}x{args.height} JPEG, {len(data) / 1024 / 1024:.1f} MB")
+        print(f"{'并发':>6} {'耗时(s)':>9} {'空闲(MB)':>10} {'峰值(MB)':>10} {'增长(MB)':>10}  状态码")
+        for level in [int(level) for level in args.concurrency.split(",")]:
+            result = run(args.app_dir, level, data)
+            print(
+                f"{result['concurrency']:>6} {result['elapsed_s']:>9.2f} "
+                f"{result['idle_mb']:>10.1f} {result['peak_mb']:>10.1f} "
+                f"{result['growth_mb']:>10.1f}  {result['statuses']}"
+            )
+    finally:
+        stop_server(mock)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+检查各组件发给上游的提示词前缀是否逐字节不变
+
+上游的提示词缓存（prompt caching）按前缀匹配：只有每次请求开头的内容完全相同，才能复用上一次的计算。
+本脚本让每个组件用不同的输入各调用几次本地模拟上游，记录实际发出的 messages，检查：
+
+1. 静态部分（最后一条用户消息之前的所有消息；识图请求是图片之前的文字）在所有调用中逐字节相同
+2. 本次调用的动态输入（用户描述、食材、菜谱、优化需求等）没有出现在静态部分中
+3. 动态部分（最后一条消息）的末尾没有大段各次调用都相同的内容，
+   即规则、JSON结构等静态内容没有放在动态内容之后
+
+最后输出每个组件静态前缀的估算 token 数，以及第二次起的调用命中模拟上游提示词缓存的 token 数。
+任何一项检查失败时以非零状态码退出，可以在提交前或 CI 中运行。
+
+用法（在 backend 目录下运行）：
+
+    python -m benchmarks.check_prompt_prefix
+"""
+
+import asyncio
+import copy
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.harness import BACKEND_DIR, MOCK_PORT, mock_upstream_env, start_server, stop_server
+from benchmarks.mock_upstream import MOCK_RECIPE, _estimate_tokens
+
+# 动态消息末尾允许的相同内容（估算 token），例如收尾的引号和换行
+MAX_STATIC_SUFFIX_TOKENS = 32
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(BACKEND_DIR), "ingredients.jpeg")
+
+HISTORY = [
+    {"role": "user", "content": "我不吃辣，也不要放香菜"},
+    {"role": "assistant", "content": "好的，已经去掉了辣椒和香菜。"},
+    {"role": "user", "content": "牛肉改成切丁"},
+    {"role": "assistant", "content": "好的，牛肉已改为切丁。"},
+    {"role": "user", "content": "少放点油"},
+    {"role": "assistant", "content": "好的，用油减少了一半。"},
+]
+
+
+def record_calls(component: Any, calls: List[list]) -> None:
+    """包装组件的 chat.completions.create，记录每次调用的 messages"""
+    completions = component.client.chat.completions
+    create = completions.create
+
+    async def recording_create(**kwargs):
+        calls.append(copy.deepcopy(kwargs["messages"]))
+        return await create(**kwargs)
+
+    completions.create = recording_create
+
+
+def static_part(messages: list) -> str:
+    """最后一条消息之前的全部内容；只有一条消息时取其中图片之前的文字"""
+    if len(messages) > 1:
+        return json.dumps(messages[:-1], ensure_ascii=False)
+    content = messages[-1]["content"]
+    if isinstance(content, list):
+        leading = []
+        for item in content:
+            if item.get("type") != "text":
+                break
+            leading.append(item["text"])
+        return json.dumps(leading, ensure_ascii=False)
+    return ""
+
+
+def dynamic_part(messages: list) -> str:
+    return json.dumps(messages[-1], ensure_ascii=False)
+
+
+def common_suffix(texts: List[str]) -> str:
+    shortest = min(texts, key=len)
+    length = 0
+    while length < len(shortest) and all(text[-length - 1] == shortest[-length - 1] for text in texts):
+        length += 1
+    return shortest[len(shortest) - length :]
+
+
+def estimate_tokens(text: str) -> int:
+    return int(sum(_estimate_tokens(char) for char in text))
+
+
+def recipe_variant(dish_name: str, first_step: str) -> Dict[str, Any]:
+    recipe = copy.deepcopy(MOCK_RECIPE)
+    recipe["dish_name"] = dish_name
+    recipe["instructions"][0]["description"] = first_step
+    return recipe
+
+
+async def run_checks() -> List[Dict[str, Any]]:
+    from cache import Cache, MemoryCacheBackend
+    from conversation_summary import ConversationSummarizer
+    from generator import RecipeGenerator
+    from ingredient_analyzer import IngredientAnalyzer
+    from intent_classifier import IntentClassifier
+    from parser import RecipeRequirementsParser
+    from recipe_optimizer import RecipeOptimizer
+
+    # 每个检查：(名称, 组件, [调用及其动态输入])
+    parser = RecipeRequirementsParser()
+    generator = RecipeGenerator()
+    patch_optimizer = RecipeOptimizer(mode="patch")
+    full_optimizer = RecipeOptimizer(mode="full")
+    summarizer = ConversationSummarizer(
+        Cache("check_summaries", MemoryCacheBackend()), recent_messages=2, max_pending_messages=1
+    )
+    intent = IntentClassifier()
+    analyzer = IngredientAnalyzer()
+
+    async def consume(stream):
+        async for _ in stream:
+            pass
+
+    async def analyze_image():
+        with open(SAMPLE_IMAGE, "rb") as f:
+            await analyzer.analyze_image_for_ingredients(f)
+
+    def generate(ingredients, cuisine, serving_size):
+        return lambda: generator.generate_recipe(
+            ingredients, cuisine_type=cuisine, serving_size=serving_size, use_cache=False
+        )
+
+    def stream(ingredients, cuisine):
+        return lambda: consume(generator.stream_recipe(ingredients, cuisine_type=cuisine, use_cache=False))
+
+    def optimize(optimizer, recipe, request, history):
+        return lambda: optimizer.optimize_recipe(recipe, request, history)
+
+    def fold(history):
+        return lambda: summarizer.build_context(history)
+
+    recipe_a = recipe_variant("洋葱炒牛肉", "牛肉切片腌制。")
+    recipe_b = recipe_variant("番茄炒蛋", "鸡蛋打散加盐。")
+    checks: List[tuple] = [
+        ("parser", parser, [
+            (lambda: parser.parse_requirements("冰箱里有牛肉和洋葱，半小时内搞定"), ["牛肉和洋葱"]),
+            (lambda: parser.parse_requirements("想吃番茄炒蛋，少油"), ["番茄炒蛋"]),
+        ]),
+        ("generator", generator, [
+            (generate(["牛肉", "洋葱"], "川菜", 3), ["牛肉、洋葱", "川菜"]),
+            (generate(["豆腐"], "日式", 1), ["豆腐", "日式"]),
+            (stream(["鸡蛋", "番茄"], "粤菜"), ["鸡蛋、番茄", "粤菜"]),
+        ]),
+        ("generator_fused", generator, [
+            (lambda: generator.generate_recipe_from_description("冰箱里有牛肉和洋葱"), ["牛肉和洋葱"]),
+            (lambda: consume(generator.stream_recipe_from_description("想吃番茄炒蛋")), ["番茄炒蛋"]),
+        ]),
+        ("optimizer_patch", patch_optimizer, [
+            (optimize(patch_optimizer, recipe_a, "牛肉改成切丁", []), ["洋葱炒牛肉", "牛肉改成切丁"]),
+            (optimize(patch_optimizer, recipe_b, "不要放葱", HISTORY[:2]), ["番茄炒蛋", "不要放葱"]),
+        ]),
+        ("optimizer_full", full_optimizer, [
+            (optimize(full_optimizer, recipe_a, "牛肉改成切丁", []), ["洋葱炒牛肉", "牛肉改成切丁"]),
+            (optimize(full_optimizer, recipe_b, "不要放葱", HISTORY[:2]), ["番茄炒蛋", "不要放葱"]),
+        ]),
+        ("summarizer", summarizer, [
+            (fold(HISTORY[:4]), ["不吃辣"]),
+            (fold(HISTORY[2:] + HISTORY[:2]), ["少放点油"]),
+        ]),
+        ("intent", intent, [
+            (lambda: intent._classify_llm("随便来点第1份"), ["随便来点第1份"]),
+            (lambda: intent._classify_llm("今天吃什么好"), ["今天吃什么好"]),
+        ]),
+    ]
+    if os.path.exists(SAMPLE_IMAGE):
+        checks.append(("vision", analyzer, [(analyze_image, []), (analyze_image, [])]))
+
+    results = []
+    for name, component, runs in checks:
+        calls: List[list] = []
+        record_calls(component, calls)
+        dynamic_inputs = []
+        for run, inputs in runs:
+            await run()
+            dynamic_inputs.extend(inputs)
+
+        statics = [static_part(messages) for messages in calls]
+        errors = []
+        if len(calls) < 2:
+            errors.append(f"只记录到 {len(calls)} 次调用")
+        if any(static != statics[0] for static in statics):
+            errors.append("静态前缀在不同调用之间不一致")
+        if not statics or not statics[0]:
+            errors.append("没有静态前缀")
+        leaked = [text for text in dynamic_inputs if statics and text in statics[0]]
+        if leaked:
+            errors.append(f"动态内容出现在静态前缀中: {leaked}")
+        # 识图请求的动态部分是图片本身，这里用的是同一张图片，不检查
+        suffix_tokens = (
+            estimate_tokens(common_suffix([dynamic_part(messages) for messages in calls]))
+            if len(calls) >= 2 and name != "vision"
+            else 0
+        )
+        if suffix_tokens > MAX_STATIC_SUFFIX_TOKENS:
+            errors.append(f"动态消息末尾有约 {suffix_tokens} token 的相同内容，应移到静态前缀中")
+        results.append(
+            {
+                "name": name,
+                "calls": len(calls),
+                "distinct_prefixes": len(set(statics)),
+                "static_tokens": estimate_tokens(statics[0]) if statics else 0,
+                "suffix_tokens": suffix_tokens,
+                "errors": errors,
+            }
+        )
+    return results
+
+
+def cached_tokens_by_component() -> Dict[str, Dict[str, float]]:
+    from metrics import render_prometheus
+
+    usage: Dict[str, Dict[str, float]] = {}
+    pattern = r'recipe_agent_upstream_tokens_total\{component="([^"]+)",type="([^"]+)"\} (\S+)'
+    for component, token_type, value in re.findall(pattern, render_prometheus()):
+        usage.setdefault(component, {})[token_type] = float(value)
+    return usage
+
+
+def main() -> None:
+    mock = start_server("benchmarks.mock_upstream:app", MOCK_PORT, env={"MOCK_LATENCY_MS": "0"})
+    try:
+        os.environ.update(mock_upstream_env())
+        results = asyncio.run(run_checks())
+    finally:
+        stop_server(mock)
+
+    failed = False
+    print(f"{'组件':<18} {'调用次数':>6} {'静态前缀':>8} {'动态消息末尾的相同内容':>12}  结果（估算 token）")
+    for result in results:
+        status = "✅" if not result["errors"] else "❌ " + "；".join(result["errors"])
+        failed = failed or bool(result["errors"])
+        print(
+            f"{result['name']:<18} {result['calls']:>8} {result['static_tokens']:>12} "
+            f"{result['suffix_tokens']:>22}  {status}"
+        )
+
+    print("\n上游 token 用量（prompt / cached / completion）：")
+    for component, usage in sorted(cached_tokens_by_component().items()):
+        prompt = usage.get("prompt", 0)
+        cached = usage.get("cached", 0)
+        rate = cached / prompt if prompt else 0.0
+        print(
+            f"  {component:<12} {prompt:>8.0f} / {cached:>8.0f} / {usage.get('completion', 0):>8.0f}"
+            f"  缓存命中 {rate:.0%}"
+        )
+    print("\n注意：模拟上游与 OpenAI 一样，前缀不足 1024 token 时不会缓存")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+基准测试公共工具：启动/停止本地服务进程，等待服务就绪
+"""
+
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MOCK_PORT = 9100
+APP_PORT = 9200
+
+
+def mock_upstream_env(mock_port: int = MOCK_PORT) -> Dict[str, str]:
+    """让后端所有上游调用都指向本地模拟服务的环境变量"""
+    return {
+        "OPENAI_API_KEY": "sk-mock",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "DASHSCOPE_API_KEY": "sk-mock",
+        "DASHSCOPE_HTTP_BASE_URL": f"http://127.0.0.1:{mock_port}/api/v1",
+        # 模拟上游默认不限流，后端也不按真实账号的限额排队，否则会限制压测的吞吐量
+        "RATE_LIMIT_OPENAI_RPM": "0",
+        "RATE_LIMIT_OPENAI_TPM": "0",
+        "RATE_LIMIT_DASHSCOPE_RPM": "0",
+        # 需求解析都调用 LLM，各压测的上游调用次数与本地规则解析无关（本地解析见 bench_local_parser）
+        "PARSER_LOCAL_THRESHOLD": "1.01",
+    }
+
+
+def start_server(
+    app_path: str,
+    port: int,
+    cwd: str = BACKEND_DIR,
+    env: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    tls: Optional[Tuple[str, str]] = None,
+) -> subprocess.Popen:
+    """用 uvicorn 在子进程中启动一个 ASGI 应用，tls 为 (证书文件, 私钥文件) 时以 HTTPS 提供服务"""
+    process_env = os.environ.copy()
+    process_env.update(env or {})
+    # 让子进程能导入 benchmarks 包
+    process_env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [cwd, BACKEND_DIR, process_env.get("PYTHONPATH")])
+    )
+
+    tls_args = ["--ssl-certfile", tls[0], "--ssl-keyfile", tls[1]] if tls else []
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            app_path,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            *tls_args,
+        ],
+        cwd=cwd,
+        env=process_env,
+        stdout=subprocess.DEVNULL,
+    )
+    scheme = "https" if tls else "http"
+    wait_until_ready(f"{scheme}://127.0.0.1:{port}/docs")
+    return process
+
+
+def wait_until_ready(url: str, timeout: float = 20.0) -> None:
+    """轮询直到服务可以响应请求"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # 只用于探测本地服务是否启动，不校验自签名证书
+            httpx.get(url, timeout=1.0, verify=False)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"服务未能在 {timeout} 秒内就绪: {url}")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    """停止服务子进程"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
@@ -0,0 +1,438 @@
+"""
+本地模拟上游服务（OpenAI Chat Completions + DashScope MultiModalConversation）
+
+用于在不花费真实API费用的情况下压测后端。启动方式：
+
+    uvicorn benchmarks.mock_upstream:app --port 9100
+
+然后让后端指向它：
+
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:9100/api/v1
+
+环境变量：
+    MOCK_LATENCY_MS: 每次调用的模拟延迟（毫秒），默认 500
+    MOCK_LATENCY_DIST: 延迟分布，默认 fixed
+        fixed        每次都是 MOCK_LATENCY_MS
+        uniform      在 MOCK_LATENCY_MS ± MOCK_LATENCY_JITTER_MS 之间均匀分布
+        normal       均值 MOCK_LATENCY_MS，标准差 MOCK_LATENCY_JITTER_MS
+        lognormal    中位数 MOCK_LATENCY_MS，形状参数 MOCK_LATENCY_SIGMA（默认 0.5），长尾
+        exponential  均值 MOCK_LATENCY_MS
+    MOCK_LATENCY_JITTER_MS: uniform / normal 分布的离散程度（毫秒），默认 100
+    MOCK_TOKEN_RATE: 模拟输出速度（token/秒），0 表示不按输出长度增加延迟
+    MOCK_ERROR_RATE: 调用失败的概率（0~1），默认 0
+    MOCK_ERROR_STATUS: 注入错误时返回的 HTTP 状态码，默认 500（例如 429 模拟限流）
+    MOCK_TIMEOUT_RATE: 调用卡住不返回的概率（0~1），默认 0
+    MOCK_TIMEOUT_S: 卡住的时长（秒），默认 60
+    MOCK_RATE_LIMIT_RPM: 模拟上游的每分钟请求数限额，0（默认）表示不限制。按 10 秒的滑动窗口统计
+        （窗口内最多 RPM/6 次），超出时 Chat Completions 返回 429 并带 Retry-After: 1
+    MOCK_SEED: 随机数种子，设置后延迟和错误注入可复现
+    MOCK_PROMPT_CACHE: 是否模拟上游的提示词缓存，默认 true。与 OpenAI 一样，
+        提示词前缀达到 1024 token 后按 128 token 的粒度缓存，命中的部分在
+        usage.prompt_tokens_details.cached_tokens 中返回（token 数按中文一字一个、其他字符四个一个估算）
+
+GET /mock/stats 返回收到的上游调用次数和注入的错误数。
+POST /mock/faults 在运行中修改故障注入配置，例如模拟上游故障后恢复：
+
+    {"error_rate": 1.0, "error_status": 503, "timeout_rate": 0, "timeout_s": 60, "latency_ms": 50,
+     "rate_limit_rpm": 600}
+
+只修改请求中出现的字段，返回修改后的配置。
+"""
+
+import asyncio
+import json
+import os
+import random
+import struct
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+app = FastAPI()
+
+LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "500"))
+LATENCY_DIST = os.getenv("MOCK_LATENCY_DIST", "fixed").lower()
+LATENCY_JITTER_MS = float(os.getenv("MOCK_LATENCY_JITTER_MS", "100"))
+LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", "0.5"))
+TOKEN_RATE = float(os.getenv("MOCK_TOKEN_RATE", "0"))
+ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+ERROR_STATUS = int(os.getenv("MOCK_ERROR_STATUS", "500"))
+TIMEOUT_RATE = float(os.getenv("MOCK_TIMEOUT_RATE", "0"))
+TIMEOUT_S = float(os.getenv("MOCK_TIMEOUT_S", "60"))
+RATE_LIMIT_RPM = float(os.getenv("MOCK_RATE_LIMIT_RPM", "0"))
+PROMPT_CACHE = os.getenv("MOCK_PROMPT_CACHE", "true").lower() == "true"
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+PROMPT_CACHE_MAX_ENTRIES = 100_000
+
+_random = random.Random(os.getenv("MOCK_SEED"))
+
+# 收到的上游调用次数，供基准测试通过 GET /mock/stats 读取
+CALL_COUNTS = {
+    "chat_completions": 0,
+    "multimodal_generation": 0,
+    "injected_errors": 0,
+    "injected_timeouts": 0,
+    "rate_limited": 0,
+}
+
+# 最近 10 秒内放行的调用时间，用于模拟上游限流
+_RATE_WINDOW_S = 10
+_recent_calls: deque = deque()
+
+MOCK_REQUIREMENTS = {
+    "ingredients": ["牛肉", "洋葱"],
+    "max_cook_time_mins": 30,
+    "dietary_requirements": ["不辣"],
+    "cuisine_preference": "中式",
+    "difficulty_preference": "简单",
+    "calorie_preference": None,
+    "serving_size": 2,
+}
+
+MOCK_RECIPE = {
+    "dish_name": "洋葱炒牛肉",
+    "description": "经典家常快手菜，牛肉嫩滑，洋葱香甜。",
+    "cuisine_type": "中式",
+    "difficulty": "简单",
+    "prep_time_mins": 10,
+    "cook_time_mins": 15,
+    "servings": 2,
+    "ingredients": [
+        {"name": "牛肉", "amount": 300, "unit": "g"},
+        {"name": "洋葱", "amount": 1, "unit": "个"},
+        {"name": "生抽", "amount": 1, "unit": "汤匙"},
+    ],
+    "instructions": [
+        {"step": 1, "description": "牛肉切片，用生抽和淀粉腌制10分钟。"},
+        {"step": 2, "description": "洋葱切丝。"},
+        {"step": 3, "description": "热锅下油，大火快炒牛肉至变色盛出。"},
+        {"step": 4, "description": "炒香洋葱后倒回牛肉，翻炒均匀即可。"},
+    ],
+    "tips": ["牛肉逆纹切更嫩。"],
+    "nutritional_info": {
+        "calories_kcal": 420,
+        "protein_g": 35,
+        "carbs_g": 12,
+        "fat_g": 22,
+    },
+}
+
+# 补丁模式的菜谱优化：只引用第1步，适用于任何至少有一个步骤的菜谱
+MOCK_RECIPE_PATCH = {
+    "type": "patch",
+    "description": "牛肉切丁腌制，口感更嫩。",
+    "prep_time_mins": 15,
+    "ingredients": {"upsert": [{"name": "淀粉", "amount": 1, "unit": "茶匙"}]},
+    "instructions": [
+        {"op": "replace", "step": 1, "description": "牛肉切1厘米见方的丁，用生抽、料酒和淀粉腌制15分钟。"},
+        {"op": "insert_after", "step": 1, "description": "腌好的牛肉丁拌入少许油，下锅不易粘连。"},
+    ],
+    "nutritional_info": {"calories_kcal": 430},
+}
+
+MOCK_VISION = {
+    "ingredients": ["鸡蛋", "西红柿", "青椒"],
+    "confidence": "high",
+    "description": "图片中有鸡蛋、西红柿和青椒",
+}
+
+
+def _flatten_text(messages: list) -> str:
+    """把所有消息中的文本拼接起来，用于判断是哪个组件发来的请求"""
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            for item in content:
+                if isinstance(item, dict):
+                    parts.append(item.get("text") or item.get("type") or "")
+    return "\n".join(parts)
+
+
+def _mock_content(messages: list) -> str:
+    """根据提示词内容返回对应组件期望的模拟结果"""
+    text = _flatten_text(messages)
+    recipe = MOCK_RECIPE
+    if "不要返回 tips 和 nutritional_info" in text:
+        # 精简菜谱（截止时间快到时的降级），输出更短
+        recipe = {k: v for k, v in MOCK_RECIPE.items() if k not in ("tips", "nutritional_info")}
+
+    if "意图识别" in text:
+        return "是"
+    if "约束摘要" in text:
+        # 把已有摘要和新增的用户消息拼起来，长度与真实摘要相近
+        previous = text.split("已有摘要：", 1)[-1].split("\n", 1)[0]
+        requests = [line[4:] for line in text.splitlines() if line.startswith("用户: ")]
+        parts = ([previous] if previous and previous != "无" else []) + requests
+        return json.dumps({"summary": "；".join(parts)[-300:]}, ensure_ascii=False)
+    if "需求解析和菜谱创作" in text:
+        return json.dumps(
+            {"requirements": MOCK_REQUIREMENTS, "recipe": recipe},
+            ensure_ascii=False,
+        )
+    if "修改补丁" in text:
+        return json.dumps(MOCK_RECIPE_PATCH, ensure_ascii=False)
+    if "image_url" in text:
+        return json.dumps(MOCK_VISION, ensure_ascii=False)
+    if "需求分析" in text:
+        return json.dumps(MOCK_REQUIREMENTS, ensure_ascii=False)
+    return json.dumps(recipe, ensure_ascii=False)
+
+
+# 已经出现过的提示词前缀（按缓存粒度切分后的哈希）
+_cached_prefixes: set = set()
+
+
+def _estimate_tokens(char: str) -> float:
+    return 1.0 if ord(char) >= 0x2E80 else 0.25
+
+
+def _prompt_usage(messages: list) -> Dict[str, Any]:
+    """估算 prompt token 数，并按已出现过的前缀模拟提示词缓存的命中"""
+    text = "".join(
+        f"<{message.get('role')}>{_flatten_text([message])}" for message in messages
+    )
+    tokens = 0.0
+    boundaries = []  # (前缀的 token 数, 前缀的字符数)
+    next_boundary = PROMPT_CACHE_MIN_TOKENS
+    for index, char in enumerate(text):
+        tokens += _estimate_tokens(char)
+        if tokens >= next_boundary:
+            boundaries.append((next_boundary, index + 1))
+            next_boundary += PROMPT_CACHE_INCREMENT
+
+    cached = 0
+    if PROMPT_CACHE:
+        if len(_cached_prefixes) > PROMPT_CACHE_MAX_ENTRIES:
+            _cached_prefixes.clear()
+        for boundary_tokens, length in boundaries:
+            key = hash(text[:length])
+            if key in _cached_prefixes:
+                cached = boundary_tokens
+            _cached_prefixes.add(key)
+    return {"prompt_tokens": int(tokens), "prompt_tokens_details": {"cached_tokens": cached}}
+
+
+def _base_latency() -> float:
+    """按 MOCK_LATENCY_DIST 抽样一次调用的基础延迟（秒）"""
+    if LATENCY_DIST == "uniform":
+        latency_ms = _random.uniform(LATENCY_MS - LATENCY_JITTER_MS, LATENCY_MS + LATENCY_JITTER_MS)
+    elif LATENCY_DIST == "normal":
+        latency_ms = _random.gauss(LATENCY_MS, LATENCY_JITTER_MS)
+    elif LATENCY_DIST == "lognormal":
+        latency_ms = _random.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MS
+    elif LATENCY_DIST == "exponential":
+        latency_ms = _random.expovariate(1 / LATENCY_MS) if LATENCY_MS > 0 else 0
+    else:
+        latency_ms = LATENCY_MS
+    return max(latency_ms, 0) / 1000
+
+
+def _completion_latency(content: str) -> float:
+    """模拟延迟 = 基础延迟 + 输出token数 / 输出速度（中文按一个字一个token估算）"""
+    latency = _base_latency()
+    if TOKEN_RATE > 0:
+        latency += len(content) / TOKEN_RATE
+    return latency
+
+
+def _rate_limited() -> bool:
+    """超过 MOCK_RATE_LIMIT_RPM 时返回 True，被限流的调用不计入窗口"""
+    if RATE_LIMIT_RPM <= 0:
+        return False
+    now = time.monotonic()
+    while _recent_calls and _recent_calls[0] <= now - _RATE_WINDOW_S:
+        _recent_calls.popleft()
+    if len(_recent_calls) >= RATE_LIMIT_RPM * _RATE_WINDOW_S / 60:
+        CALL_COUNTS["rate_limited"] += 1
+        return True
+    _recent_calls.append(now)
+    return False
+
+
+async def _injected_failure(body: Dict[str, Any]) -> Optional[Response]:
+    """
+    按配置的概率注入故障：卡住 MOCK_TIMEOUT_S 秒，或返回 MOCK_ERROR_STATUS 错误
+
+    没有注入错误时返回 None
+    """
+    if TIMEOUT_RATE > 0 and _random.random() < TIMEOUT_RATE:
+        CALL_COUNTS["injected_timeouts"] += 1
+        await asyncio.sleep(TIMEOUT_S)
+
+    if ERROR_RATE > 0 and _random.random() < ERROR_RATE:
+        CALL_COUNTS["injected_errors"] += 1
+        await asyncio.sleep(_base_latency())
+        return JSONResponse(body, status_code=ERROR_STATUS)
+    return None
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request) -> Any:
+    CALL_COUNTS["chat_completions"] += 1
+    body = await request.json()
+
+    if _rate_limited():
+        return JSONResponse(
+            {"error": {"message": "mock rate limit", "type": "requests", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"Retry-After": "1"},
+        )
+
+    failure = await _injected_failure(
+        {"error": {"message": "mock injected error", "type": "server_error", "code": None}}
+    )
+    if failure is not None:
+        return failure
+
+    content = _mock_content(body.get("messages", []))
+    usage = _prompt_usage(body.get("messages", []))
+    usage["completion_tokens"] = len(content)
+    usage["total_tokens"] = usage["prompt_tokens"] + len(content)
+
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream_chunks(body, content, usage), media_type="text/event-stream"
+        )
+
+    await asyncio.sleep(_completion_latency(content))
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage,
+    }
+
+
+async def _stream_chunks(body: dict, content: str, usage: dict):
+    """按 OpenAI 流式格式逐块返回内容：固定延迟后开始输出，之后按输出速度推送"""
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+    chunk_size = 4
+
+    def chunk(delta: Optional[dict], finish_reason=None, chunk_usage=None) -> str:
+        payload = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": (
+                [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                if delta is not None
+                else []
+            ),
+        }
+        if chunk_usage is not None:
+            payload["usage"] = chunk_usage
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    await asyncio.sleep(_base_latency())
+    yield chunk({"role": "assistant", "content": ""})
+
+    for start in range(0, len(content), chunk_size):
+        if TOKEN_RATE > 0:
+            await asyncio.sleep(chunk_size / TOKEN_RATE)
+        yield chunk({"content": content[start : start + chunk_size]})
+
+    yield chunk({}, finish_reason="stop")
+    # 与 OpenAI 一致：请求了 stream_options.include_usage 时，最后一个分块没有 choices，只有 usage
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield chunk(None, chunk_usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+def _mock_png(size: int = 64) -> bytes:
+    """生成一张纯色PNG图片"""
+
+    def png_chunk(tag: bytes, data: bytes) -> bytes:
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    row = b"\x00" + b"\xe0\x90\x40" * size
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", zlib.compress(row * size))
+        + png_chunk(b"IEND", b"")
+    )
+
+
+MOCK_PNG = _mock_png()
+
+
+@app.get("/mock.png")
+async def mock_image() -> Response:
+    return Response(MOCK_PNG, media_type="image/png")
+
+
+@app.post("/api/v1/services/aigc/multimodal-generation/generation")
+async def multimodal_generation(request: Request) -> Any:
+    CALL_COUNTS["multimodal_generation"] += 1
+    await request.body()
+
+    failure = await _injected_failure(
+        {"request_id": uuid.uuid4().hex, "code": "InternalError", "message": "mock injected error"}
+    )
+    if failure is not None:
+        return failure
+
+    await asyncio.sleep(_base_latency())
+
+    return {
+        "request_id": uuid.uuid4().hex,
+        "output": {
+            "choices": [
+                {
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": [{"image": "http://127.0.0.1:9100/mock.png"}],
+                    },
+                }
+            ]
+        },
+        "usage": {"width": 1328, "height": 1328, "image_count": 1},
+    }
+
+
+@app.get("/mock/stats")
+async def mock_stats() -> Dict[str, int]:
+    return CALL_COUNTS
+
+
+# POST /mock/faults 的字段 -> 模块中对应的配置
+_FAULT_SETTINGS = {
+    "error_rate": ("ERROR_RATE", float),
+    "error_status": ("ERROR_STATUS", int),
+    "timeout_rate": ("TIMEOUT_RATE", float),
+    "timeout_s": ("TIMEOUT_S", float),
+    "latency_ms": ("LATENCY_MS", float),
+    "rate_limit_rpm": ("RATE_LIMIT_RPM", float),
+}
+
+
+@app.post("/mock/faults")
+async def set_faults(request: Request) -> Dict[str, float]:
+    body = await request.json()
+    for field, (name, cast) in _FAULT_SETTINGS.items():
+        if field in body:
+            globals()[name] = cast(body[field])
+    return {field: globals()[name] for field, (name, _) in _FAULT_SETTINGS.items()}
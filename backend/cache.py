@@ -0,0 +1,495 @@
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 所有通过 create_cache 创建的缓存，用于统一输出统计信息
+_CACHE_REGISTRY: List[Any] = []
+
+DEFAULT_SQLITE_PATH = "/tmp/recipe_agent_cache.sqlite3"
+
+# 规范化时去掉的 Unicode 类别：标点(P*)、空白分隔符(Z*)、控制/格式字符(C*)、数学及修饰符号
+_STRIPPED_CATEGORIES = {
+    "Pc", "Pd", "Ps", "Pe", "Pi", "Pf", "Po",
+    "Zs", "Zl", "Zp",
+    "Cc", "Cf",
+    "Sm", "Sk",
+}
+
+
+def normalize_text(text: str) -> str:
+    """
+    把用户输入规范化为缓存键
+
+    - Unicode NFKC（同时完成全角/半角折叠，如"，"->","、"ＡＢＣ"->"ABC"）
+    - 英文字母统一小写
+    - 去掉所有标点、空白和"～"等符号；夹在两个数字之间的保留为一个字符：单独的小数点保留为"."，
+      其余统一为"-"，"1.5小时"和"15小时"、"20-30分钟"和"2030分钟"不会共用一个键
+    """
+    normalized = unicodedata.normalize("NFKC", text).casefold()
+    kept: List[str] = []
+    run: List[str] = []
+    for char in normalized:
+        if unicodedata.category(char) in _STRIPPED_CATEGORIES:
+            run.append(char)
+            continue
+        if run and char.isdigit() and kept and kept[-1].isdigit():
+            kept.append("." if run == ["."] else "-")
+        run = []
+        kept.append(char)
+    return "".join(kept)
+
+
+class CacheBackend:
+    """缓存存储后端的基类，值统一以JSON字符串存储"""
+
+    name = "base"
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def update(self, key: str, func: Callable[[Optional[str]], str]) -> None:
+        """
+        读取-修改-写回：用 func(当前值或 None) 的返回值替换当前值
+
+        子类应保证这一步是原子的，并发追加时不会丢失其他写入
+        """
+        self.set(key, func(self.get(key)))
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内 LRU + TTL 缓存，适合单个 worker"""
+
+    name = "memory"
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._set_locked(key, value)
+
+    def update(self, key: str, func: Callable[[Optional[str]], str]) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            current = None
+            if entry is not None and (entry[0] is None or entry[0] >= time.time()):
+                current = entry[1]
+            self._set_locked(key, func(current))
+
+    def _set_locked(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    基于 SQLite 文件的 LRU + TTL 缓存
+
+    默认放在 /tmp 下：Lambda 容器保持温热时可以跨调用复用，
+    同一台机器上的多个 uvicorn worker 也可以共享。
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        table: str,
+        path: str = DEFAULT_SQLITE_PATH,
+        max_size: int = 1024,
+        ttl_seconds: Optional[float] = 3600,
+    ):
+        if not table.isidentifier():
+            raise ValueError(f"非法的缓存表名: {table}")
+
+        self.table = table
+        self.path = path
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._write(key, value)
+            self._conn.commit()
+
+    def update(self, key: str, func: Callable[[Optional[str]], str]) -> None:
+        # BEGIN IMMEDIATE 立即拿到数据库的写锁，其他进程（worker）的读取-修改-写回会等待这一步完成
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                current = None
+                if row is not None and (row[1] is None or row[1] >= time.time()):
+                    current = row[0]
+                self._write(key, func(current))
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def _write(self, key: str, value: str) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+            (key, value, expires_at, now),
+        )
+        # 超出容量时淘汰最久未访问的条目
+        self._conn.execute(
+            f"""DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )""",
+            (self.max_size,),
+        )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class Cache:
+    """在存储后端之上提供JSON序列化和命中率统计"""
+
+    def __init__(self, name: str, backend: CacheBackend):
+        self.name = name
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(value)
+
+    def lookup(self, key: str) -> Tuple[Optional[Any], bool]:
+        """返回 (缓存的值, 是否需要再生成一个变体补充到这个键)；普通缓存不需要补充"""
+        return self.get(key), False
+
+    def set(self, key: str, value: Any) -> None:
+        self.backend.set(key, json.dumps(value, ensure_ascii=False))
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class VariantCache(Cache):
+    """
+    每个键保存多个变体的缓存
+
+    - 有一个变体就算命中，多个变体时轮换返回，避免相同请求总是得到一模一样的结果；
+      变体数不足 variants_per_key 时 lookup 提示调用方在后台再生成一个补充进来
+    - 读取不写回存储：轮换位置只记在进程内，过期时间在第一个变体写入时确定，之后追加变体不会延长
+    - 追加变体通过存储后端的 update 原子完成，并发写入不会互相覆盖
+    """
+
+    def __init__(self, name: str, backend: CacheBackend, variants_per_key: int = 3):
+        super().__init__(name, backend)
+        self.variants_per_key = max(1, variants_per_key)
+        self._rotation = itertools.count()
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.lookup(key)[0]
+
+    def lookup(self, key: str) -> Tuple[Optional[Any], bool]:
+        value = self.backend.get(key)
+        entry = self._live_entry(value)
+        if entry is None or not entry["variants"]:
+            self.misses += 1
+            return None, False
+
+        self.hits += 1
+        variants = entry["variants"]
+        return variants[next(self._rotation) % len(variants)], len(variants) < self.variants_per_key
+
+    def set(self, key: str, value: Any) -> None:
+        """追加一个变体，变体已满时替换最早的一个"""
+
+        def append(raw: Optional[str]) -> str:
+            entry = self._live_entry(raw)
+            if entry is None:
+                ttl = getattr(self.backend, "ttl_seconds", None)
+                entry = {"variants": [], "expires_at": time.time() + ttl if ttl else None}
+            entry["variants"] = (entry["variants"] + [value])[-self.variants_per_key :]
+            return json.dumps(entry, ensure_ascii=False)
+
+        self.backend.update(key, append)
+
+    def _live_entry(self, raw: Optional[str]) -> Optional[Dict[str, Any]]:
+        """解析存储的条目，已过期时返回 None"""
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["variants_per_key"] = self.variants_per_key
+        return stats
+
+
+class PerceptualHashCache:
+    """
+    以图片感知哈希为键的缓存
+
+    查找时返回汉明距离不超过 max_distance 的最近条目，
+    这样重新上传或轻微裁剪的同一张图片也能命中。条目数有限，按LRU淘汰。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int = 256,
+        max_distance: int = 8,
+        ttl_seconds: Optional[float] = 3600,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_hash: int) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            best_key, best_distance = None, None
+            for key, (expires_at, _) in list(self._entries.items()):
+                if expires_at is not None and expires_at < now:
+                    del self._entries[key]
+                    continue
+                distance = (key ^ image_hash).bit_count()
+                if distance <= self.max_distance and (
+                    best_distance is None or distance < best_distance
+                ):
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            return json.loads(self._entries[best_key][1])
+
+    def set(self, image_hash: int, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[image_hash] = (expires_at, json.dumps(value, ensure_ascii=False))
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "max_distance": self.max_distance,
+        }
+
+
+def create_perceptual_cache(name: str, env_prefix: str) -> Optional[PerceptualHashCache]:
+    """
+    根据环境变量创建感知哈希缓存，未启用时返回 None
+
+    读取的环境变量（以 env_prefix=VISION_CACHE 为例）：
+        VISION_CACHE_BACKEND: memory / off，默认 memory
+        VISION_CACHE_SIZE: 最大条目数，默认 256
+        VISION_CACHE_TTL: 过期时间（秒），默认 3600，0 表示不过期
+        VISION_CACHE_MAX_DISTANCE: 允许的最大汉明距离（64位哈希），默认 8
+    """
+    if os.getenv(f"{env_prefix}_BACKEND", "memory").lower() == "off":
+        return None
+
+    cache = PerceptualHashCache(
+        name,
+        max_size=int(os.getenv(f"{env_prefix}_SIZE", "256")),
+        max_distance=int(os.getenv(f"{env_prefix}_MAX_DISTANCE", "8")),
+        ttl_seconds=float(os.getenv(f"{env_prefix}_TTL", "3600")) or None,
+    )
+    _CACHE_REGISTRY.append(cache)
+    return cache
+
+
+def create_backend(
+    name: str,
+    env_prefix: str,
+    default_size: int = 1024,
+    default_ttl: float = 3600,
+    default_backend: Optional[str] = None,
+) -> Optional[CacheBackend]:
+    """
+    根据环境变量创建存储后端，未启用时返回 None
+
+    读取的环境变量（以 env_prefix=REQUIREMENTS_CACHE 为例）：
+        REQUIREMENTS_CACHE_BACKEND: memory / sqlite / off，默认为 default_backend；
+            未指定 default_backend 时在 Lambda 上使用 sqlite，其他环境使用 memory
+        REQUIREMENTS_CACHE_SIZE: 最大条目数，默认 default_size
+        REQUIREMENTS_CACHE_TTL: 过期时间（秒），默认 default_ttl，0 表示不过期
+        REQUIREMENTS_CACHE_PATH: sqlite 文件路径，默认 /tmp/recipe_agent_cache.sqlite3
+    """
+    if default_backend is None:
+        default_backend = "sqlite" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "memory"
+    backend_name = os.getenv(f"{env_prefix}_BACKEND", default_backend).lower()
+    max_size = int(os.getenv(f"{env_prefix}_SIZE", str(default_size)))
+    ttl_seconds = float(os.getenv(f"{env_prefix}_TTL", str(default_ttl))) or None
+
+    if backend_name == "off":
+        return None
+    if backend_name == "sqlite":
+        return SQLiteCacheBackend(
+            table=name,
+            path=os.getenv(f"{env_prefix}_PATH", DEFAULT_SQLITE_PATH),
+            max_size=max_size,
+            ttl_seconds=ttl_seconds,
+        )
+    if backend_name == "memory":
+        return MemoryCacheBackend(max_size=max_size, ttl_seconds=ttl_seconds)
+    raise ValueError(f"未知的缓存后端: {backend_name}")
+
+
+def create_cache(
+    name: str, env_prefix: str, variants_per_key: Optional[int] = None
+) -> Optional[Cache]:
+    """
+    根据环境变量创建缓存，未启用时返回 None
+
+    存储后端由 create_backend 按 {env_prefix}_BACKEND 等环境变量创建。
+    传入 variants_per_key 时创建 VariantCache，每个键保存多个变体，
+    可通过 {env_prefix}_VARIANTS 环境变量覆盖。
+    """
+    backend = create_backend(name, env_prefix)
+    if backend is None:
+        return None
+
+    if variants_per_key is not None:
+        variants_per_key = int(os.getenv(f"{env_prefix}_VARIANTS", variants_per_key))
+        cache = VariantCache(name, backend, variants_per_key)
+    else:
+        cache = Cache(name, backend)
+    _CACHE_REGISTRY.append(cache)
+    return cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """所有已创建缓存的统计信息"""
+    return {cache.name: cache.stats() for cache in _CACHE_REGISTRY}
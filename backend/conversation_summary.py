@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from cache import Cache
+from metrics import record_usage, span
+from resilience import get_upstream_policy
+
+SYSTEM_PROMPT = """
+你负责维护菜谱优化对话的约束摘要。根据已有摘要和新增的对话，输出更新后的摘要。
+
+要求：
+1. 保留用户提出的所有仍然有效的要求：忌口和过敏、口味偏好、食材增减和替换、份量、时间、烹饪方式等
+2. 后面的要求与前面冲突时，以后面的为准，删除被推翻的要求
+3. 不记录寒暄和AI的解释，只记录对后续优化有约束作用的内容
+4. 使用简体中文，用分号分隔各条要求，不超过{max_chars}个字
+5. 返回JSON：{{"summary": "更新后的摘要"}}
+"""
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    role = "用户" if message.get("role") == "user" else "AI"
+    return f"{role}: {message.get('content', '')}"
+
+
+def _prefix_hashes(messages: List[Dict[str, Any]]) -> List[str]:
+    """链式哈希：第 i 个值唯一对应 messages[:i+1]，同一段对话每次请求算出的前缀哈希都相同"""
+    hashes = []
+    digest = ""
+    for message in messages:
+        payload = json.dumps(
+            [digest, message.get("role"), message.get("content")], ensure_ascii=False
+        )
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        hashes.append(digest)
+    return hashes
+
+
+class ConversationSummarizer:
+    """
+    把较早的对话折叠为简短的约束摘要，最近的几条消息保留原文
+
+    前端每次请求都会带上完整的对话历史。摘要按"对话前缀"缓存（前缀的链式哈希作为键），
+    下一轮请求找到最长的已摘要前缀，只需要把新滑出窗口的消息折叠进去：
+
+    - 未折叠的消息不多时，本次请求先把它们原文放进上下文，后台折叠，不增加请求延迟
+    - 未折叠的消息太多（例如服务重启后第一次看到一段长对话）时，在请求中同步折叠
+    - 调用 LLM 失败时用本地规则拼接用户消息作为摘要，不写入缓存，下次请求重试
+    """
+
+    def __init__(
+        self,
+        cache: Cache,
+        api_key: Optional[str] = None,
+        recent_messages: Optional[int] = None,
+        max_summary_chars: Optional[int] = None,
+        max_pending_messages: Optional[int] = None,
+    ):
+        """
+        初始化对话摘要器
+
+        Args:
+            cache: 摘要缓存，键为对话前缀的哈希
+            api_key: OpenAI API密钥，如果不提供则从环境变量OPENAI_API_KEY获取
+            recent_messages: 保留原文的最近消息数，默认读取 CONVERSATION_RECENT_MESSAGES（4）
+            max_summary_chars: 摘要的最大字数，默认读取 CONVERSATION_SUMMARY_MAX_CHARS（300）
+            max_pending_messages: 超过这么多条未折叠的消息时同步折叠，
+                默认读取 CONVERSATION_SUMMARY_MAX_PENDING（6）
+        """
+        self.cache = cache
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._client = None
+        # 摘要输出很短，截止时间比生成菜谱短；失败时用本地拼接的摘要
+        self.upstream = get_upstream_policy("summarizer", timeout=10)
+        self.recent_messages = recent_messages or int(
+            os.getenv("CONVERSATION_RECENT_MESSAGES", "4")
+        )
+        self.max_summary_chars = max_summary_chars or int(
+            os.getenv("CONVERSATION_SUMMARY_MAX_CHARS", "300")
+        )
+        self.max_pending_messages = max_pending_messages or int(
+            os.getenv("CONVERSATION_SUMMARY_MAX_PENDING", "6")
+        )
+        self.folds = 0
+        self.background_folds = 0
+        self.fold_failures = 0
+        self.messages_folded = 0
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from http_pool import create_openai_client
+
+            self._client = create_openai_client(self.api_key)
+        return self._client
+
+    async def build_context(
+        self, conversation_history: Optional[List[Dict[str, Any]]]
+    ) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """
+        返回 (较早对话的摘要, 需要原文放进提示词的消息)
+
+        对话不超过 recent_messages 条时没有摘要，全部消息原文返回。
+        """
+        messages = [
+            {"role": message.get("role"), "content": message.get("content", "")}
+            for message in conversation_history or []
+            if isinstance(message, dict)
+        ]
+        if len(messages) <= self.recent_messages:
+            return None, messages
+
+        older = messages[: -self.recent_messages]
+        recent = messages[-self.recent_messages :]
+        hashes = _prefix_hashes(older)
+
+        summary, covered = self._longest_cached_prefix(hashes)
+        pending = older[covered:]
+        if not pending:
+            return summary, recent
+
+        if len(pending) > self.max_pending_messages:
+            summary = await self._fold_once(hashes[-1], summary, pending)
+            return summary, recent
+
+        self._fold_in_background(hashes[-1], summary, pending)
+        return summary, pending + recent
+
+    def _longest_cached_prefix(self, hashes: List[str]) -> Tuple[Optional[str], int]:
+        for covered in range(len(hashes), 0, -1):
+            summary = self.cache.get(hashes[covered - 1])
+            if summary is not None:
+                return summary, covered
+        return None, 0
+
+    def _fold_in_background(self, key: str, summary: Optional[str], pending: list) -> None:
+        if key in self._in_flight:
+            return
+        self.background_folds += 1
+        # 在新的上下文中运行，不计入触发它的请求的 Server-Timing
+        task = asyncio.create_task(
+            self._fold_once(key, summary, pending), context=contextvars.Context()
+        )
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _fold_once(self, key: str, summary: Optional[str], pending: list) -> str:
+        """相同前缀的折叠只执行一次，同步折叠会等待进行中的后台折叠"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fold(key, summary, pending))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fold(self, key: str, summary: Optional[str], pending: list) -> str:
+        self.folds += 1
+        self.messages_folded += len(pending)
+        try:
+            with span("optimizer", "summarize"):
+                response = await self.upstream.call(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": SYSTEM_PROMPT.format(max_chars=self.max_summary_chars),
+                            },
+                            {"role": "user", "content": self._build_fold_prompt(summary, pending)},
+                        ],
+                        temperature=0,
+                        max_completion_tokens=self.max_summary_chars * 2,
+                        response_format={"type": "json_object"},
+                    )
+                )
+            record_usage("summarizer", response.usage)
+            updated = json.loads(response.choices[0].message.content)["summary"]
+            if not isinstance(updated, str):
+                raise ValueError("summary 必须是字符串")
+            updated = updated.strip()[: self.max_summary_chars]
+        except Exception as e:
+            self.fold_failures += 1
+            print(f"⚠️ 对话摘要更新失败，使用本地拼接的摘要: {e}")
+            return self._fold_locally(summary, pending)
+
+        self.cache.set(key, updated)
+        return updated
+
+    @staticmethod
+    def _build_fold_prompt(summary: Optional[str], pending: list) -> str:
+        new_turns = "\n".join(_message_text(message) for message in pending)
+        return f"已有摘要：{summary or '无'}\n\n新增对话：\n{new_turns}"
+
+    def _fold_locally(self, summary: Optional[str], pending: list) -> str:
+        """只保留用户消息，超长时保留最新的内容（后面的要求优先）"""
+        parts = [summary] if summary else []
+        parts.extend(
+            message["content"].strip()
+            for message in pending
+            if message.get("role") == "user" and message.get("content", "").strip()
+        )
+        return "；".join(parts)[-self.max_summary_chars :]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "folds": self.folds,
+            "background_folds": self.background_folds,
+            "fold_failures": self.fold_failures,
+            "messages_folded": self.messages_folded,
+            "in_flight": len(self._in_flight),
+        }
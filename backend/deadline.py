@@ -0,0 +1,34 @@
+import os
+import time
+from typing import List, Optional
+
+
+class Deadline:
+    """
+    一次请求的截止时间，以及为了在截止时间内返回而采用的降级
+
+    在接口入口创建，传给解析器和生成器；它们根据剩余时间决定是否降级，
+    并把采用的降级记录在 degradations 中，最后随响应返回给调用方。
+    """
+
+    def __init__(self, budget_s: Optional[float] = None):
+        """
+        Args:
+            budget_s: 从现在起的可用时间（秒），默认读取 REQUEST_DEADLINE_S（27，
+                低于 Lambda 的 30 秒上限，留出序列化和返回响应的时间）
+        """
+        if budget_s is None:
+            budget_s = float(os.getenv("REQUEST_DEADLINE_S", "27"))
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+        self.degradations: List[str] = []
+
+    def remaining(self) -> float:
+        """剩余时间（秒），已经过期时为 0"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def degrade(self, name: str) -> None:
+        """记录一项降级（重复记录只保留一次）"""
+        if name not in self.degradations:
+            self.degradations.append(name)
+            print(f"⏱️ 剩余 {self.remaining():.1f} 秒，降级: {name}")
@@ -68,6 +68,8 @@ echo ""
 # Copy your application Python files
 echo "📝 Copying application code..."
 cp "$SCRIPT_DIR"/*.py "$PACKAGE_DIR/"
+# Local intent classifier model
+cp "$SCRIPT_DIR"/intent_model.json "$PACKAGE_DIR/"
 
 echo -e "${GREEN}✅ Application code copied${NC}"
 echo ""
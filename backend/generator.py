@@ -1,20 +1,142 @@
-from openai import OpenAI
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Set, Tuple
+import asyncio
+import contextvars
 import json
 import os
 
+from cache import Cache, normalize_text
+from deadline import Deadline
+from http_pool import create_openai_client
+from json_stream import IncrementalJSONParser, StreamJSONError
+from metrics import record_usage, span
+from resilience import UpstreamError, get_upstream_policy
+from single_flight import SingleFlight
+
+# 菜谱JSON的结构说明。菜系、难度等动态内容不写进结构说明，而是放在用户消息里
+RECIPE_SCHEMA = """{
+    "dish_name": "菜品名称",
+    "description": "对这道菜的简短描述，2-3句话",
+    "cuisine_type": "与要求的菜系一致",
+    "difficulty": "与要求的难度一致",
+    "prep_time_mins": 15,          // 准备时间(分钟)，必须是整数
+    "cook_time_mins": 20,          // 烹饪时间(分钟)，必须是整数
+    "servings": 2,                 // 份数，与要求的份数一致，必须是整数
+    "ingredients": [
+        {
+            "name": "食材名称",
+            "amount": 2,           // 用量，必须是数字(整数或浮点数)
+            "unit": "个"           // 单位，例如 "g", "ml", "个", "汤匙"
+        }
+    ],
+    "instructions": [
+        {
+            "step": 1,
+            "description": "详细的步骤描述"
+        }
+    ],
+    "tips": ["一个实用的烹饪小贴士"],
+    "nutritional_info": {
+        "calories_kcal": 350,      // 预估卡路里(大卡)，必须是整数
+        "protein_g": 30,           // 蛋白质(克)，必须是整数
+        "carbs_g": 25,             // 碳水化合物(克)，必须是整数
+        "fat_g": 15                // 脂肪(克)，必须是整数
+    }
+}"""
+
+# 剩余时间不多时追加在用户消息末尾（系统提示词不变，不影响前缀缓存），让模型输出更短的菜谱
+COMPACT_INSTRUCTION = "\n时间有限：不要返回 tips 和 nutritional_info 字段，步骤描述尽量简短。"
+# 缩减输出长度时的下限，再少就写不完一份完整的菜谱了
+MIN_COMPLETION_TOKENS = 600
+# 估算可输出的 token 数时，扣除上游返回第一个 token 前的等待时间（秒）
+FIRST_TOKEN_S = 1.5
+
 
 class RecipeGenerator:
-    def __init__(self, api_key: Optional[str] = None):
+    # System Prompt: 定义所有不变的规则（角色+通用指令）
+    SYSTEM_PROMPT = """
+你是一位富有创意且乐于助人的专业厨师和营养师，专注于简单易学的家常菜。
+你的核心任务是根据用户提供的食材和约束条件，创作一份美味、步骤清晰的菜谱。
+你必须严格按照要求的JSON格式返回结果，除了JSON本身，不要包含任何额外的解释、注释或标题。
+重要规则：JSON的“键”(key)必须是全英文小写蛇形命名法(snake_case)，但JSON的“值”(value)（例如菜品名称、描述、步骤等）必须使用简体中文。
+"""
+
+    # 两种模式的系统提示词包含全部静态的任务说明和JSON结构，每次请求逐字节相同，
+    # 用户消息只包含本次的食材、约束或用户描述，这样上游可以缓存并复用系统提示词这段前缀
+    GENERATE_SYSTEM_PROMPT = (
+        SYSTEM_PROMPT
+        + """
+用户消息会给出食材、菜系、难度、份数和约束条件，请据此创作一份菜谱。
+
+请使用以下全英文小写蛇形命名法(snake_case)的key来构建JSON：
+"""
+        + RECIPE_SCHEMA
+        + "\n"
+    )
+
+    FUSED_SYSTEM_PROMPT = (
+        SYSTEM_PROMPT
+        + """
+请同时完成需求解析和菜谱创作两项任务，用户消息是用户对想做的菜的描述。
+
+第一步：从描述中提取结构化需求，规则如下：
+1. 仔细识别所有食材名称，包括蔬菜、肉类、调料等
+2. 识别时间相关词汇：半小时=30分钟，一小时=60分钟，快手菜=15-30分钟等
+3. 识别饮食限制：不辣、素食、低盐、无糖等
+4. 识别菜系偏好：中式、西式、日式、韩式等
+5. 识别难度偏好：简单、快手、复杂等
+6. 识别热量偏好：低热量、高蛋白、减肥餐等
+7. 如果某个信息在描述中没有明确提到，则设为null；份数没有提到则设为2
+8. 如果描述中没有任何食材，ingredients 返回空列表，recipe 返回空对象
+
+第二步：严格根据第一步提取出的需求创作一份菜谱（菜系未提及时按中式，难度未提及时按中等）。
+
+请返回如下结构的JSON，recipe 的结构见后面的说明：
+{
+    "requirements": {
+        "ingredients": ["从描述中提取的所有食材名称"],
+        "max_cook_time_mins": 30,
+        "dietary_requirements": ["饮食要求"],
+        "cuisine_preference": "中式",
+        "difficulty_preference": "简单",
+        "calorie_preference": "低热量",
+        "serving_size": 2
+    },
+    "recipe": {...}
+}
+
+recipe 的结构（菜系、难度、份数与第一步提取的需求一致）：
+"""
+        + RECIPE_SCHEMA
+        + "\n"
+    )
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[Cache] = None,
+        single_flight: Optional[SingleFlight] = None,
+    ):
         """
         初始化RecipeGenerator
 
         Args:
             api_key: OpenAI API密钥，如果不提供则从环境变量OPENAI_API_KEY获取
+            cache: 菜谱缓存（可选），以规范化后的需求为键，通常是每个键保存多个变体的 VariantCache
+            single_flight: 请求合并层（可选），需求相同的并发请求只调用一次上游
         """
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+        self.client = create_openai_client(api_key or os.getenv("OPENAI_API_KEY"))
+        self.upstream = get_upstream_policy("generator")
+        self.cache = cache
+        self.single_flight = single_flight
+        # 剩余时间少于这么多秒时生成精简菜谱（省略小贴士和营养信息）
+        self.compact_below_s = float(os.getenv("DEADLINE_COMPACT_S", "12"))
+        # 上游每秒大约输出的 token 数，用于按剩余时间限制输出长度
+        self.tokens_per_s = float(os.getenv("DEADLINE_TOKENS_PER_S", "100"))
+        # 正在后台补充变体的缓存键，以及后台任务（保留引用，避免任务被回收）
+        self._filling: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
 
-    def generate_recipe(
+    async def generate_recipe(
         self,
         ingredients: List[str],
         cuisine_type: str = "中式",
@@ -23,22 +145,29 @@ class RecipeGenerator:
         dietary_requirements: Optional[List[str]] = None,
         calorie_preference: Optional[str] = None,
         serving_size: int = 2,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
     ) -> Dict[str, Any]:
         """
         根据食材列表和约束条件生成结构化菜谱
+
+        use_cache 为 False 时跳过菜谱缓存，总是生成新菜谱（生成结果仍会写入缓存）
+        deadline 为请求的截止时间（可选），剩余时间不多时生成精简菜谱并限制输出长度，
+        采用的降级记录在 deadline 中；精简菜谱不写入缓存
         """
 
         if not ingredients:
             raise ValueError("食材列表不能为空")
 
-        # System Prompt: 定义所有不变的规则（角色+通用指令）
-        system_prompt = """
-你是一位富有创意且乐于助人的专业厨师和营养师，专注于简单易学的家常菜。
-你的核心任务是根据用户提供的食材和约束条件，创作一份美味、步骤清晰的菜谱。
-你必须严格按照要求的JSON格式返回结果，除了JSON本身，不要包含任何额外的解释、注释或标题。
-重要规则：JSON的“键”(key)必须是全英文小写蛇形命名法(snake_case)，但JSON的“值”(value)（例如菜品名称、描述、步骤等）必须使用简体中文。
-"""
-
+        cache_key = self._cache_key(
+            ingredients,
+            cuisine_type,
+            difficulty,
+            max_cook_time,
+            dietary_requirements,
+            calorie_preference,
+            serving_size,
+        )
         # 构建本次任务的具体提示词
         # User Prompt: 只包含本次任务的动态信息（食材、约束条件等）
         user_prompt = self._build_prompt(
@@ -50,29 +179,410 @@ class RecipeGenerator:
             calorie_preference,
             serving_size,
         )
+        if use_cache and self.cache is not None:
+            cached = self._cached_recipe(cache_key, user_prompt)
+            if cached is not None:
+                return cached
+
+        max_tokens, compact = self._output_budget(1500, deadline)
+        if compact:
+            user_prompt += COMPACT_INSTRUCTION
+        budget_s = deadline.remaining() if deadline is not None else None
+
+        if self.single_flight is not None:
+            # 输出长度上限不同的请求结果不同，不合并
+            return await self.single_flight.do(
+                f"{cache_key}:{max_tokens}:compact" if compact else f"{cache_key}:{max_tokens}",
+                lambda: self._request_recipe(
+                    user_prompt, cache_key, max_tokens, budget_s, cacheable=not compact
+                ),
+                budget_s=budget_s,
+            )
+        return await self._request_recipe(
+            user_prompt, cache_key, max_tokens, budget_s, cacheable=not compact
+        )
 
+    def _cached_recipe(self, cache_key: str, user_prompt: str) -> Optional[Dict[str, Any]]:
+        """查缓存；命中但变体还不够时，在后台再生成一个变体，不让当前请求等待"""
+        cached, needs_variant = self.cache.lookup(cache_key)
+        if cached is not None and needs_variant and cache_key not in self._filling:
+            self._filling.add(cache_key)
+            # 在独立的上下文中运行，不计入当前请求的耗时指标
+            task = asyncio.create_task(
+                self._fill_variant(cache_key, user_prompt), context=contextvars.Context()
+            )
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        return cached
+
+    async def _fill_variant(self, cache_key: str, user_prompt: str) -> None:
+        try:
+            await self._request_recipe(user_prompt, cache_key)
+        except Exception as e:
+            print(f"⚠️ 后台补充菜谱变体失败: {e}")
+        finally:
+            self._filling.discard(cache_key)
+
+    def _output_budget(self, max_tokens: int, deadline: Optional[Deadline]) -> Tuple[int, bool]:
+        """
+        按剩余时间决定输出长度上限和是否生成精简菜谱
+
+        Returns:
+            (max_completion_tokens, 是否生成精简菜谱)
+        """
+        if deadline is None:
+            return max_tokens, False
+        remaining = deadline.remaining()
+        compact = remaining < self.compact_below_s
+        if compact:
+            deadline.degrade("omit_tips")
+            deadline.degrade("omit_nutritional_info")
+        affordable = int((remaining - FIRST_TOKEN_S) * self.tokens_per_s)
+        if affordable < max_tokens:
+            deadline.degrade("reduced_output_budget")
+            return max(affordable, MIN_COMPLETION_TOKENS), compact
+        return max_tokens, compact
+
+    async def _request_recipe(
+        self,
+        user_prompt: str,
+        cache_key: str,
+        max_tokens: int = 1500,
+        budget_s: Optional[float] = None,
+        cacheable: bool = True,
+    ) -> Dict[str, Any]:
+        """调用上游生成菜谱，并写入缓存（cacheable 为 False 时不写入）"""
         try:
             # 调用OpenAI API，强制返回JSON格式
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    # <<< 将定义好的系统指令放在这里 >>>
-                    {"role": "system", "content": system_prompt},
-                    # <<< user_prompt现在只包含本次任务的动态信息 >>>
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.7,
-                max_completion_tokens=1500,
-                response_format={"type": "json_object"},
-            )
+            with span("generator", "generate"):
+                response = await self.upstream.call(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            # 静态的规则和JSON结构，逐字节不变，作为可缓存的前缀
+                            {"role": "system", "content": self.GENERATE_SYSTEM_PROMPT},
+                            # user_prompt 只包含本次任务的动态信息
+                            {"role": "user", "content": user_prompt},
+                        ],
+                        temperature=0.7,
+                        max_completion_tokens=max_tokens,
+                        response_format={"type": "json_object"},
+                    ),
+                    budget_s=budget_s,
+                )
+            record_usage("generator", response.usage)
 
             # 解析响应 - 由于使用了response_format，保证返回有效JSON
-            recipe_text = response.choices[0].message.content.strip()
-            return json.loads(recipe_text)
+            with span("generator", "generate_decode"):
+                recipe_text = response.choices[0].message.content.strip()
+                recipe = json.loads(recipe_text)
+
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise Exception(f"调用OpenAI API时发生错误: {str(e)}")
+
+        if cacheable and self.cache is not None:
+            self.cache.set(cache_key, recipe)
+        return recipe
+
+    async def stream_recipe(
+        self,
+        ingredients: List[str],
+        cuisine_type: str = "中式",
+        difficulty: str = "中等",
+        max_cook_time: Optional[int] = None,
+        dietary_requirements: Optional[List[str]] = None,
+        calorie_preference: Optional[str] = None,
+        serving_size: int = 2,
+        use_cache: bool = True,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        流式生成菜谱，字段一旦在token流中完整就立即产出
+
+        参数与 generate_recipe 相同，命中菜谱缓存时直接按相同的事件顺序产出缓存结果。
+
+        Yields:
+            (事件名, 值)，事件依次为：
+            "dish_name"、"description"、每个 "ingredient"、每个 "instruction"，
+            最后是完整菜谱 "recipe"
+        """
+
+        if not ingredients:
+            raise ValueError("食材列表不能为空")
+
+        cache_key = self._cache_key(
+            ingredients,
+            cuisine_type,
+            difficulty,
+            max_cook_time,
+            dietary_requirements,
+            calorie_preference,
+            serving_size,
+        )
+        user_prompt = self._build_prompt(
+            ingredients,
+            cuisine_type,
+            difficulty,
+            max_cook_time,
+            dietary_requirements,
+            calorie_preference,
+            serving_size,
+        )
+        if use_cache and self.cache is not None:
+            cached = self._cached_recipe(cache_key, user_prompt)
+            if cached is not None:
+                for event in self._recipe_events(cached):
+                    yield event
+                return
+
+        messages = [
+            {"role": "system", "content": self.GENERATE_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ]
+
+        async for event, value in self._stream_recipe_events(
+            messages, 1500, recipe_path=()
+        ):
+            if event == "recipe" and self.cache is not None:
+                self.cache.set(cache_key, value)
+            yield event, value
+
+    async def stream_recipe_from_description(
+        self, user_input: str
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        融合模式的流式版本：先产出未校验的 "requirements"，随后与 stream_recipe 相同
+        """
+
+        if not user_input.strip():
+            raise ValueError("用户输入不能为空")
+
+        messages = [
+            {"role": "system", "content": self.FUSED_SYSTEM_PROMPT},
+            {"role": "user", "content": self._build_fused_prompt(user_input)},
+        ]
+
+        async for event in self._stream_recipe_events(
+            messages, 1800, recipe_path=("recipe",)
+        ):
+            yield event
+
+    async def _stream_recipe_events(
+        self, messages: list, max_completion_tokens: int, recipe_path: tuple
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """调用流式接口，并把增量解析出的字段转换为菜谱事件"""
+        try:
+            with span("generator", "generate_connect"):
+                stream = await self.upstream.call(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=messages,
+                        temperature=0.7,
+                        max_completion_tokens=max_completion_tokens,
+                        response_format={"type": "json_object"},
+                        stream=True,
+                        # 最后一个分块带上 token 用量
+                        stream_options={"include_usage": True},
+                        # 建立连接后，两个分块之间超过这个时间也视为超时
+                        timeout=self.upstream.timeout,
+                    ),
+                    hedge=False,
+                )
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise Exception(f"调用OpenAI API时发生错误: {str(e)}")
+
+        json_parser = IncrementalJSONParser()
+        depth = len(recipe_path)
+
+        # 从连接建立到最后一个分块的耗时（流式响应头已经发出，只计入指标）
+        with span("generator", "generate_stream"):
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    record_usage("generator", chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+
+                try:
+                    completed = json_parser.feed(delta)
+                except StreamJSONError as e:
+                    # 上游返回的内容有问题，按上游错误（502）报告，而不是用户输入错误
+                    raise UpstreamError(f"上游返回的菜谱JSON格式错误: {e}") from e
+                for path, value in completed:
+                    if path == ("requirements",) and depth:
+                        yield "requirements", value
+                        continue
+                    if path[:depth] != recipe_path:
+                        continue
+
+                    event = self._stream_event_name(path[depth:])
+                    if event and self._is_valid_stream_field(event, value):
+                        yield event, value
+
+        if not json_parser.done:
+            raise UpstreamError("流式返回的菜谱JSON不完整")
+
+        recipe = json_parser.root
+        for key in recipe_path:
+            recipe = recipe.get(key) or {}
+        yield "recipe", recipe
+
+    def _recipe_events(self, recipe: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        """把完整菜谱拆成与流式生成相同顺序的事件"""
+        events = []
+        for key in ("dish_name", "description"):
+            if self._is_valid_stream_field(key, recipe.get(key)):
+                events.append((key, recipe[key]))
+        for event, key in (("ingredient", "ingredients"), ("instruction", "instructions")):
+            for item in recipe.get(key) or []:
+                if self._is_valid_stream_field(event, item):
+                    events.append((event, item))
+        events.append(("recipe", recipe))
+        return events
+
+    def _stream_event_name(self, path: tuple) -> Optional[str]:
+        """把菜谱内的JSON路径映射为流式事件名"""
+        if path in (("dish_name",), ("description",)):
+            return path[0]
+        if len(path) == 2 and isinstance(path[1], int):
+            if path[0] == "ingredients":
+                return "ingredient"
+            if path[0] == "instructions":
+                return "instruction"
+        return None
+
+    def _is_valid_stream_field(self, event: str, value: Any) -> bool:
+        """校验单个流式字段的结构，不合格的字段不提前推送"""
+        if event in ("dish_name", "description"):
+            return isinstance(value, str) and bool(value.strip())
+        if event == "ingredient":
+            return (
+                isinstance(value, dict)
+                and isinstance(value.get("name"), str)
+                and isinstance(value.get("amount"), (int, float))
+                and isinstance(value.get("unit"), str)
+            )
+        if event == "instruction":
+            return (
+                isinstance(value, dict)
+                and isinstance(value.get("step"), int)
+                and isinstance(value.get("description"), str)
+            )
+        return False
+
+    async def generate_recipe_from_description(
+        self, user_input: str, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        单次调用同时完成需求解析和菜谱生成（融合模式）
+
+        Args:
+            user_input: 用户的自然语言描述
+            deadline: 请求的截止时间（可选），降级方式与 generate_recipe 相同
 
+        Returns:
+            {"requirements": {...未校验的需求...}, "recipe": {...菜谱...}}
+            requirements 的结构与 RecipeRequirementsParser 的解析结果一致，
+            需要调用方自行校验并补全默认值
+        """
+
+        if not user_input.strip():
+            raise ValueError("用户输入不能为空")
+
+        user_prompt = self._build_fused_prompt(user_input)
+        max_tokens, compact = self._output_budget(1800, deadline)
+        if compact:
+            user_prompt += COMPACT_INSTRUCTION
+        budget_s = deadline.remaining() if deadline is not None else None
+
+        if self.single_flight is not None:
+            key = f"fused:{normalize_text(user_input)}"
+            key = f"{key}:{max_tokens}"
+            return await self.single_flight.do(
+                f"{key}:compact" if compact else key,
+                lambda: self._request_fused(user_prompt, max_tokens, budget_s),
+                budget_s=budget_s,
+            )
+        return await self._request_fused(user_prompt, max_tokens, budget_s)
+
+    async def _request_fused(
+        self, user_prompt: str, max_tokens: int = 1800, budget_s: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """融合模式的上游调用"""
+        try:
+            with span("generator", "generate_fused"):
+                response = await self.upstream.call(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {"role": "system", "content": self.FUSED_SYSTEM_PROMPT},
+                            {"role": "user", "content": user_prompt},
+                        ],
+                        temperature=0.7,
+                        max_completion_tokens=max_tokens,
+                        response_format={"type": "json_object"},
+                    ),
+                    budget_s=budget_s,
+                )
+            record_usage("generator", response.usage)
+
+            with span("generator", "generate_decode"):
+                result_text = response.choices[0].message.content.strip()
+                result = json.loads(result_text)
+
+        except UpstreamError:
+            raise
         except Exception as e:
             raise Exception(f"调用OpenAI API时发生错误: {str(e)}")
 
+        return {
+            "requirements": result.get("requirements") or {},
+            "recipe": result.get("recipe") or {},
+        }
+
+    def _build_fused_prompt(self, user_input: str) -> str:
+        """构建融合模式（解析+生成）的用户消息，规则和JSON结构在 FUSED_SYSTEM_PROMPT 中"""
+        return f'用户描述："{user_input}"'
+
+    def _cache_key(
+        self,
+        ingredients: List[str],
+        cuisine_type: str,
+        difficulty: str,
+        max_cook_time: Optional[int],
+        dietary_requirements: Optional[List[str]],
+        calorie_preference: Optional[str],
+        serving_size: int,
+    ) -> str:
+        """
+        规范化的菜谱缓存键：食材和饮食要求去重排序，
+        这样只是食材顺序不同的请求可以共用缓存
+        """
+
+        def canonical_list(values: Optional[List[str]]) -> List[str]:
+            return sorted({normalize_text(v) for v in values or [] if normalize_text(v)})
+
+        def canonical_str(value: Optional[str]) -> Optional[str]:
+            return normalize_text(value) if value else None
+
+        return json.dumps(
+            [
+                canonical_list(ingredients),
+                canonical_str(cuisine_type),
+                canonical_str(difficulty),
+                max_cook_time,
+                canonical_list(dietary_requirements),
+                canonical_str(calorie_preference),
+                serving_size,
+            ],
+            ensure_ascii=False,
+        )
+
     def _build_prompt(
         self,
         ingredients: List[str],
@@ -83,7 +593,7 @@ class RecipeGenerator:
         calorie_preference: Optional[str] = None,
         serving_size: int = 2,
     ) -> str:
-        """构建发送给OpenAI的提示词"""
+        """构建发送给OpenAI的用户消息"""
         ingredients_str = "、".join(ingredients)
 
         # 构建约束条件描述
@@ -100,9 +610,8 @@ class RecipeGenerator:
         )
 
         # 构建本次任务的具体提示词
-        # _build_prompt 现在只负责构建“任务本身”，不再包含角色设定
-        prompt = f"""
-请根据以下具体信息创作一份菜谱：
+        # _build_prompt 只包含本次任务的动态信息，规则和JSON结构在 GENERATE_SYSTEM_PROMPT 中
+        prompt = f"""请根据以下具体信息创作一份菜谱：
 
 食材：{ingredients_str}
 菜系：{cuisine_type}
@@ -111,39 +620,5 @@ class RecipeGenerator:
 
 约束条件：
 {constraints_str}
-
----
-**重要规则：JSON的“键”(key)必须是全英文小写蛇形命名法(snake_case)，但JSON的“值”(value)（例如菜品名称、描述、步骤等）必须使用简体中文。**
-
-请使用以下全英文小写蛇形命名法(snake_case)的key来构建JSON：
-{{
-    "dish_name": "菜品名称",
-    "description": "对这道菜的简短描述，2-3句话",
-    "cuisine_type": "{cuisine_type}",
-    "difficulty": "{difficulty}",
-    "prep_time_mins": 15,          // 准备时间(分钟)，必须是整数
-    "cook_time_mins": 20,          // 烹饪时间(分钟)，必须是整数
-    "servings": 2,                 // 份数，必须是整数
-    "ingredients": [
-        {{
-            "name": "食材名称",
-            "amount": 2,           // 用量，必须是数字(整数或浮点数)
-            "unit": "个"           // 单位，例如 "g", "ml", "个", "汤匙"
-        }}
-    ],
-    "instructions": [
-        {{
-            "step": 1,
-            "description": "详细的步骤描述"
-        }}
-    ],
-    "tips": ["一个实用的烹饪小贴士"],
-    "nutritional_info": {{
-        "calories_kcal": 350,      // 预估卡路里(大卡)，必须是整数
-        "protein_g": 30,           // 蛋白质(克)，必须是整数
-        "carbs_g": 25,             // 碳水化合物(克)，必须是整数
-        "fat_g": 15                // 脂肪(克)，必须是整数
-    }}
-}}
 """
         return prompt
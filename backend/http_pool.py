@@ -0,0 +1,148 @@
+import importlib.util
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# 所有 OpenAI 组件和图片下载共用的 httpx.AsyncClient，第一次使用时创建。
+# httpx 和 openai 都在函数内导入，不增加 main.py 的冷启动时间
+_client: Any = None
+_client_lock = threading.Lock()
+_settings: Dict[str, Any] = {}
+
+
+class _PoolStats:
+    """
+    连接池统计：通过 httpcore 的 trace 扩展记录每个请求是否新建了连接、建连和 TLS 握手耗时
+
+    请求数减去新建的 TCP 连接数即为复用已有连接的请求数（HTTP/2 下包括多路复用）。
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.connect_failures = 0
+        self.tls_handshakes = 0
+        self.connect_seconds = 0.0
+        self.tls_seconds = 0.0
+
+    def make_trace(self):
+        started: Dict[str, float] = {}
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if not event_name.startswith("connection."):
+                return
+            step, _, phase = event_name[len("connection.") :].rpartition(".")
+            if phase == "started":
+                started[step] = time.perf_counter()
+                return
+            elapsed = time.perf_counter() - started.pop(step, time.perf_counter())
+            if step == "connect_tcp":
+                if phase == "complete":
+                    self.connections_opened += 1
+                    self.connect_seconds += elapsed
+                else:
+                    self.connect_failures += 1
+            elif step == "start_tls" and phase == "complete":
+                self.tls_handshakes += 1
+                self.tls_seconds += elapsed
+
+        return trace
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reused": max(self.requests - self.connections_opened - self.connect_failures, 0),
+            "connect_failures": self.connect_failures,
+            "tls_handshakes": self.tls_handshakes,
+            "avg_connect_ms": _average_ms(self.connect_seconds, self.connections_opened),
+            "avg_tls_ms": _average_ms(self.tls_seconds, self.tls_handshakes),
+        }
+
+
+def _average_ms(total_seconds: float, count: int) -> Optional[float]:
+    return round(total_seconds / count * 1000, 2) if count else None
+
+
+_stats = _PoolStats()
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("HTTP_POOL_HTTP2", "false").lower() != "true":
+        return False
+    if importlib.util.find_spec("h2") is None:
+        print("⚠️ HTTP_POOL_HTTP2=true 但未安装 h2（pip install 'httpx[http2]'），使用 HTTP/1.1")
+        return False
+    return True
+
+
+def get_http_client():
+    """
+    返回共用的 httpx.AsyncClient（连接池），第一次调用时按环境变量创建
+
+    - HTTP_POOL_MAX_CONNECTIONS: 最大连接数（默认 100）
+    - HTTP_POOL_MAX_KEEPALIVE: 保持空闲的最大连接数（默认 20）
+    - HTTP_POOL_KEEPALIVE_EXPIRY: 空闲连接保留的秒数（默认 30）
+    - HTTP_POOL_HTTP2: 是否启用 HTTP/2（默认 false，需要安装 h2）
+    - HTTP_TIMEOUT_S / HTTP_CONNECT_TIMEOUT_S: 请求超时和建连超时（默认 600 / 5，与 openai SDK 相同）
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+
+                _settings.update(
+                    max_connections=int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100")),
+                    max_keepalive_connections=int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20")),
+                    keepalive_expiry=float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "30")),
+                    http2=_http2_enabled(),
+                )
+
+                async def on_request(request) -> None:
+                    _stats.requests += 1
+                    # 调用方自己设置了 trace 时不覆盖
+                    request.extensions.setdefault("trace", _stats.make_trace())
+
+                _client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=_settings["max_connections"],
+                        max_keepalive_connections=_settings["max_keepalive_connections"],
+                        keepalive_expiry=_settings["keepalive_expiry"],
+                    ),
+                    timeout=httpx.Timeout(
+                        float(os.getenv("HTTP_TIMEOUT_S", "600")),
+                        connect=float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5")),
+                    ),
+                    http2=_settings["http2"],
+                    follow_redirects=True,
+                    event_hooks={"request": [on_request]},
+                )
+    return _client
+
+
+def create_openai_client(api_key: Optional[str] = None):
+    """
+    创建使用共用连接池的 AsyncOpenAI 客户端，各组件之间复用已建立的连接
+
+    关闭 SDK 自带的重试，由 resilience.py 统一处理截止时间和重试
+    """
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=api_key, http_client=get_http_client(), max_retries=0)
+
+
+def http_pool_stats() -> Optional[Dict[str, Any]]:
+    """连接池配置和统计，尚未创建时返回 None（查询统计信息不会创建连接池）"""
+    client = _client
+    if client is None:
+        return None
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    return {
+        **_settings,
+        **_stats.to_dict(),
+        "open_connections": len(connections),
+        "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+    }
@@ -1,11 +1,26 @@
 import os
+import asyncio
 import dashscope
 from dashscope import MultiModalConversation
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from admission import get_scheduler
+from image_store import ImageStore
+from metrics import span
+from resilience import UpstreamError, UpstreamOverloadedError
+
+try:
+    # 新版SDK提供原生异步接口
+    from dashscope import AioMultiModalConversation
+except ImportError:  # 旧版SDK没有异步接口，退回到线程池执行同步调用
+    AioMultiModalConversation = None
 
 load_dotenv()
 
+# DashScope 返回 429 时没有 Retry-After，按这个时间（秒）暂停并让调用方稍后重试
+RATE_LIMIT_BACKOFF_S = 5.0
+
 
 class QwenImageGenerator:
     """
@@ -15,15 +30,21 @@ class QwenImageGenerator:
 
     MODEL = "qwen-image"
 
-    def __init__(self):
+    def __init__(self, store: Optional[ImageStore] = None):
         """
         初始化客户端。SDK会自动从环境变量加载API密钥。
+
+        Args:
+            store: 本地图片存储（可选）。提供时生成的图片会下载保存，
+                   相同Prompt的后续请求直接返回本服务的图片URL，不再调用上游。
         """
         self.api_key = os.getenv("DASHSCOPE_API_KEY")
         if not self.api_key:
             raise ValueError("请在.env文件中设置您的 DASHSCOPE_API_KEY")
+        self.store = store
+        self.scheduler = get_scheduler("dashscope")
 
-    def generate_recipe_image(self, recipe_json: Dict[str, Any]) -> str | None:
+    async def generate_recipe_image(self, recipe_json: Dict[str, Any]) -> str | None:
         """
         根据完整的菜谱JSON生成图片的主方法。
 
@@ -35,7 +56,50 @@ class QwenImageGenerator:
         """
         try:
             # 1. 构建高质量的中文Prompt
-            prompt = self._compose_prompt_from_recipe(recipe_json)
+            with span("image", "image_compose"):
+                prompt = self._compose_prompt_from_recipe(recipe_json)
+        except Exception as e:
+            print(f"❌ 图片生成过程中发生错误: {e}")
+            return None
+
+        return await self.generate_image_from_prompt(prompt)
+
+    async def generate_image_from_prompt(self, prompt: str) -> str | None:
+        """
+        根据已经构建好的Prompt生成图片。
+
+        Args:
+            prompt: _compose_prompt_from_recipe 构建的中文提示词。
+
+        Returns:
+            成功则返回图片URL，失败则返回None。
+
+        Raises:
+            UpstreamOverloadedError: 限流排队已满或排队超时，或上游返回 429
+        """
+        if self.store is not None:
+            filename = self.store.lookup(prompt)
+            if filename:
+                print("📦 命中本地图片存储，跳过图片生成")
+                return self.store.url_for(filename)
+
+        image_url = await self._generate_from_upstream(prompt)
+        if image_url is None or self.store is None:
+            return image_url
+
+        try:
+            # 上游返回的URL会过期，下载到本地存储后返回本服务的稳定URL
+            filename = await self.store.save_from_url(prompt, image_url)
+            return self.store.url_for(filename)
+        except Exception as e:
+            print(f"⚠️ 保存图片到本地存储失败，返回上游URL: {e}")
+            return image_url
+
+    async def _generate_from_upstream(self, prompt: str) -> str | None:
+        """调用 qwen-image 生成图片，返回上游的图片URL"""
+        # 按 DashScope 的限额排队（只限制请求数），排满时抛出 UpstreamOverloadedError
+        await self.scheduler.acquire("image")
+        try:
             print("📸 正在使用 MultiModalConversation API (qwen-image) 生成图片...")
             print(f"   - Prompt: {prompt[:200]}...")
 
@@ -47,12 +111,9 @@ class QwenImageGenerator:
                 }
             ]
 
-            # 3. 调用 MultiModalConversation API
-            response = MultiModalConversation.call(
-                model=self.MODEL,
-                messages=messages,
-                api_key=self.api_key,
-            )
+            # 3. 调用 MultiModalConversation API（不阻塞事件循环）
+            with span("image", "image_call"):
+                response = await self._call_multimodal(messages)
 
             # 4. 处理返回结果
             if response.status_code == 200:
@@ -61,16 +122,41 @@ class QwenImageGenerator:
                 image_url = response.output.choices[0].message.content[0]["image"]
                 print(f"   - 图片URL: {image_url}")
                 return image_url
+            elif response.status_code == 429:
+                # 上游限流：暂停放行后续的图片生成，并让调用方稍后重试
+                self.scheduler.throttle(RATE_LIMIT_BACKOFF_S)
+                raise UpstreamOverloadedError("图片生成服务限流，请稍后再试", RATE_LIMIT_BACKOFF_S)
             else:
                 print(f"❌ 图片生成失败，HTTP返回码：{response.status_code}")
                 print(f"   - 错误码：{response.code}")
                 print(f"   - 错误信息：{response.message}")
                 return None
 
+        except UpstreamError:
+            raise
         except Exception as e:
             print(f"❌ 图片生成过程中发生错误: {e}")
             return None
 
+    async def _call_multimodal(self, messages: list):
+        """
+        异步调用 MultiModalConversation API。
+        优先使用SDK的异步接口，否则把同步调用放到线程池中执行。
+        """
+        if AioMultiModalConversation is not None:
+            return await AioMultiModalConversation.call(
+                model=self.MODEL,
+                messages=messages,
+                api_key=self.api_key,
+            )
+
+        return await asyncio.to_thread(
+            MultiModalConversation.call,
+            model=self.MODEL,
+            messages=messages,
+            api_key=self.api_key,
+        )
+
     def _compose_prompt_from_recipe(self, recipe: Dict[str, Any]) -> str:
         """
         将结构化菜谱转换为高质量的中文图像生成提示词。
@@ -114,7 +200,7 @@ if __name__ == "__main__":
 
     try:
         image_gen = QwenImageGenerator()
-        url = image_gen.generate_recipe_image(mock_recipe)
+        url = asyncio.run(image_gen.generate_recipe_image(mock_recipe))
 
         if url:
             print(f"\n✅ 测试成功，生成的图片URL是: {url}")
@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from cache import CacheBackend
+from metrics import span
+from resilience import UpstreamError
+
+if TYPE_CHECKING:
+    # 只用于类型标注：查询其他 worker 的任务时不需要导入 dashscope
+    from image_generator import QwenImageGenerator
+
+# 等待其他 worker 上的任务时，轮询共享存储的间隔（秒）
+POLL_INTERVAL_S = 0.5
+
+
+class ImageJob:
+    """一个图片生成任务"""
+
+    def __init__(self, prompt: str):
+        self.job_id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        self.status = "pending"  # pending -> running -> succeeded / failed
+        self.image_url: Optional[str] = None
+        self.error: Optional[str] = None
+        # 因上游限流等失败时返回给客户端的状态码和 Retry-After（秒）
+        self.error_status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+        # 从共享存储读出的其他 worker 上的任务，状态只能轮询存储更新
+        self.remote = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "image_url": self.image_url,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def to_record(self) -> str:
+        """写入共享存储的 JSON"""
+        return json.dumps(
+            {
+                **self.to_dict(),
+                "prompt_hash": self.prompt_hash,
+                "error_status": self.error_status,
+                "retry_after": self.retry_after,
+            }
+        )
+
+    @classmethod
+    def from_record(cls, record: str) -> "ImageJob":
+        data = json.loads(record)
+        job = cls("")
+        job.job_id = data["job_id"]
+        job.prompt_hash = data["prompt_hash"]
+        for field in ("status", "image_url", "error", "error_status", "retry_after", "created_at", "finished_at"):
+            setattr(job, field, data[field])
+        job.remote = True
+        if job.finished:
+            job.done.set()
+        return job
+
+
+def load_job(store: CacheBackend, job_id: str) -> Optional[ImageJob]:
+    """从共享存储读取任务（可能由其他 worker 创建），不存在或已过期时返回 None"""
+    record = store.get(job_id)
+    return ImageJob.from_record(record) if record is not None else None
+
+
+async def wait_for_job(job: ImageJob, store: Optional[CacheBackend], timeout: float) -> ImageJob:
+    """
+    等待任务完成，最多 timeout 秒，返回任务的最新状态
+
+    本进程的任务等待完成事件；其他 worker 上的任务每 POLL_INTERVAL_S 秒读取一次共享存储，
+    任务从存储中过期时按失败返回
+    """
+    if not job.remote:
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        await asyncio.sleep(min(POLL_INTERVAL_S, max(deadline - time.monotonic(), 0.0)))
+        latest = load_job(store, job.job_id) if store is not None else None
+        if latest is None:
+            job.status = "failed"
+            job.error = "任务不存在或已过期"
+            job.done.set()
+            break
+        job = latest
+    return job
+
+
+class ImageJobQueue:
+    """
+    图片生成任务队列
+
+    - 提交后立即返回任务，由固定数量的后台 worker 调用 QwenImageGenerator 生成图片
+    - Prompt 相同的进行中任务会合并为同一个任务，只调用一次上游
+    - 只保留最近 max_history 个任务的状态
+    - 传入 store 时，任务状态在每次变化后写入共享存储（例如 SQLite），同一台机器上的其他
+      uvicorn worker 也能查询和订阅这个任务；任务仍由提交它的 worker 执行
+    """
+
+    def __init__(
+        self,
+        image_generator: "QwenImageGenerator",
+        max_workers: int = 4,
+        max_pending: int = 100,
+        max_history: int = 500,
+        store: Optional[CacheBackend] = None,
+    ):
+        self.image_generator = image_generator
+        self.store = store
+        self.max_workers = max_workers
+        self.max_history = max_history
+        self._queue: "asyncio.Queue[ImageJob]" = asyncio.Queue(maxsize=max_pending)
+        self._jobs: "OrderedDict[str, ImageJob]" = OrderedDict()
+        self._in_flight: Dict[str, ImageJob] = {}  # prompt_hash -> 进行中的任务
+        self._workers: List[asyncio.Task] = []
+        self.deduplicated = 0
+
+    def submit(self, recipe_json: Dict[str, Any]) -> ImageJob:
+        """
+        提交一个图片生成任务
+
+        Raises:
+            asyncio.QueueFull: 等待中的任务已满
+        """
+        with span("image", "image_compose"):
+            prompt = self.image_generator._compose_prompt_from_recipe(recipe_json)
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+        existing = self._in_flight.get(prompt_hash)
+        if existing is not None:
+            self.deduplicated += 1
+            return existing
+
+        job = ImageJob(prompt)
+        self._queue.put_nowait(job)
+        self._in_flight[prompt_hash] = job
+        self._remember(job)
+        self._save(job)
+        self._ensure_workers()
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        """本进程的任务，找不到时再查共享存储"""
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = load_job(self.store, job_id)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "pending": self._queue.qsize(),
+            "in_flight": len(self._in_flight),
+            "deduplicated": self.deduplicated,
+        }
+
+    def _save(self, job: ImageJob) -> None:
+        if self.store is None:
+            return
+        try:
+            self.store.set(job.job_id, job.to_record())
+        except Exception as e:
+            # 共享存储不可用时只影响其他 worker 的查询
+            print(f"⚠️ 保存图片任务状态失败: {e}")
+
+    def _remember(self, job: ImageJob) -> None:
+        """记录任务，超出上限时丢弃最早的已完成任务"""
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_history:
+            oldest_id = next(
+                (job_id for job_id, old in self._jobs.items() if old.finished), None
+            )
+            if oldest_id is None:
+                break
+            del self._jobs[oldest_id]
+
+    def _ensure_workers(self) -> None:
+        """首次提交任务时在当前事件循环中启动 worker"""
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.max_workers:
+            # worker 在独立的上下文中运行，不继承触发它启动的那个请求的上下文
+            self._workers.append(
+                asyncio.create_task(self._worker(), context=contextvars.Context())
+            )
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ImageJob) -> None:
+        job.status = "running"
+        self._save(job)
+        try:
+            image_url = await self.image_generator.generate_image_from_prompt(job.prompt)
+            if image_url:
+                job.image_url = image_url
+                job.status = "succeeded"
+            else:
+                job.error = "图片生成失败"
+                job.status = "failed"
+        except UpstreamError as e:
+            job.error = str(e)
+            job.error_status = e.status_code
+            job.retry_after = e.retry_after
+            job.status = "failed"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._in_flight.pop(job.prompt_hash, None)
+            self._save(job)
+            job.done.set()
@@ -0,0 +1,201 @@
+import io
+from typing import BinaryIO, Optional, Tuple, Union
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 未安装 Pillow 时跳过缩放和重新编码，只做格式识别
+    Image = None
+    ImageOps = None
+
+# 文件头魔数 -> MIME类型
+_MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+_EXIF_ORIENTATION = 0x0112
+
+_READ_CHUNK_SIZE = 256 * 1024
+
+# 解码后的像素数上限（约 40MP，RGB 约 120MB）。PNG 等格式文件很小时也可能解码出几百 MB，
+# Pillow 自带的 MAX_IMAGE_PIXELS 要到约 1.79 亿像素才报错，远超 Lambda 的内存
+DEFAULT_MAX_PIXELS = 40_000_000
+
+# 图片来源：内存中的字节，或可随机读取的二进制文件（例如上传时的临时文件）
+ImageSource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+_OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+class ImageTooLargeError(ValueError):
+    """图片解码后的像素数超过上限"""
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """根据文件头魔数识别图片的真实格式，无法识别时返回 None"""
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+def read_image_bytes(source: ImageSource) -> Union[bytes, bytearray, memoryview]:
+    """
+    把图片来源读取为字节
+
+    文件按块读入一个按文件大小预先分配的缓冲区，避免 read() 之后再拼接/复制。
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+
+    size = source.seek(0, io.SEEK_END)
+    source.seek(0)
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    position = 0
+    while position < size:
+        chunk = source.read(min(_READ_CHUNK_SIZE, size - position))
+        if not chunk:
+            break
+        view[position : position + len(chunk)] = chunk
+        position += len(chunk)
+    return buffer if position == size else buffer[:position]
+
+
+def _source_size(source: ImageSource) -> int:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    size = source.seek(0, io.SEEK_END)
+    source.seek(0)
+    return size
+
+
+def _source_head(source: ImageSource, length: int = 16) -> bytes:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:length])
+    source.seek(0)
+    head = source.read(length)
+    source.seek(0)
+    return head
+
+
+def preprocess_image(
+    source: ImageSource,
+    max_edge: int = 1280,
+    output_format: str = "jpeg",
+    quality: int = 85,
+    max_pixels: int = DEFAULT_MAX_PIXELS,
+) -> Tuple[Union[bytes, bytearray, memoryview], str]:
+    """
+    在发送给视觉模型之前压缩图片
+
+    - 按 EXIF 方向信息旋转图片（手机照片常见）
+    - 长边缩小到 max_edge 以内
+    - 重新编码为体积更小的 JPEG/WebP
+
+    source 可以是字节，也可以是上传时的临时文件：需要重新编码时 Pillow 直接从文件解码，
+    原图不会整体读入内存。
+
+    Returns:
+        (图片数据, MIME类型)。未安装 Pillow 或图片无法解码时返回原始数据。
+
+    Raises:
+        ImageTooLargeError: 解码后的像素数超过 max_pixels。只读取文件头判断，不会解码像素；
+            JPEG 先按 max_edge 缩小解码（draft）后再判断
+    """
+    mime_type = sniff_mime_type(_source_head(source)) or "image/jpeg"
+    if Image is None:
+        return read_image_bytes(source), mime_type
+
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            image = Image.open(io.BytesIO(source))
+        else:
+            source.seek(0)
+            image = Image.open(source)
+        original_size = image.size
+        orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+        image.draft("RGB", (max_edge, max_edge))  # JPEG 解码时直接按比例缩小，省内存和时间
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageTooLargeError(
+                f"图片分辨率过大（{original_size[0]}x{original_size[1]}），最大允许 {max_pixels // 1_000_000} MP"
+            )
+        ImageOps.exif_transpose(image, in_place=True)
+    except ImageTooLargeError:
+        raise
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(f"图片分辨率过大: {e}") from e
+    except Exception as e:
+        print(f"⚠️ 图片预处理失败，使用原图: {e}")
+        return read_image_bytes(source), mime_type
+
+    needs_resize = max(original_size) > max_edge
+    rotated = orientation != 1
+    if not needs_resize and not rotated and mime_type in ("image/jpeg", "image/webp"):
+        # 尺寸和方向都没有问题的 JPEG/WebP 不再重新编码，避免画质损失
+        return read_image_bytes(source), mime_type
+
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    # JPEG 不支持透明通道，透明部分铺白底
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    pil_format, output_mime_type = _OUTPUT_FORMATS.get(
+        output_format.lower(), _OUTPUT_FORMATS["jpeg"]
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, quality=quality, optimize=True)
+    output = buffer.getvalue()
+
+    # 重新编码反而更大（例如本来就很小的图片）且不需要旋转时，保留原图
+    if len(output) >= _source_size(source) and not rotated:
+        return read_image_bytes(source), mime_type
+    return output, output_mime_type
+
+
+def perceptual_hash(data: bytes, hash_size: int = 8) -> Optional[int]:
+    """
+    计算图片的差值感知哈希（dHash），返回 hash_size*hash_size 位整数
+
+    相同或几乎相同的图片（重新上传、轻微裁剪、重新压缩）哈希值的汉明距离很小。
+    未安装 Pillow 或图片无法解码时返回 None。
+    """
+    if Image is None:
+        return None
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.draft("L", (hash_size * 4, hash_size * 4))
+        ImageOps.exif_transpose(image, in_place=True)
+        pixels = list(
+            image.convert("L")
+            .resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+            .getdata()
+        )
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
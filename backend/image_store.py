@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+from http_pool import get_http_client
+
+# 内容类型 -> 文件扩展名
+_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+}
+
+_FILENAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp)$")
+
+IMAGE_ROUTE = "/api/v1/images"
+
+
+class ImageDownloadTooLargeError(ValueError):
+    """上游图片超过下载大小上限"""
+
+
+class ImageStore:
+    """
+    按内容寻址的本地图片存储
+
+    图片以 Prompt 的 sha256 命名保存在本地目录，相同 Prompt 的后续请求直接复用，
+    不再调用上游。总大小超过上限时按最近使用时间（LRU）淘汰。
+    """
+
+    def __init__(
+        self,
+        directory: str = "/tmp/recipe_images",
+        max_bytes: int = 200 * 1024 * 1024,
+        public_base_url: str = "",
+        max_download_bytes: int = 20 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_download_bytes = max_download_bytes
+        self.public_base_url = public_base_url.rstrip("/")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_for(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """查找 Prompt 对应的图片，返回文件名；命中时刷新其最近使用时间"""
+        key = self.key_for(prompt)
+        for extension in _EXTENSIONS.values():
+            filename = f"{key}.{extension}"
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(path):
+                os.utime(path)
+                self.hits += 1
+                return filename
+
+        self.misses += 1
+        return None
+
+    async def save_from_url(self, prompt: str, url: str) -> str:
+        """
+        下载上游生成的图片并保存，返回文件名
+
+        边下载边写入临时文件，文件读写放在线程中，不阻塞事件循环
+
+        Raises:
+            ImageDownloadTooLargeError: 图片超过 max_download_bytes
+        """
+        # 与 OpenAI 组件共用连接池
+        async with get_http_client().stream("GET", url, timeout=30) as response:
+            response.raise_for_status()
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > self.max_download_bytes:
+                raise ImageDownloadTooLargeError(self._too_large(int(declared)))
+
+            content_type = response.headers.get("content-type", "").split(";")[0].strip()
+            extension = _EXTENSIONS.get(content_type, "png")
+            filename = f"{self.key_for(prompt)}.{extension}"
+            path = os.path.join(self.directory, filename)
+
+            # 先写临时文件再重命名，避免并发读取到写了一半的图片
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            f = await asyncio.to_thread(open, temp_path, "wb")
+            try:
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    # 没有 Content-Length 或声明的长度不对时，按实际收到的字节数中止
+                    if received > self.max_download_bytes:
+                        raise ImageDownloadTooLargeError(self._too_large(received))
+                    await asyncio.to_thread(f.write, chunk)
+                await asyncio.to_thread(f.close)
+                await asyncio.to_thread(os.replace, temp_path, path)
+            except BaseException:
+                await asyncio.to_thread(self._discard, f, temp_path)
+                raise
+
+        await asyncio.to_thread(self._evict, path)
+        return filename
+
+    def _too_large(self, size: int) -> str:
+        return f"图片超过下载上限（{size} > {self.max_download_bytes} 字节）"
+
+    @staticmethod
+    def _discard(f, temp_path: str) -> None:
+        f.close()
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+    def path_for(self, filename: str) -> Optional[str]:
+        """返回图片文件的本地路径，文件名不合法或不存在时返回 None"""
+        if not _FILENAME_PATTERN.match(filename):
+            return None
+
+        path = os.path.join(self.directory, filename)
+        return path if os.path.exists(path) else None
+
+    def url_for(self, filename: str) -> str:
+        """本服务提供的稳定图片URL（未配置 public_base_url 时为相对路径）"""
+        return f"{self.public_base_url}{IMAGE_ROUTE}/{filename}"
+
+    def stats(self) -> Dict[str, Any]:
+        files = self._list_files()
+        lookups = self.hits + self.misses
+        return {
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _list_files(self) -> list:
+        """(路径, 大小, 最近使用时间) 列表"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and _FILENAME_PATTERN.match(entry.name):
+                stat = entry.stat()
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """总大小超过上限时，删除最久未使用的图片（keep 指定的刚写入的图片除外）"""
+        with self._lock:
+            files = sorted(self._list_files(), key=lambda item: item[2])
+            total = sum(size for _, size, _ in files)
+            for path, size, _ in files:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
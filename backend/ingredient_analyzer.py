@@ -1,59 +1,118 @@
-import base64
-from typing import Dict, Any, Optional
-from openai import OpenAI
+import asyncio
+import binascii
+import os
+from typing import Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 
+from cache import PerceptualHashCache
+from http_pool import create_openai_client
+from image_preprocess import (
+    DEFAULT_MAX_PIXELS,
+    ImageSource,
+    ImageTooLargeError,
+    perceptual_hash,
+    preprocess_image,
+)
+from metrics import record_usage, span
+from resilience import get_upstream_policy
+
+# 每次编码的原始字节数，必须是3的倍数，这样分块编码的结果可以直接拼接
+_BASE64_CHUNK_SIZE = 3 * 64 * 1024
+
 load_dotenv()
 
 
 class IngredientAnalyzer:
     """基于GPT-4o-mini的图片分析器"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_image_edge: Optional[int] = None,
+        image_format: Optional[str] = None,
+        cache: Optional[PerceptualHashCache] = None,
+    ):
         """
         初始化分析器
 
         Args:
             api_key: OpenAI API密钥
+            max_image_edge: 发送给模型前图片长边的最大像素，默认读取 IMAGE_MAX_EDGE（1280）
+            image_format: 重新编码的格式 jpeg/webp，默认读取 IMAGE_OUTPUT_FORMAT（jpeg）
+            cache: 感知哈希缓存（可选），相同或几乎相同的图片直接返回之前的识别结果
         """
         self.api_key = api_key or self._get_api_key()
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = create_openai_client(self.api_key)
+        self.upstream = get_upstream_policy("vision")
+        self.max_image_edge = max_image_edge or int(os.getenv("IMAGE_MAX_EDGE", "1280"))
+        self.image_format = image_format or os.getenv("IMAGE_OUTPUT_FORMAT", "jpeg")
+        self.max_image_pixels = int(os.getenv("IMAGE_MAX_PIXELS", str(DEFAULT_MAX_PIXELS)))
+        self.cache = cache
 
     def _get_api_key(self) -> str:
         """获取API密钥"""
-        import os
-
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("未找到OPENAI_API_KEY环境变量")
         return api_key
 
-    def _encode_image(self, image_file) -> str:
+    def _prepare_image(self, image_file: ImageSource) -> Tuple[bytes, str, Optional[int]]:
         """
-        将图片文件编码为base64字符串
+        读取并压缩图片，同时计算感知哈希
+
+        MIME类型根据文件头识别，不再依赖文件扩展名（.jpg 曾被当成 image/jpg）
 
         Args:
-            image_file: 图片文件对象
+            image_file: 图片文件对象或图片字节。传入文件时直接从文件解码，原图不会整体读入内存
 
         Returns:
-            base64编码的图片字符串
+            (压缩后的图片数据, MIME类型, 感知哈希)，未启用缓存时哈希为 None
         """
-        # 重置文件指针到开头
-        image_file.seek(0)
+        # 纠正方向、缩小尺寸并重新编码，减少上传体积和视觉token
+        with span("vision", "vision_preprocess"):
+            image_data, mime_type = preprocess_image(
+                image_file,
+                max_edge=self.max_image_edge,
+                output_format=self.image_format,
+                max_pixels=self.max_image_pixels,
+            )
 
-        # 读取图片数据
-        image_data = image_file.read()
+        image_hash = None
+        if self.cache is not None:
+            with span("vision", "vision_hash"):
+                image_hash = perceptual_hash(image_data)
+        return image_data, mime_type, image_hash
 
-        # 编码为base64
-        base64_image = base64.b64encode(image_data).decode("utf-8")
+    def _encode_image(self, image_data: bytes, mime_type: str) -> str:
+        """
+        将图片数据编码为base64 data URL
+
+        Args:
+            image_data: 图片数据
+            mime_type: 图片的MIME类型
 
-        # 根据文件类型确定MIME类型
-        file_extension = image_file.name.split(".")[-1].lower()
-        mime_type = f"image/{file_extension}"
+        Returns:
+            base64编码的图片字符串
+        """
+        # 按最终长度预先分配缓冲区，分块编码后直接写入，
+        # 避免 base64 字节串、解码后的字符串、拼接 data URL 时的多份完整拷贝
+        prefix = f"data:{mime_type};base64,".encode("ascii")
+        encoded_length = 4 * ((len(image_data) + 2) // 3)
+        buffer = bytearray(len(prefix) + encoded_length)
+        buffer[: len(prefix)] = prefix
+
+        source = memoryview(image_data)
+        position = len(prefix)
+        for start in range(0, len(source), _BASE64_CHUNK_SIZE):
+            encoded = binascii.b2a_base64(
+                source[start : start + _BASE64_CHUNK_SIZE], newline=False
+            )
+            buffer[position : position + len(encoded)] = encoded
+            position += len(encoded)
 
-        return f"data:{mime_type};base64,{base64_image}"
+        return buffer.decode("ascii")
 
-    def analyze_image_for_ingredients(self, image_file) -> Dict[str, Any]:
+    async def analyze_image_for_ingredients(self, image_file) -> Dict[str, Any]:
         """
         分析图片中的食材
 
@@ -62,29 +121,49 @@ class IngredientAnalyzer:
 
         Returns:
             包含识别结果的字典
+
+        Raises:
+            ImageTooLargeError: 图片分辨率超过 IMAGE_MAX_PIXELS
         """
         try:
+            # 压缩图片（解码和压缩是CPU密集操作，放到线程池中避免阻塞事件循环）
+            image_data, mime_type, image_hash = await asyncio.to_thread(
+                self._prepare_image, image_file
+            )
+
+            # 相同或几乎相同的图片直接返回缓存的识别结果
+            if image_hash is not None:
+                cached = self.cache.get(image_hash)
+                if cached is not None:
+                    return {"success": True, **cached, "cached": True}
+
             # 编码图片
-            base64_image = self._encode_image(image_file)
+            with span("vision", "vision_encode"):
+                base64_image = self._encode_image(image_data, mime_type)
 
             # 构建提示词
             prompt = self._build_vision_prompt()
 
             # 调用GPT-4o-mini Vision API
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image_url", "image_url": {"url": base64_image}},
+            with span("vision", "vision_call"):
+                response = await self.upstream.call(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": [
+                                    {"type": "text", "text": prompt},
+                                    {"type": "image_url", "image_url": {"url": base64_image}},
+                                ],
+                            }
                         ],
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.3,
-            )
+                        max_tokens=1000,
+                        temperature=0.3,
+                    )
+                )
+
+            record_usage("vision", response.usage)
 
             # 解析响应
             content = response.choices[0].message.content
@@ -98,13 +177,21 @@ class IngredientAnalyzer:
                 # 如果解析失败，尝试提取JSON部分
                 result = self._extract_json_from_text(content)
 
-            return {
-                "success": True,
+            analysis = {
                 "ingredients": result.get("ingredients", []),
                 "raw_response": content,
                 "confidence": result.get("confidence", "unknown"),
             }
 
+            # 只缓存识别出食材的结果，识别为空时用户重试仍会重新调用模型
+            if image_hash is not None and analysis["ingredients"]:
+                self.cache.set(image_hash, analysis)
+
+            return {"success": True, **analysis, "cached": False}
+
+        except ImageTooLargeError:
+            # 由接口返回 413
+            raise
         except Exception as e:
             return {
                 "success": False,
@@ -165,7 +252,7 @@ class IngredientAnalyzer:
         # 如果找不到JSON，返回默认结构
         return {"ingredients": [], "confidence": "unknown", "description": text}
 
-    def get_ingredients_text(self, image_file) -> str:
+    async def get_ingredients_text(self, image_file) -> str:
         """
         获取图片中识别到的食材文本描述
 
@@ -175,7 +262,7 @@ class IngredientAnalyzer:
         Returns:
             食材文本描述
         """
-        result = self.analyze_image_for_ingredients(image_file)
+        result = await self.analyze_image_for_ingredients(image_file)
 
         if not result["success"]:
             return "图片分析失败"
@@ -0,0 +1,346 @@
+import json
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from cache import normalize_text
+from metrics import record_usage, span
+from resilience import get_upstream_policy
+from single_flight import SingleFlight
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_model.json")
+
+# 词典：匹配在 normalize_text 之后的文本上进行（已去掉空白和标点、英文小写）
+LEXICON = {
+    "ingredient": [
+        "土豆", "马铃薯", "番茄", "西红柿", "鸡蛋", "牛肉", "猪肉", "羊肉", "鸡肉", "鸡翅",
+        "鸡腿", "鸡胸", "排骨", "五花肉", "里脊", "肉末", "牛腩", "鱼", "虾", "螃蟹",
+        "鱿鱼", "蛤蜊", "扇贝", "豆腐", "白菜", "青菜", "菠菜", "生菜", "芹菜", "韭菜",
+        "洋葱", "大蒜", "生姜", "大葱", "小葱", "辣椒", "青椒", "彩椒", "茄子", "黄瓜",
+        "胡萝卜", "白萝卜", "南瓜", "冬瓜", "丝瓜", "苦瓜", "西兰花", "花菜", "蘑菇", "香菇",
+        "金针菇", "杏鲍菇", "木耳", "豆芽", "玉米", "米饭", "面条", "面粉", "饺子", "年糕",
+        "培根", "香肠", "火腿", "牛排", "鸭肉", "豆角", "四季豆", "山药", "莲藕", "牛奶",
+        "奶酪", "黄油", "芝士", "意面", "米粉", "粉丝", "剩饭", "食材",
+        "potato", "tomato", "egg", "beef", "pork", "chicken", "salmon", "shrimp", "tofu",
+        "onion", "garlic", "noodle", "pasta",
+    ],
+    "cooking": [
+        "做菜", "做饭", "烹饪", "下厨", "掌勺", "炒菜", "炖", "红烧", "清蒸", "凉拌",
+        "油炸", "煎蛋", "焖饭", "卤肉", "煲汤", "熬粥", "烘焙", "烤箱", "空气炸锅", "电饭锅",
+        "高压锅", "火候", "调味", "腌", "cook", "bake", "fry", "roast", "grill", "stew",
+    ],
+    "dish": [
+        "菜谱", "食谱", "做法", "菜式", "家常菜", "下饭菜", "快手菜", "硬菜", "汤", "粥",
+        "早餐", "午餐", "晚餐", "晚饭", "午饭", "早饭", "便当", "夜宵", "甜点", "小吃",
+        "宫保鸡丁", "鱼香肉丝", "麻婆豆腐", "糖醋", "回锅肉", "红烧肉", "可乐鸡翅",
+        "recipe", "dish", "meal", "dinner", "lunch", "breakfast",
+    ],
+    "preference": [
+        "中式", "西式", "日式", "韩式", "川菜", "粤菜", "湘菜", "鲁菜", "清淡", "不辣",
+        "微辣", "低脂", "低卡", "减脂", "高蛋白", "素食", "营养", "下饭", "好吃",
+    ],
+    "off_topic": [
+        "股市", "股票", "炒股", "基金", "电影", "电视剧", "天气", "新闻", "足球", "篮球",
+        "游戏", "编程", "代码", "python", "作业", "数学", "翻译", "写诗", "写一首",
+        "旅游", "机票", "酒店", "简历", "面试", "工资", "打车", "快递", "手机", "电脑",
+        "外卖", "程序", "英文", "英语", "怎么说",
+        "stock", "movie", "weather", "code",
+    ],
+}
+
+_LEXICON_PATTERNS = {
+    category: re.compile("|".join(re.escape(word) for word in words))
+    for category, words in LEXICON.items()
+}
+
+# 明确的做菜意图（只要命中即判定为菜谱需求）
+_RECIPE_PATTERNS = [
+    re.compile(r"菜谱|食谱|recipe"),
+    re.compile(r"(我想|想要|帮我|教我|我要|想学|学着|打算)(煮|炒|蒸|烤|炸|炖|煎)"),
+    re.compile(r"冰箱里(有|只有|还有|剩)"),
+    re.compile(r"这些食材|家里有.*(想做|做点|做个|做道|做什么)"),
+    re.compile(r"(做|煮|炒|蒸|烤|炸|炖)(个|道|一道|几道|点)(菜|汤|吃的|好吃的|家常)"),
+]
+
+# 不想做、不会做或抱怨做饭（"今天不想做饭"、"做饭好累啊"），提到做菜也不一定是要菜谱
+_NOT_COOKING_PATTERN = re.compile(r"不想|不会|懒得|没空|没时间|不用|好累|太累")
+
+# 需要食材或菜品词配合才能判定的做菜意图（"这道题怎么做"、"帮我做个PPT"不是做菜）
+_FOOD_CONTEXT_PATTERNS = [
+    re.compile(r"(我想|想要|帮我|教我|我要|想学|学着|打算)(做|学做|烧)"),
+    re.compile(r"怎么(做|炒|煮|烧|炖|蒸|烤|吃)|如何(做|炒|煮|烧|炖|蒸|烤)|做法"),
+    re.compile(r"(\d+|半|一|两)(分钟|小时).*(做|搞定|完成|出锅)"),
+]
+
+# 问候、询问助手本身等闲聊（整句只包含这些内容时判定为非菜谱需求）
+_CHITCHAT_PATTERN = re.compile(
+    r"^(你好|您好|hi|hello|hey|嗨|哈喽|哈啰|早上好|中午好|下午好|晚上好|早安|晚安|"
+    r"谢谢|谢谢你|多谢|再见|拜拜|在吗|在不在|你是谁|你叫什么|你叫什么名字|你能做什么|"
+    r"你会什么|你会干什么|你有什么功能|怎么用|好的|好|ok|嗯|哦|啊|呀|吗|呢|啦|吧|你|我)+$"
+)
+
+SYSTEM_PROMPT = """
+你是一个专门的意图识别助手。你的任务是判断用户的消息是否表达了"想要生成菜谱"的意图。
+
+菜谱生成意图包括：
+1. 明确表达想要做菜、烹饪的需求（如"我想做菜"、"帮我做个菜"）
+2. 提到食材并想要制作食物（如"我有土豆和牛肉，想做点什么"）
+3. 描述菜系、口味、时间等烹饪需求（如"想要一道简单的中式菜"、"半小时内完成的菜"）
+4. 询问特定食材的做法（如"土豆怎么做好吃"）
+5. 表达对特定菜品的制作需求（如"我想学做宫保鸡丁"）
+
+非菜谱生成意图包括：
+1. 一般性问候（如"你好"、"天气怎么样"）
+2. 询问其他信息（如"你是谁"、"你能做什么"）
+3. 与烹饪无关的话题（如"今天股市如何"、"推荐个电影"）
+
+请只回答 "是" 或 "否"，不要有其他内容。
+"""
+
+
+def lexicon_categories(normalized: str) -> List[str]:
+    """返回规范化文本命中的词典类别"""
+    return [
+        category
+        for category, pattern in _LEXICON_PATTERNS.items()
+        if pattern.search(normalized)
+    ]
+
+
+def has_mixed_signals(normalized: str) -> bool:
+    """
+    同时提到食材或做菜和无关话题（"推荐一部关于烹饪的电影"、"土豆的英文是什么"），
+    或者在否定、抱怨做饭。这类消息词典和本地模型都容易误判，交给 LLM
+    """
+    categories = lexicon_categories(normalized)
+    has_food = any(category in categories for category in ("ingredient", "cooking", "dish"))
+    return has_food and ("off_topic" in categories or bool(_NOT_COOKING_PATTERN.search(normalized)))
+
+
+def extract_features(normalized: str) -> List[str]:
+    """
+    模型特征：单字、相邻两字、命中的词典类别和长度分桶
+
+    训练脚本和线上推理共用这个函数，修改后需要重新训练模型。
+    """
+    features = {f"c:{char}" for char in normalized}
+    features.update(f"b:{normalized[i:i + 2]}" for i in range(len(normalized) - 1))
+    features.update(f"lex:{category}" for category in lexicon_categories(normalized))
+    if len(normalized) <= 4:
+        features.add("len:short")
+    elif len(normalized) >= 20:
+        features.add("len:long")
+    return sorted(features)
+
+
+class IntentModel:
+    """从 JSON 文件加载的逻辑回归模型（由 training/train_intent_model.py 训练生成）"""
+
+    def __init__(self, bias: float, weights: Dict[str, float]):
+        self.bias = bias
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["bias"], data["weights"])
+
+    def predict_proba(self, normalized: str) -> float:
+        """返回是菜谱需求的概率"""
+        score = self.bias + sum(
+            self.weights.get(feature, 0.0) for feature in extract_features(normalized)
+        )
+        return 1.0 / (1.0 + math.exp(-max(min(score, 30.0), -30.0)))
+
+
+class IntentClassifier:
+    """
+    判断用户消息是否为菜谱生成需求
+
+    依次经过三层，前一层足够确定时直接返回，不再调用后面的层：
+    1. 词典规则：明确的做菜表达、纯问候/闲聊、与烹饪无关的话题
+    2. 本地模型：随仓库发布的逻辑回归模型，置信度达到阈值时采用
+    3. LLM：只有本地无法确定的消息才调用 gpt-4o-mini
+
+    同时提到做菜和无关话题、或否定做饭的消息（见 has_mixed_signals）跳过本地模型，直接交给 LLM。
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model_path: Optional[str] = None,
+        model_threshold: Optional[float] = None,
+        llm_fallback: Optional[bool] = None,
+        single_flight: Optional[SingleFlight] = None,
+    ):
+        """
+        初始化意图分类器
+
+        Args:
+            api_key: OpenAI API密钥，如果不提供则从环境变量OPENAI_API_KEY获取
+            model_path: 模型文件路径，默认为 backend/intent_model.json
+            model_threshold: 采用本地模型结论所需的最低置信度，默认读取 INTENT_MODEL_THRESHOLD（0.85）
+            llm_fallback: 本地无法确定时是否调用 LLM，默认读取 INTENT_LLM_FALLBACK（true）
+            single_flight: 请求合并层（可选），规范化后相同的并发消息只调用一次 LLM
+        """
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._client = None
+        # 只输出一个字，截止时间较短；失败时采用本地模型的倾向
+        self.upstream = get_upstream_policy("intent", timeout=5)
+        self.model_threshold = model_threshold or float(
+            os.getenv("INTENT_MODEL_THRESHOLD", "0.85")
+        )
+        if llm_fallback is None:
+            llm_fallback = os.getenv("INTENT_LLM_FALLBACK", "true").lower() != "false"
+        self.llm_fallback = llm_fallback
+        self.single_flight = single_flight
+        self.decisions = {"lexicon": 0, "model": 0, "llm": 0, "model_fallback": 0}
+
+        try:
+            self.model: Optional[IntentModel] = IntentModel.load(
+                model_path or DEFAULT_MODEL_PATH
+            )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ 意图模型加载失败，跳过本地模型: {e}")
+            self.model = None
+
+    @property
+    def client(self):
+        """OpenAI 客户端在第一次需要调用 LLM 时才创建，本地就能判断的消息不会导入 openai"""
+        if self._client is None:
+            from http_pool import create_openai_client
+
+            self._client = create_openai_client(self.api_key)
+        return self._client
+
+    def classify_local(self, message: str) -> Dict[str, Any]:
+        """
+        只用词典和本地模型分类，不发起网络请求
+
+        Returns:
+            {
+                "is_recipe_request": True / False，无法确定时为 None,
+                "confidence": 0.0 ~ 1.0,
+                "decision_path": ["lexicon", "model"],  # 经过的层
+                "model_probability": 本地模型给出的菜谱需求概率（未经过模型时为 None）
+            }
+        """
+        normalized = normalize_text(message)
+        path = ["lexicon"]
+
+        decision = self._classify_lexicon(normalized)
+        if decision is not None:
+            return {
+                "is_recipe_request": decision,
+                "confidence": 0.97,
+                "decision_path": path,
+                "model_probability": None,
+            }
+
+        if self.model is None or has_mixed_signals(normalized):
+            return {
+                "is_recipe_request": None,
+                "confidence": 0.0,
+                "decision_path": path,
+                "model_probability": None,
+            }
+
+        path.append("model")
+        probability = self.model.predict_proba(normalized)
+        confidence = max(probability, 1.0 - probability)
+        return {
+            "is_recipe_request": probability >= 0.5 if confidence >= self.model_threshold else None,
+            "confidence": round(confidence, 4),
+            "decision_path": path,
+            "model_probability": round(probability, 4),
+        }
+
+    async def classify(self, message: str) -> Dict[str, Any]:
+        """
+        分类用户消息，本地无法确定时调用 LLM
+
+        Returns:
+            classify_local 的结果，is_recipe_request 一定为布尔值
+        """
+        result = self.classify_local(message)
+        if result["is_recipe_request"] is not None:
+            self.decisions[result["decision_path"][-1]] += 1
+            return result
+
+        probability = result["model_probability"]
+        if self.llm_fallback:
+            result["decision_path"].append("llm")
+            try:
+                if self.single_flight is not None:
+                    result["is_recipe_request"] = await self.single_flight.do(
+                        normalize_text(message), lambda: self._classify_llm(message)
+                    )
+                else:
+                    result["is_recipe_request"] = await self._classify_llm(message)
+                result["confidence"] = 0.9  # LLM 只回答是/否，没有概率，按固定置信度报告
+                self.decisions["llm"] += 1
+                return result
+            except Exception as e:
+                print(f"LLM 意图分析失败: {str(e)}")
+
+        # LLM 不可用时采用本地模型的倾向；没有模型时返回 False，让前端使用关键词兜底
+        result["decision_path"].append("model_fallback")
+        result["is_recipe_request"] = probability is not None and probability >= 0.5
+        self.decisions["model_fallback"] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.decisions.values())
+        local = self.decisions["lexicon"] + self.decisions["model"]
+        return {
+            "model_loaded": self.model is not None,
+            "model_threshold": self.model_threshold,
+            "decisions": dict(self.decisions),
+            "local_rate": local / total if total else 0.0,
+        }
+
+    def _classify_lexicon(self, normalized: str) -> Optional[bool]:
+        """只处理高精度的规则，其余返回 None 交给模型"""
+        if not normalized or _CHITCHAT_PATTERN.match(normalized):
+            return False
+
+        if has_mixed_signals(normalized):
+            return None
+
+        categories = lexicon_categories(normalized)
+        has_food = any(
+            category in categories for category in ("ingredient", "cooking", "dish")
+        )
+
+        recipe_hit = any(pattern.search(normalized) for pattern in _RECIPE_PATTERNS)
+
+        if "off_topic" in categories and not has_food:
+            # "我想炒股"这类同时命中做菜句式和无关话题的消息交给模型
+            return None if recipe_hit else False
+        if recipe_hit:
+            return True
+        if has_food and any(pattern.search(normalized) for pattern in _FOOD_CONTEXT_PATTERNS):
+            return True
+        return None
+
+    async def _classify_llm(self, message: str) -> bool:
+        user_prompt = f'用户消息："{message}"\n\n这个消息是否表达了菜谱生成的意图？'
+
+        with span("intent", "intent_llm"):
+            response = await self.upstream.call(
+                lambda: self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    temperature=0.1,
+                    max_completion_tokens=10,
+                )
+            )
+        record_usage("intent", response.usage)
+
+        result = response.choices[0].message.content.strip()
+        return result == "是"
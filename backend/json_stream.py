@@ -0,0 +1,147 @@
+import json
+from typing import Any, List, Tuple
+
+# 字面量（数字、true、false、null）可能包含的字符
+_LITERAL_CHARS = set("-+0123456789.eEtrufalsn")
+_WHITESPACE = set(" \t\r\n")
+
+
+class StreamJSONError(Exception):
+    """
+    流式文本不是合法的JSON
+
+    不继承 ValueError：调用方把 ValueError 当成用户输入错误（400），而这是上游返回的内容有问题
+    """
+
+
+class IncrementalJSONParser:
+    """
+    增量JSON解析器，用于解析LLM流式返回的JSON片段
+
+    每次 feed 一段文本，返回这段文本中"刚刚完整"的所有值及其路径，例如：
+        feed('{"dish_name": "番茄炒')     -> []
+        feed('蛋", "ingredients": [{"name": "鸡蛋"}')
+            -> [(("dish_name",), "番茄炒蛋"),
+                (("ingredients", 0, "name"), "鸡蛋"),
+                (("ingredients", 0), {"name": "鸡蛋"})]
+
+    路径由对象的键和数组下标组成，调用方可以按路径挑选自己关心的字段。
+    """
+
+    def __init__(self):
+        # 栈中每一帧是一个未闭合的容器：
+        # {"value": dict/list, "path": tuple, "key": 当前键, "expect": 期待的下一个token}
+        self._stack: List[dict] = []
+        self._string: List[str] | None = None  # 正在读取的字符串（原始字符，含转义）
+        self._escaped = False
+        self._literal: List[str] | None = None  # 正在读取的字面量
+        self.root: Any = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[tuple, Any]]:
+        """
+        输入一段文本，返回其中完成的 (路径, 值) 列表
+
+        Raises:
+            StreamJSONError: 文本不是合法的JSON
+        """
+        completed: List[Tuple[tuple, Any]] = []
+        try:
+            for char in chunk:
+                self._consume(char, completed)
+        except StreamJSONError:
+            raise
+        except (ValueError, IndexError, KeyError, TypeError) as e:
+            # 字符串/字面量解码失败、多余的右括号、非字符串的键等
+            raise StreamJSONError(f"无法解析的JSON: {e}") from e
+        return completed
+
+    def _consume(self, char: str, completed: list) -> None:
+        # 1. 字符串内部：只需要关心结束引号和转义
+        if self._string is not None:
+            if self._escaped:
+                self._escaped = False
+                self._string.append(char)
+            elif char == "\\":
+                self._escaped = True
+                self._string.append(char)
+            elif char == '"':
+                raw = "".join(self._string)
+                self._string = None
+                self._complete_value(json.loads(f'"{raw}"'), completed)
+            else:
+                self._string.append(char)
+            return
+
+        # 2. 字面量内部：遇到分隔符时结束
+        if self._literal is not None:
+            if char in _LITERAL_CHARS:
+                self._literal.append(char)
+                return
+            raw = "".join(self._literal)
+            self._literal = None
+            self._complete_value(json.loads(raw), completed)
+
+        # 3. 结构字符
+        if self.done or char in _WHITESPACE:
+            return
+
+        if char == '"':
+            self._string = []
+        elif char == "{":
+            self._push({})
+        elif char == "[":
+            self._push([])
+        elif char in "}]":
+            frame = self._stack.pop()
+            self._complete_value(frame["value"], completed)
+        elif char == ":":
+            self._stack[-1]["expect"] = "value"
+        elif char == ",":
+            frame = self._stack[-1]
+            frame["expect"] = "key" if isinstance(frame["value"], dict) else "value"
+        elif char in _LITERAL_CHARS:
+            self._literal = [char]
+        else:
+            raise StreamJSONError(f"无法解析的JSON字符: {char!r}")
+
+    def _child_path(self) -> tuple:
+        """下一个值在父容器中的路径"""
+        if not self._stack:
+            return ()
+        parent = self._stack[-1]
+        if isinstance(parent["value"], dict):
+            return parent["path"] + (parent["key"],)
+        return parent["path"] + (len(parent["value"]),)
+
+    def _push(self, container) -> None:
+        self._stack.append(
+            {
+                "value": container,
+                "path": self._child_path(),
+                "key": None,
+                "expect": "key" if isinstance(container, dict) else "value",
+            }
+        )
+
+    def _complete_value(self, value: Any, completed: list) -> None:
+        if not self._stack:
+            self.root = value
+            self.done = True
+            completed.append(((), value))
+            return
+
+        parent = self._stack[-1]
+        if isinstance(parent["value"], dict):
+            if parent["expect"] == "key":
+                parent["key"] = value
+                parent["expect"] = "colon"
+                return
+            path = parent["path"] + (parent["key"],)
+            parent["value"][parent["key"]] = value
+        else:
+            path = parent["path"] + (len(parent["value"]),)
+            parent["value"].append(value)
+
+        parent["expect"] = "comma"
+        completed.append((path, value))
@@ -2,7 +2,8 @@
 Lambda Handler - Adapts FastAPI application to AWS Lambda
 
 This file uses Mangum to convert the FastAPI app to a Lambda-compatible handler.
-Baseline version without performance optimizations.
+Importing main is kept cheap: the AI components and their SDKs (openai, dashscope)
+are imported and created on first use, see lazy_component.py.
 """
 
 from mangum import Mangum
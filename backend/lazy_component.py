@@ -0,0 +1,74 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 所有 LazyComponent 实例，用于统一输出统计信息
+_COMPONENT_REGISTRY: List["LazyComponent"] = []
+
+_NOT_CREATED = object()
+
+
+class LazyComponent(Generic[T]):
+    """
+    第一次使用时才创建的组件
+
+    factory 在第一次调用 get() 时执行（重量级 SDK 的导入也放在 factory 里），
+    之后一直返回同一个实例。factory 抛出异常时不会记住失败，下次 get() 会重试，
+    例如缺少 DASHSCOPE_API_KEY 只影响图片相关的接口，不影响其他接口。
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._instance: Any = _NOT_CREATED
+        self._lock = threading.Lock()
+        self.init_ms: Optional[float] = None
+        _COMPONENT_REGISTRY.append(self)
+
+    @property
+    def created(self) -> bool:
+        return self._instance is not _NOT_CREATED
+
+    def get(self) -> T:
+        if self._instance is _NOT_CREATED:
+            with self._lock:
+                if self._instance is _NOT_CREATED:
+                    start = time.perf_counter()
+                    instance = self._factory()
+                    self.init_ms = (time.perf_counter() - start) * 1000
+                    print(f"🧩 组件 {self.name} 已创建，耗时 {self.init_ms:.1f}ms")
+                    self._instance = instance
+        return self._instance
+
+    def peek(self) -> Optional[T]:
+        """已创建时返回实例，否则返回 None（不会触发创建）"""
+        return None if self._instance is _NOT_CREATED else self._instance
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "created": self.created,
+            "init_ms": round(self.init_ms, 1) if self.init_ms is not None else None,
+        }
+
+
+def preload_components(names: str) -> None:
+    """
+    提前创建组件，names 为逗号分隔的组件名，"all" 表示全部
+
+    用于预置并发或常驻进程：把创建开销放到初始化阶段，而不是第一个请求。
+    创建失败的组件只打印警告，留到第一次使用时再重试。
+    """
+    wanted = {name.strip() for name in names.split(",") if name.strip()}
+    for component in _COMPONENT_REGISTRY:
+        if "all" in wanted or component.name in wanted:
+            try:
+                component.get()
+            except Exception as e:
+                print(f"⚠️ 预加载组件 {component.name} 失败: {e}")
+
+
+def component_stats() -> Dict[str, Dict[str, Any]]:
+    """所有组件是否已创建以及创建耗时"""
+    return {component.name: component.stats() for component in _COMPONENT_REGISTRY}
@@ -0,0 +1,182 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from intent_classifier import LEXICON
+
+# 食材词典：意图识别的词典（"食材"本身不是食材）加上常见的调料和其他食材
+_INGREDIENTS = [word for word in LEXICON["ingredient"] if word != "食材"] + [
+    "鸡", "鸭", "鸡胸肉", "鸡腿肉", "猪肝", "猪蹄", "鸡爪", "鸡蛋", "鸭蛋", "皮蛋", "咸蛋", "午餐肉",
+    "三文鱼", "鲈鱼", "鲫鱼", "草鱼", "带鱼", "黄鱼", "龙利鱼", "虾仁", "海带", "紫菜",
+    "秋葵", "莴笋", "芦笋", "竹笋", "笋", "娃娃菜", "油麦菜", "空心菜", "西葫芦", "毛豆",
+    "豌豆", "荷兰豆", "土豆", "红薯", "紫薯", "芋头", "藕", "腐竹", "豆皮", "千张",
+    "米", "大米", "小米", "糯米", "燕麦", "馒头", "面包", "吐司", "粉条", "河粉",
+    "葱", "姜", "蒜", "香菜", "花椒", "八角", "桂皮", "酱油", "生抽", "老抽",
+    "蚝油", "醋", "料酒", "豆瓣酱", "番茄酱", "白糖", "冰糖", "蜂蜜", "柠檬", "苹果",
+    "香蕉", "牛油果", "可乐", "咖喱", "花生", "干辣椒", "黄豆", "肥牛", "腊肠", "腊肉",
+]
+# 长词优先匹配，"鸡胸"不会被拆成"鸡"
+_INGREDIENT_PATTERN = re.compile(
+    "|".join(re.escape(word) for word in sorted(set(_INGREDIENTS), key=len, reverse=True))
+)
+
+_CHINESE_NUMBERS = {
+    "一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9,
+}
+_NUMBER = r"(\d+(?:\.\d+)?|[一两二三四五六七八九十]+)"
+
+_TIME_PATTERNS = [
+    re.compile(rf"{_NUMBER}\s*分钟"),
+    re.compile(r"半(个)?(小时|钟头)"),
+    re.compile(r"一刻钟"),
+    re.compile(rf"{_NUMBER}\s*(个)?(半)?(小时|钟头)"),
+]
+_SERVING_PATTERN = re.compile(rf"{_NUMBER}\s*(个)?人(份|吃|的量)?")
+
+_CUISINES = {
+    "川菜": "川菜", "川味": "川菜", "粤菜": "粤菜", "湘菜": "湘菜", "鲁菜": "鲁菜",
+    "中式": "中式", "家常": "中式", "西式": "西式", "西餐": "西式", "日式": "日式",
+    "日料": "日式", "韩式": "韩式", "韩国": "韩式",
+}
+_CUISINE_PATTERN = re.compile("|".join(re.escape(word) for word in _CUISINES))
+_DIETARY = [
+    (re.compile(r"不(要|吃|能吃)?辣|别(太)?辣|少辣"), "不辣"),
+    (re.compile(r"微辣"), "微辣"),
+    (re.compile(r"素食|吃素|不吃肉"), "素食"),
+    (re.compile(r"低盐|少盐"), "低盐"),
+    (re.compile(r"无糖|不要糖|少糖"), "无糖"),
+    (re.compile(r"少油"), "少油"),
+    (re.compile(r"清淡"), "清淡"),
+]
+_CALORIES = [
+    (re.compile(r"低热量|低卡|减肥|减脂|低脂"), "低热量"),
+    (re.compile(r"高蛋白|增肌"), "高蛋白"),
+]
+_DIFFICULTY = [
+    (re.compile(r"简单|快手|省事|新手|(不要|别)太?复杂"), "简单"),
+    (re.compile(r"复杂|硬菜|大菜"), "复杂"),
+]
+
+# 不影响解析结果的常见用语和食材用量，算作已识别的部分
+_FILLER_PATTERN = re.compile(
+    r"我们|我|家里|冰箱里|冰箱|手边|现在|今天|今晚|晚上|中午|早上|只有|还有|还剩|剩下|剩|有|"
+    r"想要|想|要|打算|准备|用|帮我|给我|请|麻烦|来|做|一道|道|一些|一点|一下|点|些|个|份|"
+    r"菜|饭|吃|的|了|和|跟|与|以及|及|还|再|加上|加|配|能|可以|吗|吧|呢|啊|呀|左右|以内|之内|内|"
+    r"搞定|完成|出锅|时间|口味|餐|做法|"
+    r"煲汤|熬粥|凉拌|清蒸|红烧|蒸|煮|炒|炖|烤|煎|煲|汤|粥|高压锅|电饭锅|空气炸锅|烤箱|"
+    rf"{_NUMBER}?\s*(个|颗|根|块|斤|克|g|片|把|勺|盒|袋|只|条|瓣|包)"
+)
+# 没有识别出来的部分包含这些字时，多半是否定或替换食材（"不要香菜"、"鸡蛋换成鸭蛋"），
+# 本地解析会把它们当成要用的食材
+_NEGATION_PATTERN = re.compile(r"不|没|别|除|忌|过敏|换|代替|替代|少放|去掉")
+# 包含否定时置信度的上限
+_NEGATION_CONFIDENCE = 0.5
+# 没有识别出来的部分包含数字时（"20-30分钟"里的 20），数字可能属于时间或人数，置信度的上限
+_DIGIT_CONFIDENCE = 0.5
+
+
+def _to_number(text: str) -> float:
+    """阿拉伯数字（可以带小数，如 1.5）或一百以内的中文数字，如 4、十五、四十五"""
+    if text[0].isdigit():
+        return float(text)
+    if "十" not in text:
+        return _CHINESE_NUMBERS.get(text, 0)
+    tens, _, ones = text.rpartition("十")
+    return _CHINESE_NUMBERS.get(tens, 1) * 10 + _CHINESE_NUMBERS.get(ones, 0)
+
+
+def _first_match(rules: list, text: str) -> Optional[str]:
+    for pattern, value in rules:
+        if pattern.search(text):
+            return value
+    return None
+
+
+def _cook_time(text: str) -> Optional[int]:
+    match = _TIME_PATTERNS[0].search(text)
+    if match:
+        return round(_to_number(match.group(1)))
+    # "一个半小时"要先于"半小时"匹配
+    match = _TIME_PATTERNS[3].search(text)
+    if match:
+        return round(_to_number(match.group(1)) * 60) + (30 if match.group(3) else 0)
+    if _TIME_PATTERNS[1].search(text):
+        return 30
+    if _TIME_PATTERNS[2].search(text):
+        return 15
+    if "快手" in text:
+        return 30
+    return None
+
+
+def _serving_size(text: str) -> int:
+    match = _SERVING_PATTERN.search(text)
+    return int(_to_number(match.group(1))) if match else 2
+
+
+def _ingredients(text: str) -> List[str]:
+    found: List[str] = []
+    for match in _INGREDIENT_PATTERN.finditer(text):
+        if match.group(0) not in found:
+            found.append(match.group(0))
+    return found
+
+
+def _unparsed(text: str) -> str:
+    """去掉所有识别出的部分、常用语和标点后剩下的文字"""
+    covered = [False] * len(text)
+    patterns = (
+        [_INGREDIENT_PATTERN, *_TIME_PATTERNS, _SERVING_PATTERN, _CUISINE_PATTERN]
+        + [pattern for pattern, _ in _DIETARY + _CALORIES + _DIFFICULTY]
+    )
+    # 先标记有意义的词，再标记常用语，避免"不要辣"里的"要"被当成常用语
+    for pattern in patterns + [_FILLER_PATTERN]:
+        for match in pattern.finditer(text):
+            if any(covered[match.start():match.end()]):
+                continue
+            for i in range(match.start(), match.end()):
+                covered[i] = True
+    return "".join(
+        char for char, is_covered in zip(text, covered) if not is_covered and char.isalnum()
+    )
+
+
+def parse_requirements_locally(user_input: str) -> Dict[str, Any]:
+    """
+    按词典和规则从用户描述中提取需求，不调用 LLM
+
+    Returns:
+        {
+            "requirements": {...},  # 与 LLM 解析相同的结构，没有提到的字段为 None，由解析器统一校验和补充默认值
+            "confidence": 0.0 ~ 1.0,  # 描述中被识别的文字占比；没有识别出食材时为 0，
+                                      # 未识别的部分包含否定或数字时不超过 0.5
+            "unparsed": "秋葵"  # 没有识别出来的文字
+        }
+
+    只认识词典中的食材，"不要香菜"这类否定也不会处理，所以低置信度的结果应该交给 LLM 解析。
+    """
+    text = user_input.lower()
+    cuisine_match = _CUISINE_PATTERN.search(text)
+    requirements = {
+        "ingredients": _ingredients(text),
+        "max_cook_time_mins": _cook_time(text),
+        "dietary_requirements": [value for pattern, value in _DIETARY if pattern.search(text)],
+        "cuisine_preference": _CUISINES[cuisine_match.group(0)] if cuisine_match else None,
+        "difficulty_preference": _first_match(_DIFFICULTY, text),
+        "calorie_preference": _first_match(_CALORIES, text),
+        "serving_size": _serving_size(text),
+    }
+
+    unparsed = _unparsed(text)
+    meaningful = sum(1 for char in text if char.isalnum())
+    confidence = 1.0 - len(unparsed) / meaningful if meaningful else 0.0
+    if not requirements["ingredients"]:
+        confidence = 0.0
+    elif _NEGATION_PATTERN.search(unparsed):
+        confidence = min(confidence, _NEGATION_CONFIDENCE)
+    elif any(char.isdigit() for char in unparsed):
+        confidence = min(confidence, _DIGIT_CONFIDENCE)
+    return {
+        "requirements": requirements,
+        "confidence": round(confidence, 4),
+        "unparsed": unparsed,
+    }
@@ -1,23 +1,51 @@
 import os
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from typing import Dict, Any
-import io
-
-# 导入所有需要的类
-from parser import RecipeRequirementsParser
-from generator import RecipeGenerator
-from image_generator import QwenImageGenerator
-from ingredient_analyzer import IngredientAnalyzer
-from recipe_optimizer import RecipeOptimizer
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple, Union
+import asyncio
+import json
+import math
+import time
+
+# 只导入轻量的模块；各个AI组件（以及 openai、dashscope 等SDK）在第一次使用时才导入和创建，
+# 见下方的 LazyComponent，缩短冷启动时间
+from admission import admission_stats
+from cache import create_backend, create_cache, create_perceptual_cache, cache_stats
+from deadline import Deadline
+from http_pool import http_pool_stats
+from lazy_component import LazyComponent, component_stats, preload_components
+from metrics import MetricsMiddleware, render_prometheus
+from recipe_sessions import strip_session_fields
+from resilience import UpstreamError, upstream_stats
+from single_flight import create_single_flight, single_flight_stats
+from upload_limit import UploadSizeLimitMiddleware
 
 load_dotenv()
 
 
 app = FastAPI()
 
+# 菜谱生成流水线模式：
+# - chained: 先调用解析器，再调用生成器（两次LLM调用）
+# - fused: 一次结构化输出同时返回需求和菜谱
+RECIPE_PIPELINE_MODE = os.getenv("RECIPE_PIPELINE_MODE", "chained")
+
+# 批量生成：默认并发数、单个请求允许的最大并发数和最多条目数
+RECIPE_BATCH_CONCURRENCY = int(os.getenv("RECIPE_BATCH_CONCURRENCY", "8"))
+RECIPE_BATCH_MAX_CONCURRENCY = int(os.getenv("RECIPE_BATCH_MAX_CONCURRENCY", "32"))
+RECIPE_BATCH_MAX_ITEMS = int(os.getenv("RECIPE_BATCH_MAX_ITEMS", "500"))
+
+# 保存到菜谱会话中的AI回复，与前端显示的优化完成消息一致
+OPTIMIZE_REPLY = '我已经根据您的需求"{request}"优化了菜谱。'
+
+# 上传图片的大小上限
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+# multipart 边界和表单头部占用的额外字节
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
 
 # 从环境变量获取CORS配置
 def get_cors_origins():
@@ -52,6 +80,13 @@ def get_cors_origins():
     return origins
 
 
+# 限制上传请求体大小，超限时不再继续读取（先添加，使CORS中间件位于最外层，413响应也带CORS头）
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    paths=["/api/v1/ingredients/analyze"],
+)
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -61,32 +96,155 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 最后添加，位于最外层：记录每个请求的耗时并添加 Server-Timing 响应头
+app.add_middleware(MetricsMiddleware)
+
 
 class RecipeImageRequest(BaseModel):
-    recipe_json: Dict[str, Any]
+    recipe_json: Optional[Dict[str, Any]] = None
+    recipe_id: Optional[str] = None  # 服务端保存的菜谱，和 recipe_json 二选一
+    version: Optional[int] = None  # 配合 recipe_id 使用，默认最新版本
 
 
 class RecipeRequest(BaseModel):
     description: str
+    use_cache: bool = True  # 设为 False 时跳过菜谱缓存，总是生成新菜谱
+
+
+class RecipeBatchItem(BaseModel):
+    id: Optional[str] = None  # 调用方自定义的标识，原样出现在结果中
+    description: Optional[str] = None  # 自然语言描述，和 requirements 二选一
+    requirements: Optional[Dict[str, Any]] = None  # 已结构化的需求，跳过需求解析
+
+
+class RecipeBatchRequest(BaseModel):
+    items: List[Union[str, RecipeBatchItem]]  # 字符串视为自然语言描述
+    concurrency: Optional[int] = None  # 同时生成的条目数，默认 RECIPE_BATCH_CONCURRENCY
+    use_cache: bool = True
 
 
 class RecipeOptimizeRequest(BaseModel):
-    current_recipe: Dict[str, Any]
+    current_recipe: Optional[Dict[str, Any]] = None
     user_request: str
-    conversation_history: list = []
+    # 传 recipe_id 时可以省略，使用服务端保存的对话历史
+    conversation_history: Optional[list] = None
+    recipe_id: Optional[str] = None  # 服务端保存的菜谱，和 current_recipe 二选一
+    version: Optional[int] = None  # 基于哪个版本优化，默认最新版本
 
 
 class IntentAnalysisRequest(BaseModel):
     message: str
 
 
-# 在API函数外创建解析器的实例,初始化所有AI组件
-# 这样应用启动时就创建好了，不用每次请求都重新创建一个，效率更高
-parser = RecipeRequirementsParser()
-generator = RecipeGenerator()
-image_generator = QwenImageGenerator()
-ingredient_analyzer = IngredientAnalyzer()
-recipe_optimizer = RecipeOptimizer()
+# AI组件在第一次使用时创建，之后所有请求共用同一个实例。
+# 只访问文本接口的实例不会导入 dashscope，缺少 DASHSCOPE_API_KEY 也只影响图片接口。
+def _create_parser():
+    from parser import RecipeRequirementsParser
+
+    return RecipeRequirementsParser(
+        cache=create_cache("requirements", "REQUIREMENTS_CACHE"),
+        single_flight=create_single_flight("requirements"),
+    )
+
+
+def _create_generator():
+    from generator import RecipeGenerator
+
+    return RecipeGenerator(
+        cache=create_cache("recipes", "RECIPE_CACHE", variants_per_key=3),
+        single_flight=create_single_flight("recipes"),
+    )
+
+
+def _create_image_store():
+    """生成的图片下载到本地，按 Prompt 内容寻址复用，避免上游URL过期和重复生成"""
+    if os.getenv("IMAGE_STORE_ENABLED", "true").lower() != "true":
+        return None
+
+    from image_store import ImageStore
+
+    return ImageStore(
+        directory=os.getenv("IMAGE_STORE_DIR", "/tmp/recipe_images"),
+        max_bytes=int(os.getenv("IMAGE_STORE_MAX_MB", "200")) * 1024 * 1024,
+        public_base_url=os.getenv("PUBLIC_BASE_URL", ""),
+        max_download_bytes=int(os.getenv("IMAGE_STORE_MAX_DOWNLOAD_MB", "20")) * 1024 * 1024,
+    )
+
+
+def _create_image_job_store():
+    """图片任务的共享状态，多个 uvicorn worker 都能查询任务；关闭时返回 None"""
+    return create_backend(
+        "image_jobs", "IMAGE_JOB_STORE", default_size=500, default_backend="sqlite"
+    )
+
+
+def _create_image_jobs():
+    from image_generator import QwenImageGenerator
+    from image_jobs import ImageJobQueue
+
+    return ImageJobQueue(
+        QwenImageGenerator(store=image_store.get()),
+        max_workers=int(os.getenv("IMAGE_JOB_WORKERS", "4")),
+        max_pending=int(os.getenv("IMAGE_JOB_QUEUE_SIZE", "100")),
+        store=image_job_store.get(),
+    )
+
+
+def _create_ingredient_analyzer():
+    from ingredient_analyzer import IngredientAnalyzer
+
+    return IngredientAnalyzer(cache=create_perceptual_cache("vision", "VISION_CACHE"))
+
+
+def _create_recipe_optimizer():
+    from conversation_summary import ConversationSummarizer
+    from recipe_optimizer import RecipeOptimizer
+
+    # 较早的对话折叠为约束摘要，按对话前缀缓存；关闭缓存时只使用最近4条消息
+    summary_cache = create_cache("conversation_summaries", "CONVERSATION_SUMMARY_CACHE")
+    return RecipeOptimizer(
+        single_flight=create_single_flight("optimize"),
+        summarizer=ConversationSummarizer(summary_cache) if summary_cache else None,
+    )
+
+
+def _create_intent_classifier():
+    from intent_classifier import IntentClassifier
+
+    return IntentClassifier(single_flight=create_single_flight("intent"))
+
+
+def _create_recipe_sessions():
+    """生成和优化的菜谱保存在服务端，之后的请求只需要传 recipe_id；关闭时返回 None"""
+    from recipe_sessions import create_recipe_session_store
+
+    return create_recipe_session_store()
+
+
+parser = LazyComponent("parser", _create_parser)
+generator = LazyComponent("generator", _create_generator)
+image_store = LazyComponent("image_store", _create_image_store)
+image_job_store = LazyComponent("image_job_store", _create_image_job_store)
+image_jobs = LazyComponent("image_jobs", _create_image_jobs)
+ingredient_analyzer = LazyComponent("ingredient_analyzer", _create_ingredient_analyzer)
+recipe_optimizer = LazyComponent("recipe_optimizer", _create_recipe_optimizer)
+intent_classifier = LazyComponent("intent_classifier", _create_intent_classifier)
+recipe_sessions = LazyComponent("recipe_sessions", _create_recipe_sessions)
+
+# 预置并发或常驻进程可以在启动时创建部分或全部组件，例如 PRELOAD_COMPONENTS=all
+preload_components(os.getenv("PRELOAD_COMPONENTS", ""))
+
+
+def _error_status(e: Exception) -> int:
+    """上游超时返回 504、熔断返回 503、限流排队已满返回 429、重试后仍失败返回 502，其他错误返回 500"""
+    return e.status_code if isinstance(e, UpstreamError) else 500
+
+
+def _server_error(e: Exception) -> HTTPException:
+    headers = None
+    if isinstance(e, UpstreamError) and e.retry_after:
+        headers = {"Retry-After": str(math.ceil(e.retry_after))}
+    return HTTPException(status_code=_error_status(e), detail=str(e), headers=headers)
 
 
 @app.post("/api/v1/recipes/generate")
@@ -106,23 +264,114 @@ async def generate_recipe(request: RecipeRequest):  # 👈 把模型作为类型
 
     user_description = request.description
     print(f"收到了前端发来的请求: {user_description}")
+    # 时间不够时解析器和生成器会降级（本地解析、精简菜谱），保证在截止时间内返回
+    deadline = Deadline()
 
     try:
-        # 调用解析器，解析用户需求
-        print("🔍 正在解析您的需求...")
-        requirements = parser.parse_requirements(user_description)
-        print("✅ 解析完成！识别到：")
-        print(f"   🥘 食材: {', '.join(requirements['ingredients'])}")
-        print(f"   🕐 最大烹饪时间: {requirements['max_cook_time_mins']}分钟")
-        print(f"   🍽️ 菜系: {requirements['cuisine_preference']}")
-        print(f"   ⚡ 难度: {requirements['difficulty_preference']}")
-        print(f"   🥗 饮食要求: {', '.join(requirements['dietary_requirements'])}")
-        print(f"   🔥 热量偏好: {requirements['calorie_preference']}")
-        print(f"   👥 份数: {requirements['serving_size']}人份")
-
-        # 调用生成器，生成菜谱
-        print("👨‍🍳 正在生成菜谱...")
-        recipe_json = generator.generate_recipe(
+        if RECIPE_PIPELINE_MODE == "fused":
+            requirements, recipe_json = await _generate_recipe_fused(user_description, deadline)
+        else:
+            requirements, recipe_json = await _generate_recipe_chained(
+                user_description, use_cache=request.use_cache, deadline=deadline
+            )
+        print("🎉 菜谱生成完成！")
+        result = _save_recipe_version(recipe_json, [{"role": "user", "content": user_description}])
+        if deadline.degradations:
+            result = {**result, "degradations": deadline.degradations}
+        return result
+
+    except ValueError as ve:
+        print(f"❌ 解析用户需求时发生错误: {str(ve)}")
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        print(f"❌ 生成菜谱时发生错误: {str(e)}")
+        raise _server_error(e)
+
+
+async def _generate_recipe_chained(
+    user_description: str, use_cache: bool = True, deadline: Optional[Deadline] = None
+):
+    """两次调用：先解析需求，再生成菜谱"""
+    # 调用解析器，解析用户需求
+    print("🔍 正在解析您的需求...")
+    requirements = await parser.get().parse_requirements(user_description, deadline)
+    _print_requirements(requirements)
+
+    # 调用生成器，生成菜谱
+    print("👨‍🍳 正在生成菜谱...")
+    recipe_json = await generator.get().generate_recipe(
+        ingredients=requirements["ingredients"],
+        cuisine_type=requirements["cuisine_preference"],
+        difficulty=requirements["difficulty_preference"],
+        max_cook_time=requirements["max_cook_time_mins"],
+        dietary_requirements=requirements["dietary_requirements"],
+        calorie_preference=requirements["calorie_preference"],
+        serving_size=requirements["serving_size"],
+        use_cache=use_cache,
+        deadline=deadline,
+    )
+    return requirements, recipe_json
+
+
+async def _generate_recipe_fused(user_description: str, deadline: Optional[Deadline] = None):
+    """一次调用：同时返回需求和菜谱，需求部分仍按解析器的规则校验"""
+    print("👨‍🍳 正在解析需求并生成菜谱（融合模式）...")
+    result = await generator.get().generate_recipe_from_description(user_description, deadline)
+
+    # 与两次调用模式使用相同的校验和默认值，未识别出食材时抛出 ValueError
+    requirements = parser.get()._validate_and_complete_requirements(result["requirements"])
+    _print_requirements(requirements)
+
+    recipe_json = result["recipe"]
+    if not recipe_json:
+        raise Exception("融合模式未返回菜谱内容")
+    return requirements, recipe_json
+
+
+@app.post("/api/v1/recipes/generate-batch")
+async def generate_recipe_batch(request: RecipeBatchRequest):
+    """
+    批量生成菜谱，结果以 NDJSON 流式返回
+
+    每个条目可以是自然语言描述，也可以是已结构化的需求（跳过需求解析）。
+    最多同时生成 concurrency 个，每完成一个就输出一行：
+        {"index": 0, "id": ..., "status": "succeeded", "requirements": {...}, "recipe": {...}}
+        {"index": 1, "id": ..., "status": "failed", "status_code": 400, "error": "..."}
+    单个条目失败不影响其他条目，最后一行是汇总：
+        {"done": true, "total": 2, "succeeded": 1, "failed": 1, "elapsed_s": 3.2}
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items 不能为空")
+    if len(request.items) > RECIPE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多 {RECIPE_BATCH_MAX_ITEMS} 个条目，收到 {len(request.items)} 个",
+        )
+
+    items = [
+        RecipeBatchItem(description=item) if isinstance(item, str) else item
+        for item in request.items
+    ]
+    concurrency = max(
+        1, min(request.concurrency or RECIPE_BATCH_CONCURRENCY, RECIPE_BATCH_MAX_CONCURRENCY)
+    )
+    print(f"收到批量生成请求: {len(items)} 个条目，并发 {concurrency}")
+
+    return StreamingResponse(
+        _batch_stream(items, concurrency, request.use_cache),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _generate_batch_item(
+    item: RecipeBatchItem, use_cache: bool
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """生成单个条目，返回 (需求, 菜谱)"""
+    if item.requirements is not None:
+        # 与解析结果使用相同的校验和默认值，未提供食材时抛出 ValueError
+        requirements = parser.get()._validate_and_complete_requirements(item.requirements)
+        recipe_json = await generator.get().generate_recipe(
             ingredients=requirements["ingredients"],
             cuisine_type=requirements["cuisine_preference"],
             difficulty=requirements["difficulty_preference"],
@@ -130,38 +379,317 @@ async def generate_recipe(request: RecipeRequest):  # 👈 把模型作为类型
             dietary_requirements=requirements["dietary_requirements"],
             calorie_preference=requirements["calorie_preference"],
             serving_size=requirements["serving_size"],
+            use_cache=use_cache,
         )
-        print("🎉 菜谱生成完成！")
-        return recipe_json
+        return requirements, recipe_json
+
+    if not item.description or not item.description.strip():
+        raise ValueError("description 和 requirements 必须提供一个")
+    if RECIPE_PIPELINE_MODE == "fused":
+        return await _generate_recipe_fused(item.description)
+    return await _generate_recipe_chained(item.description, use_cache=use_cache)
+
+
+async def _batch_stream(
+    items: List[RecipeBatchItem], concurrency: int, use_cache: bool
+) -> AsyncIterator[str]:
+    """
+    固定数量的 worker 依次领取条目，完成一个就输出一行
+
+    不会一次性为所有条目创建任务；客户端断开时取消所有 worker。
+    """
+    results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    next_index = iter(range(len(items)))
+    start = time.perf_counter()
+
+    async def worker() -> None:
+        for index in next_index:
+            item = items[index]
+            line: Dict[str, Any] = {"index": index, "id": item.id}
+            try:
+                requirements, recipe_json = await _generate_batch_item(item, use_cache)
+                line.update(status="succeeded", requirements=requirements, recipe=recipe_json)
+            except ValueError as ve:
+                line.update(status="failed", status_code=400, error=str(ve))
+            except Exception as e:
+                line.update(status="failed", status_code=_error_status(e), error=str(e))
+            await results.put(line)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))]
+    succeeded = 0
+    try:
+        for _ in range(len(items)):
+            line = await results.get()
+            if line["status"] == "succeeded":
+                succeeded += 1
+            else:
+                print(f"❌ 批量生成第 {line['index']} 个条目失败: {line['error']}")
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        for task in workers:
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    print(f"🎉 批量生成完成！成功 {succeeded}/{len(items)}，耗时 {elapsed:.1f} 秒")
+    summary = {
+        "done": True,
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_s": round(elapsed, 3),
+    }
+    yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+
+@app.post("/api/v1/recipes/generate-stream")
+async def generate_recipe_stream(request: RecipeRequest):
+    """
+    流式生成菜谱的API端点（Server-Sent Events）
 
+    事件依次为：requirements、dish_name、description、每个 ingredient、
+    每个 instruction，最后是完整菜谱 recipe；出错时推送 error 事件。
+    """
+    user_description = request.description
+    print(f"收到了流式生成请求: {user_description}")
+
+    if RECIPE_PIPELINE_MODE == "fused":
+        if not user_description.strip():
+            raise HTTPException(status_code=400, detail="用户输入不能为空")
+        events = _stream_recipe_fused(user_description)
+    else:
+        # 两次调用模式下先完成解析，这样需求错误仍然可以返回 HTTP 400
+        try:
+            print("🔍 正在解析您的需求...")
+            requirements = await parser.get().parse_requirements(user_description)
+            _print_requirements(requirements)
+        except ValueError as ve:
+            print(f"❌ 解析用户需求时发生错误: {str(ve)}")
+            raise HTTPException(status_code=400, detail=str(ve))
+        except Exception as e:
+            print(f"❌ 解析用户需求时发生错误: {str(e)}")
+            raise _server_error(e)
+        events = _stream_recipe_chained(requirements, use_cache=request.use_cache)
+
+    return StreamingResponse(
+        _sse_stream(_with_recipe_session(events, user_description)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_recipe_chained(
+    requirements: Dict[str, Any], use_cache: bool = True
+) -> AsyncIterator[Tuple[str, Any]]:
+    yield "requirements", requirements
+
+    print("👨‍🍳 正在流式生成菜谱...")
+    async for event in generator.get().stream_recipe(
+        ingredients=requirements["ingredients"],
+        cuisine_type=requirements["cuisine_preference"],
+        difficulty=requirements["difficulty_preference"],
+        max_cook_time=requirements["max_cook_time_mins"],
+        dietary_requirements=requirements["dietary_requirements"],
+        calorie_preference=requirements["calorie_preference"],
+        serving_size=requirements["serving_size"],
+        use_cache=use_cache,
+    ):
+        yield event
+
+
+async def _stream_recipe_fused(user_description: str) -> AsyncIterator[Tuple[str, Any]]:
+    print("👨‍🍳 正在流式解析需求并生成菜谱（融合模式）...")
+    async for event, value in generator.get().stream_recipe_from_description(user_description):
+        if event == "requirements":
+            value = parser.get()._validate_and_complete_requirements(value)
+            _print_requirements(value)
+        yield event, value
+
+
+async def _with_recipe_session(
+    events: AsyncIterator[Tuple[str, Any]], user_description: str
+) -> AsyncIterator[Tuple[str, Any]]:
+    """最后的 recipe 事件保存为新会话的第一个版本，事件中带上 recipe_id 和 version"""
+    async for event, value in events:
+        if event == "recipe":
+            value = _save_recipe_version(value, [{"role": "user", "content": user_description}])
+        yield event, value
+
+
+async def _sse_stream(events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """把菜谱事件编码为SSE格式，流中的错误以 error 事件推送"""
+    try:
+        async for event, value in events:
+            yield _sse_event(event, value)
+        print("🎉 菜谱流式生成完成！")
     except ValueError as ve:
         print(f"❌ 解析用户需求时发生错误: {str(ve)}")
-        raise HTTPException(status_code=400, detail=str(ve))
+        yield _sse_event("error", {"status_code": 400, "detail": str(ve)})
     except Exception as e:
-        print(f"❌ 生成菜谱时发生错误: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        print(f"❌ 流式生成菜谱时发生错误: {str(e)}")
+        yield _sse_event("error", {"status_code": _error_status(e), "detail": str(e)})
+
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _print_requirements(requirements: Dict[str, Any]) -> None:
+    print("✅ 解析完成！识别到：")
+    print(f"   🥘 食材: {', '.join(requirements['ingredients'])}")
+    print(f"   🕐 最大烹饪时间: {requirements['max_cook_time_mins']}分钟")
+    print(f"   🍽️ 菜系: {requirements['cuisine_preference']}")
+    print(f"   ⚡ 难度: {requirements['difficulty_preference']}")
+    print(f"   🥗 饮食要求: {', '.join(requirements['dietary_requirements'])}")
+    print(f"   🔥 热量偏好: {requirements['calorie_preference']}")
+    print(f"   👥 份数: {requirements['serving_size']}人份")
 
 
 @app.post("/api/v1/recipes/generate-image")
-async def generate_recipe_image(request: RecipeImageRequest):
+async def generate_recipe_image(request: RecipeImageRequest, http_request: Request):
     """
     为已有菜谱生成菜品图片的API端点
     """
-    recipe_json = request.recipe_json
+    recipe_json = _image_request_recipe(request)
     print(f"收到了图片生成请求，菜谱: {recipe_json.get('dish_name', '未知')}")
 
     try:
-        # 调用图片生成器，生成菜品图片
-        image_url = image_generator.generate_recipe_image(recipe_json)
+        # 通过任务队列生成菜品图片，相同Prompt的并发请求只调用一次上游
+        job = image_jobs.get().submit(recipe_json)
+        await job.done.wait()
+        if job.error_status is not None:
+            # 上游限流等错误，按对应的状态码返回（带 Retry-After）
+            headers = {"Retry-After": str(math.ceil(job.retry_after))} if job.retry_after else None
+            raise HTTPException(status_code=job.error_status, detail=job.error, headers=headers)
+        image_url = _absolute_url(http_request, job.image_url)
         print(f"🎉 菜品图片生成完成！URL: {image_url}")
 
         # 返回包含 image_url 的对象
         return {"image_url": image_url}
+    except asyncio.QueueFull:
+        print("❌ 图片生成任务队列已满")
+        raise HTTPException(status_code=503, detail="图片生成任务过多，请稍后再试")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ 生成菜品图片时发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/recipes/generate-image/jobs", status_code=202)
+async def submit_recipe_image_job(request: RecipeImageRequest, http_request: Request):
+    """
+    提交图片生成任务，立即返回任务ID
+
+    之后可以轮询 GET /api/v1/recipes/generate-image/jobs/{job_id}，
+    或订阅 GET /api/v1/recipes/generate-image/jobs/{job_id}/events (SSE)
+    """
+    recipe_json = _image_request_recipe(request)
+    print(f"收到了图片生成任务，菜谱: {recipe_json.get('dish_name', '未知')}")
+
+    try:
+        job = image_jobs.get().submit(recipe_json)
+    except asyncio.QueueFull:
+        print("❌ 图片生成任务队列已满")
+        raise HTTPException(status_code=503, detail="图片生成任务过多，请稍后再试")
+    except Exception as e:
+        print(f"❌ 提交图片生成任务时发生错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    print(f"📥 图片生成任务已提交: {job.job_id}")
+    return _job_response(http_request, job)
+
+
+@app.get("/api/v1/recipes/generate-image/jobs/{job_id}")
+async def get_recipe_image_job(job_id: str, http_request: Request):
+    """
+    查询图片生成任务的状态
+    """
+    job = _find_image_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return _job_response(http_request, job)
+
+
+@app.get("/api/v1/recipes/generate-image/jobs/{job_id}/events")
+async def stream_recipe_image_job(job_id: str, http_request: Request):
+    """
+    订阅图片生成任务的状态（Server-Sent Events），任务完成后推送 completed 事件并结束
+    """
+    job = _find_image_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+
+    from image_jobs import wait_for_job
+
+    async def events() -> AsyncIterator[str]:
+        current = job
+        yield _sse_event("status", _job_response(http_request, current))
+        while not current.finished:
+            current = await wait_for_job(current, image_job_store.get(), timeout=15)
+            if not current.finished:
+                # 保持连接，避免被代理断开
+                yield ": keepalive\n\n"
+        yield _sse_event("completed", _job_response(http_request, current))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/v1/images/{filename}")
+async def get_stored_image(filename: str):
+    """
+    返回本地图片存储中的菜品图片（文件名即内容地址，可以长期缓存）
+    """
+    store = image_store.get()
+    path = store.path_for(filename) if store else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="图片不存在或已过期")
+    return FileResponse(
+        path, headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+def _image_request_recipe(request: RecipeImageRequest) -> Dict[str, Any]:
+    if request.recipe_id:
+        return _load_recipe_version(request.recipe_id, request.version)["recipe"]
+    if request.recipe_json is None:
+        raise HTTPException(status_code=400, detail="recipe_json 和 recipe_id 必须提供一个")
+    return strip_session_fields(request.recipe_json)
+
+
+def _find_image_job(job_id: str):
+    """
+    先查本进程的任务队列，再查共享存储（任务可能由其他 worker 创建）
+
+    这个 worker 上还没有提交过任务时不创建任务队列，避免只为查询导入 dashscope
+    """
+    queue = image_jobs.peek()
+    if queue is not None:
+        return queue.get(job_id)
+    store = image_job_store.get()
+    if store is None:
+        return None
+    from image_jobs import load_job
+
+    return load_job(store, job_id)
+
+
+def _job_response(http_request: Request, job) -> Dict[str, Any]:
+    result = job.to_dict()
+    result["image_url"] = _absolute_url(http_request, result["image_url"])
+    return result
+
+
+def _absolute_url(http_request: Request, url: str | None) -> str | None:
+    """本地图片存储返回的是相对路径，补全为当前服务的绝对URL"""
+    if url and url.startswith("/"):
+        return str(http_request.base_url).rstrip("/") + url
+    return url
+
+
 @app.post("/api/v1/ingredients/analyze")
 async def analyze_ingredients_from_image(file: UploadFile = File(...)):
     """
@@ -169,16 +697,26 @@ async def analyze_ingredients_from_image(file: UploadFile = File(...)):
     """
     print(f"收到图片分析请求，文件名: {file.filename}")
     print(f"文件类型: {file.content_type}")
-    print(f"文件大小: {file.size if hasattr(file, 'size') else '未知'} bytes")
+    print(f"文件大小: {file.size if file.size is not None else '未知'} bytes")
 
-    try:
-        # 读取上传的图片文件
-        image_data = await file.read()
-        image_file = io.BytesIO(image_data)
-        image_file.name = file.filename  # 设置文件名，供分析器使用
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"上传文件过大，最大允许 {MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+        )
 
+    try:
+        # 直接把上传的临时文件交给分析器（大文件已落盘），不再整体读入内存
         print("🔍 正在分析图片中的食材...")
-        result = ingredient_analyzer.analyze_image_for_ingredients(image_file)
+        try:
+            result = await ingredient_analyzer.get().analyze_image_for_ingredients(file.file)
+        except ValueError as e:
+            # 分析器已经导入了 image_preprocess，这里再导入不会增加启动时间
+            from image_preprocess import ImageTooLargeError
+
+            if not isinstance(e, ImageTooLargeError):
+                raise
+            raise HTTPException(status_code=413, detail=str(e))
 
         if result["success"]:
             ingredients = result["ingredients"]
@@ -187,6 +725,7 @@ async def analyze_ingredients_from_image(file: UploadFile = File(...)):
                 "success": True,
                 "ingredients": ingredients,
                 "confidence": result.get("confidence", "unknown"),
+                "cached": result.get("cached", False),
             }
         else:
             print(f"❌ 图片分析失败: {result.get('error', '未知错误')}")
@@ -196,6 +735,8 @@ async def analyze_ingredients_from_image(file: UploadFile = File(...)):
                 "ingredients": [],
             }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ 处理图片时发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -206,9 +747,24 @@ async def optimize_recipe(request: RecipeOptimizeRequest):
     """
     优化现有菜谱的API端点
     """
-    current_recipe = request.current_recipe
     user_request = request.user_request
-    conversation_history = request.conversation_history
+    if request.recipe_id:
+        # 使用服务端保存的菜谱和对话历史，新版本记在同一个会话下
+        saved = _load_recipe_version(request.recipe_id, request.version)
+        current_recipe = saved["recipe"]
+        conversation_history = (
+            request.conversation_history
+            if request.conversation_history is not None
+            else saved["history"]
+        )
+        recipe_id, parent_version, new_messages = request.recipe_id, saved["version"], []
+    elif request.current_recipe is not None:
+        # 没有 recipe_id（或者会话已过期）时上传完整菜谱，优化结果保存为新会话
+        current_recipe = strip_session_fields(request.current_recipe)
+        conversation_history = request.conversation_history or []
+        recipe_id, parent_version, new_messages = None, None, list(conversation_history)
+    else:
+        raise HTTPException(status_code=400, detail="current_recipe 和 recipe_id 必须提供一个")
 
     print("收到菜谱优化请求:")
     print(f"  当前菜谱: {current_recipe.get('dish_name', '未知')}")
@@ -217,7 +773,7 @@ async def optimize_recipe(request: RecipeOptimizeRequest):
 
     try:
         print("🔧 正在优化菜谱...")
-        result = recipe_optimizer.optimize_recipe(
+        result = await recipe_optimizer.get().optimize_recipe(
             current_recipe=current_recipe,
             user_request=user_request,
             conversation_history=conversation_history,
@@ -232,14 +788,66 @@ async def optimize_recipe(request: RecipeOptimizeRequest):
             }
 
         print(f"✅ 菜谱优化完成！新菜品: {result.get('dish_name', '未知')}")
-        return result
+        new_messages += [
+            {"role": "user", "content": user_request},
+            {"role": "assistant", "content": OPTIMIZE_REPLY.format(request=user_request)},
+        ]
+        return _save_recipe_version(result, new_messages, recipe_id, parent_version)
 
     except ValueError as ve:
         print(f"❌ 优化菜谱时发生参数错误: {str(ve)}")
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         print(f"❌ 优化菜谱时发生错误: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _server_error(e)
+
+
+@app.get("/api/v1/recipes/sessions/{recipe_id}")
+async def get_recipe_session(recipe_id: str, version: Optional[int] = None):
+    """
+    返回服务端保存的菜谱（默认最新版本）、对话历史和所有保留的版本
+    """
+    saved = _load_recipe_version(recipe_id, version)
+    return {
+        "recipe_id": recipe_id,
+        "version": saved["version"],
+        "latest_version": saved["latest_version"],
+        "recipe": {**saved["recipe"], "recipe_id": recipe_id, "version": saved["version"]},
+        "history": saved["history"],
+        "versions": recipe_sessions.get().versions(recipe_id) or [],
+    }
+
+
+def _save_recipe_version(
+    recipe_json: Dict[str, Any],
+    messages: List[Dict[str, Any]],
+    recipe_id: Optional[str] = None,
+    parent_version: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    保存菜谱的新版本，返回带 recipe_id 和 version 的菜谱
+
+    会话存储关闭或保存失败时原样返回菜谱，客户端继续上传完整菜谱。
+    """
+    store = recipe_sessions.get()
+    if store is None:
+        return recipe_json
+    try:
+        ids = store.save(recipe_json, messages, recipe_id, parent_version)
+    except Exception as e:
+        print(f"⚠️ 保存菜谱版本失败: {e}")
+        return recipe_json
+    return {**recipe_json, **ids}
+
+
+def _load_recipe_version(recipe_id: str, version: Optional[int]) -> Dict[str, Any]:
+    store = recipe_sessions.get()
+    saved = store.get(recipe_id, version) if store else None
+    if saved is None:
+        raise HTTPException(
+            status_code=404, detail="菜谱不存在或已过期，请上传完整菜谱"
+        )
+    return saved
 
 
 @app.post("/api/v1/intent/analyze")
@@ -252,60 +860,57 @@ async def analyze_intent(request: IntentAnalysisRequest):
 
     try:
         print("🔍 正在分析用户意图...")
-        is_recipe_request = await _analyze_recipe_intent(message)
+        result = await intent_classifier.get().classify(message)
 
-        print(f"✅ 意图分析完成！是否为菜谱需求: {is_recipe_request}")
-        return {"is_recipe_request": is_recipe_request, "message": message}
+        print(
+            f"✅ 意图分析完成！是否为菜谱需求: {result['is_recipe_request']} "
+            f"（{' -> '.join(result['decision_path'])}，置信度 {result['confidence']}）"
+        )
+        return {
+            "is_recipe_request": result["is_recipe_request"],
+            "message": message,
+            "decision_path": result["decision_path"],
+            "confidence": result["confidence"],
+        }
 
     except Exception as e:
         print(f"❌ 意图分析时发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def _analyze_recipe_intent(message: str) -> bool:
+@app.get("/metrics")
+async def get_metrics():
     """
-    使用 LLM 分析用户意图是否为菜谱生成需求
+    Prometheus 格式的指标：各端点的请求数和耗时、各阶段耗时和错误数、上游 token 用量
     """
-    from openai import OpenAI
-    import os
-
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    system_prompt = """
-你是一个专门的意图识别助手。你的任务是判断用户的消息是否表达了"想要生成菜谱"的意图。
-
-菜谱生成意图包括：
-1. 明确表达想要做菜、烹饪的需求（如"我想做菜"、"帮我做个菜"）
-2. 提到食材并想要制作食物（如"我有土豆和牛肉，想做点什么"）
-3. 描述菜系、口味、时间等烹饪需求（如"想要一道简单的中式菜"、"半小时内完成的菜"）
-4. 询问特定食材的做法（如"土豆怎么做好吃"）
-5. 表达对特定菜品的制作需求（如"我想学做宫保鸡丁"）
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
-非菜谱生成意图包括：
-1. 一般性问候（如"你好"、"天气怎么样"）
-2. 询问其他信息（如"你是谁"、"你能做什么"）
-3. 与烹饪无关的话题（如"今天股市如何"、"推荐个电影"）
 
-请只回答 "是" 或 "否"，不要有其他内容。
-"""
-
-    user_prompt = f'用户消息："{message}"\n\n这个消息是否表达了菜谱生成的意图？'
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.1,
-            max_completion_tokens=10,
-        )
-
-        result = response.choices[0].message.content.strip()
-        return result == "是"
-
-    except Exception as e:
-        print(f"LLM 意图分析失败: {str(e)}")
-        # 如果 LLM 调用失败，返回 False，让前端使用关键词兜底
-        return False
+@app.get("/api/v1/stats")
+async def get_stats():
+    """
+    运行统计信息（缓存命中率等）
+    """
+    # 只统计已经创建的组件，查询统计信息不会触发组件创建
+    queue = image_jobs.peek()
+    store = image_store.peek()
+    classifier = intent_classifier.peek()
+    requirements_parser = parser.peek()
+    optimizer = recipe_optimizer.peek()
+    sessions = recipe_sessions.peek()
+    return {
+        "components": component_stats(),
+        "caches": cache_stats(),
+        "single_flight": single_flight_stats(),
+        "http_pool": http_pool_stats(),
+        "upstream": upstream_stats(),
+        "admission": admission_stats(),
+        "image_jobs": queue.stats() if queue else None,
+        "image_store": store.stats() if store else None,
+        "intent": classifier.stats() if classifier else None,
+        "parser": requirements_parser.stats() if requirements_parser else None,
+        "optimizer": optimizer.stats() if optimizer else None,
+        "recipe_sessions": sessions.stats() if sessions else None,
+    }
@@ -0,0 +1,307 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 延迟直方图的桶边界（秒），覆盖本地处理（毫秒级）到 LLM 调用（数十秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """带标签的瞬时值"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """带标签的直方图（累计桶 + sum + count）"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Tuple[str, ...],
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # 标签 -> [每个桶的计数..., +Inf 计数, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = _format_value(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(names, labels + (le,))} {count}")
+                count = series[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+HTTP_REQUESTS = Counter(
+    "recipe_agent_http_requests_total", "HTTP 请求数", ("method", "endpoint", "status")
+)
+HTTP_DURATION = Histogram(
+    "recipe_agent_http_request_duration_seconds",
+    "HTTP 请求耗时（到响应结束）",
+    ("method", "endpoint"),
+)
+STAGE_DURATION = Histogram(
+    "recipe_agent_stage_duration_seconds", "各处理阶段耗时", ("component", "stage")
+)
+STAGE_ERRORS = Counter(
+    "recipe_agent_stage_errors_total", "各处理阶段抛出异常的次数", ("component", "stage")
+)
+UPSTREAM_TOKENS = Counter(
+    "recipe_agent_upstream_tokens_total", "上游 LLM 消耗的 token 数", ("component", "type")
+)
+UPSTREAM_ATTEMPTS = Counter(
+    "recipe_agent_upstream_attempts_total",
+    "上游 LLM 调用的尝试次数（包括重试和对冲），outcome 为 success/error/timeout/rejected/rate_limited/hedge",
+    ("component", "outcome"),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "recipe_agent_admission_queue_depth", "等待调用上游的排队数", ("provider",)
+)
+ADMISSION_WAIT = Histogram(
+    "recipe_agent_admission_wait_seconds",
+    "调用上游前在限流队列中的等待时间（不排队直接放行记为 0）",
+    ("provider", "component"),
+)
+ADMISSION_SHED = Counter(
+    "recipe_agent_admission_shed_total",
+    "被限流拒绝的上游调用数，reason 为 queue_full/evicted/wait_timeout",
+    ("provider", "component", "reason"),
+)
+
+_METRICS = [
+    HTTP_REQUESTS,
+    HTTP_DURATION,
+    STAGE_DURATION,
+    STAGE_ERRORS,
+    UPSTREAM_TOKENS,
+    UPSTREAM_ATTEMPTS,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_WAIT,
+    ADMISSION_SHED,
+]
+
+
+class RequestTrace:
+    """一次请求中各阶段的耗时，用于生成 Server-Timing 响应头"""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []  # (阶段, 毫秒)
+        self.closed = False  # 请求结束后不再记录（后台任务可能继承了请求的上下文）
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, duration_ms: float) -> None:
+        with self._lock:
+            if not self.closed:
+                self.spans.append((stage, duration_ms))
+
+    def server_timing(self, total_ms: Optional[float] = None) -> str:
+        """同名阶段（例如批量生成中的多次 generate）合并为总耗时"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for stage, duration_ms in self.spans:
+                totals[stage] = totals.get(stage, 0.0) + duration_ms
+        entries = [f"{stage};dur={duration_ms:.1f}" for stage, duration_ms in totals.items()]
+        if total_ms is not None:
+            entries.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: "contextvars.ContextVar[Optional[RequestTrace]]" = contextvars.ContextVar(
+    "recipe_agent_trace", default=None
+)
+
+
+@contextmanager
+def span(component: str, stage: str) -> Iterator[None]:
+    """
+    记录一个处理阶段的耗时
+
+    耗时写入阶段直方图，并追加到当前请求的 Server-Timing；阶段抛出异常时计入错误数。
+    可以在协程中使用，也可以在 asyncio.to_thread 的线程中使用（上下文会被复制过去）。
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(component, stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, component, stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, duration * 1000)
+
+
+def record_usage(component: str, usage: Any) -> None:
+    """
+    记录 OpenAI 响应中的 token 用量（usage 为空时忽略）
+
+    cached 是 prompt 中命中上游提示词缓存的部分（prompt_tokens_details.cached_tokens），
+    包含在 prompt 之内；cached / prompt 即提示词缓存的命中率。
+    """
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    UPSTREAM_TOKENS.inc(component, "prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+    UPSTREAM_TOKENS.inc(component, "cached", amount=getattr(details, "cached_tokens", 0) or 0)
+    UPSTREAM_TOKENS.inc(component, "completion", amount=getattr(usage, "completion_tokens", 0) or 0)
+
+
+def record_upstream_attempt(component: str, outcome: str) -> None:
+    """记录一次上游调用尝试的结果（见 resilience.py）"""
+    UPSTREAM_ATTEMPTS.inc(component, outcome)
+
+
+def record_admission_queue_depth(provider: str, depth: int) -> None:
+    """记录当前等待调用上游的排队数（见 admission.py）"""
+    ADMISSION_QUEUE_DEPTH.set(depth, provider)
+
+
+def record_admission_wait(provider: str, component: str, wait_s: float) -> None:
+    """记录一次上游调用放行前的排队时间"""
+    ADMISSION_WAIT.observe(wait_s, provider, component)
+
+
+def record_admission_shed(provider: str, component: str, reason: str) -> None:
+    """记录一次被限流拒绝的上游调用"""
+    ADMISSION_SHED.inc(provider, component, reason)
+
+
+def render_prometheus() -> str:
+    """Prometheus 文本格式（0.0.4）的全部指标"""
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的耗时和状态码，并添加 Server-Timing 响应头
+
+    endpoint 标签使用路由模板（例如 /api/v1/recipes/generate-image/jobs/{job_id}），
+    未匹配任何路由的请求记为 "unmatched"，避免标签数量无限增长。
+    流式响应的响应头在生成开始前发出，Server-Timing 只包含此前完成的阶段。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing(total_ms).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            trace.closed = True
+            _current_trace.reset(token)
+            endpoint = _endpoint_label(scope)
+            method = scope.get("method", "")
+            HTTP_DURATION.observe(time.perf_counter() - start, method, endpoint)
+            HTTP_REQUESTS.inc(method, endpoint, str(status))
+
+
+def _endpoint_label(scope) -> str:
+    """路由模板；/docs 等非 API 路由没有模板，使用实际路径"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if "endpoint" in scope:
+        return scope["path"]
+    return "unmatched"
@@ -1,29 +1,83 @@
-from openai import OpenAI
 from typing import Dict, Any, Optional
 import json
 import os
 
+from cache import Cache, normalize_text
+from deadline import Deadline
+from http_pool import create_openai_client
+from local_parser import parse_requirements_locally
+from metrics import record_usage, span
+from resilience import UpstreamError, UpstreamTimeoutError, get_upstream_policy
+from single_flight import SingleFlight
+
+# 提取规则和JSON结构都放在系统提示词中，每次请求逐字节相同（上游可以缓存这段前缀），
+# 用户消息只包含用户描述
+SYSTEM_PROMPT = """你是一个专业的菜谱需求分析助手，擅长从用户的自然语言描述中提取结构化的菜谱需求信息。请严格按照要求的JSON格式返回结果。
+
+请分析用户消息中的菜谱需求描述，并提取出结构化的信息，以JSON格式返回：
+
+{
+    "ingredients": ["从描述中提取的所有食材名称"],
+    "max_cook_time_mins": 30,  // 最大烹饪时间（分钟），如果没有明确提到则设为null
+    "dietary_requirements": ["饮食要求，如'不辣'、'素食'、'低盐'等"],
+    "cuisine_preference": "中式",  // 菜系偏好，如果没有提到则设为null
+    "difficulty_preference": "简单",  // 难度偏好，如果没有提到则设为null
+    "calorie_preference": "低热量",  // 热量偏好，如'低热量'、'高蛋白'等，如果没有提到则设为null
+    "serving_size": 2  // 份数，如果没有提到则设为2
+}
+
+提取规则：
+1. 仔细识别所有食材名称，包括蔬菜、肉类、调料等
+2. 识别时间相关词汇：半小时=30分钟，一小时=60分钟，快手菜=15-30分钟等
+3. 识别饮食限制：不辣、素食、低盐、无糖等
+4. 识别菜系偏好：中式、西式、日式、韩式等
+5. 识别难度偏好：简单、快手、复杂等
+6. 识别热量偏好：低热量、高蛋白、减肥餐等
+7. 如果某个信息在描述中没有明确提到，则设为null
+
+请只返回JSON格式，不要包含其他文字。
+"""
+
 
 class RecipeRequirementsParser:
     """自然语言需求解析器，将用户的自然语言描述转换为结构化需求"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[Cache] = None,
+        single_flight: Optional[SingleFlight] = None,
+    ):
         """
         初始化解析器
         
         Args:
             api_key: OpenAI API密钥，如果不提供则从环境变量OPENAI_API_KEY获取
+            cache: 需求缓存（可选），以规范化后的用户输入为键
+            single_flight: 请求合并层（可选），规范化后相同的并发输入只调用一次上游
         """
-        self.client = OpenAI(
-            api_key=api_key or os.getenv('OPENAI_API_KEY')
-        )
+        self.client = create_openai_client(api_key or os.getenv('OPENAI_API_KEY'))
+        self.upstream = get_upstream_policy("parser")
+        self.cache = cache
+        self.single_flight = single_flight
+        # 剩余时间少于这么多秒时不调用 LLM，直接本地解析
+        self.local_parse_below_s = float(os.getenv("DEADLINE_LOCAL_PARSE_S", "15"))
+        # LLM 解析最多用到截止时间前这么多秒，留给后面的菜谱生成
+        self.generate_reserve_s = float(os.getenv("DEADLINE_GENERATE_RESERVE_S", "10"))
+        # 本地规则解析的置信度达到这个值时直接采用，不调用 LLM（大于 1 时全部交给 LLM）
+        self.local_threshold = float(os.getenv("PARSER_LOCAL_THRESHOLD", "0.9"))
+        self.decisions = {"local": 0, "llm": 0, "local_fallback": 0}
     
-    def parse_requirements(self, user_input: str) -> Dict[str, Any]:
+    async def parse_requirements(
+        self, user_input: str, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
         """
-        解析用户的自然语言需求
+        解析用户的自然语言需求：本地规则解析的置信度不低于 local_threshold 时直接采用，否则调用 LLM
         
         Args:
             user_input: 用户的自然语言描述，如"我冰箱里有牛肉和洋葱，想做个半小时内搞定的快手菜，别太辣"
+            deadline: 请求的截止时间（可选）。剩余时间不够、或 LLM 解析超时和上游不可用时，
+                改为本地规则解析，并在 deadline 中记录降级 local_parse
             
         Returns:
             结构化的需求字典，包含：
@@ -41,69 +95,123 @@ class RecipeRequirementsParser:
         if not user_input.strip():
             raise ValueError("用户输入不能为空")
         
+        # 措辞相同、仅空白或标点不同的输入共用一次解析结果
+        cache_key = normalize_text(user_input)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        with span("parser", "parse_local"):
+            local = parse_requirements_locally(user_input)
+        if local["confidence"] >= self.local_threshold:
+            self.decisions["local"] += 1
+            return self._validate_and_complete_requirements(local["requirements"])
+        
+        if deadline is None:
+            requirements = await self._request_or_join(user_input, cache_key)
+            self.decisions["llm"] += 1
+            return requirements
+        
+        if deadline.remaining() < self.local_parse_below_s:
+            try:
+                requirements = self._validate_and_complete_requirements(local["requirements"])
+            except ValueError:
+                # 是时间不够才没有调用 LLM，不是用户的输入有问题
+                raise UpstreamTimeoutError(
+                    f"剩余 {deadline.remaining():.1f} 秒，来不及调用 LLM 解析需求，本地也未能识别出食材"
+                )
+            deadline.degrade("local_parse")
+            self.decisions["local_fallback"] += 1
+            return requirements
+        try:
+            requirements = await self._request_or_join(
+                user_input, cache_key, deadline.remaining() - self.generate_reserve_s
+            )
+            self.decisions["llm"] += 1
+            return requirements
+        except UpstreamError as e:
+            try:
+                requirements = self._validate_and_complete_requirements(local["requirements"])
+            except ValueError:
+                # 本地也解析不出食材时，报告的应该是上游的问题
+                raise e
+            print(f"⚠️ LLM 解析需求失败，改为本地解析: {e}")
+            deadline.degrade("local_parse")
+            self.decisions["local_fallback"] += 1
+            return requirements
+    
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.decisions.values())
+        return {
+            "local_threshold": self.local_threshold,
+            "decisions": dict(self.decisions),
+            "local_rate": self.decisions["local"] / total if total else 0.0,
+        }
+    
+    async def _request_or_join(
+        self, user_input: str, cache_key: str, budget_s: Optional[float] = None
+    ) -> Dict[str, Any]:
+        if self.single_flight is not None:
+            return await self.single_flight.do(
+                cache_key,
+                lambda: self._request_requirements(user_input, cache_key, budget_s),
+                budget_s=budget_s,
+            )
+        return await self._request_requirements(user_input, cache_key, budget_s)
+    
+    async def _request_requirements(
+        self, user_input: str, cache_key: str, budget_s: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """调用上游解析需求，并写入缓存"""
         # 构建解析提示词
         prompt = self._build_parse_prompt(user_input)
         
         try:
             # 调用OpenAI API进行解析
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的菜谱需求分析助手，擅长从用户的自然语言描述中提取结构化的菜谱需求信息。请严格按照要求的JSON格式返回结果。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,  # 降低温度以获得更一致的结果
-                max_completion_tokens=800,
-                response_format={"type": "json_object"}
-            )
+            with span("parser", "parse"):
+                response = await self.upstream.call(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": SYSTEM_PROMPT
+                            },
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        temperature=0.3,  # 降低温度以获得更一致的结果
+                        max_completion_tokens=800,
+                        response_format={"type": "json_object"}
+                    ),
+                    budget_s=budget_s,
+                )
+            record_usage("parser", response.usage)
             
-            # 解析响应
-            requirements_text = response.choices[0].message.content.strip()
-            requirements = json.loads(requirements_text)
+            with span("parser", "parse_decode"):
+                # 解析响应
+                requirements_text = response.choices[0].message.content.strip()
+                requirements = json.loads(requirements_text)
+                
+                # 验证和补充默认值
+                validated = self._validate_and_complete_requirements(requirements)
             
-            # 验证和补充默认值
-            return self._validate_and_complete_requirements(requirements)
+            if self.cache is not None:
+                self.cache.set(cache_key, validated)
+            return validated
             
+        except (ValueError, UpstreamError):
+            # 校验错误（如未识别出食材）属于用户输入问题，上游超时或熔断需要返回对应的状态码，都原样抛出
+            raise
         except Exception as e:
             raise Exception(f"解析用户需求时发生错误: {str(e)}")
     
     def _build_parse_prompt(self, user_input: str) -> str:
-        """构建解析提示词"""
-        prompt = f"""
-请分析以下用户的菜谱需求描述，并提取出结构化的信息：
-
-用户描述："{user_input}"
-
-请从描述中提取以下信息，并以JSON格式返回：
-
-{{
-    "ingredients": ["从描述中提取的所有食材名称"],
-    "max_cook_time_mins": 30,  // 最大烹饪时间（分钟），如果没有明确提到则设为null
-    "dietary_requirements": ["饮食要求，如'不辣'、'素食'、'低盐'等"],
-    "cuisine_preference": "中式",  // 菜系偏好，如果没有提到则设为null
-    "difficulty_preference": "简单",  // 难度偏好，如果没有提到则设为null
-    "calorie_preference": "低热量",  // 热量偏好，如'低热量'、'高蛋白'等，如果没有提到则设为null
-    "serving_size": 2  // 份数，如果没有提到则设为2
-}}
-
-提取规则：
-1. 仔细识别所有食材名称，包括蔬菜、肉类、调料等
-2. 识别时间相关词汇：半小时=30分钟，一小时=60分钟，快手菜=15-30分钟等
-3. 识别饮食限制：不辣、素食、低盐、无糖等
-4. 识别菜系偏好：中式、西式、日式、韩式等
-5. 识别难度偏好：简单、快手、复杂等
-6. 识别热量偏好：低热量、高蛋白、减肥餐等
-7. 如果某个信息在描述中没有明确提到，则设为null
-
-请只返回JSON格式，不要包含其他文字。
-"""
-        return prompt
+        """构建解析提示词（用户消息），提取规则在 SYSTEM_PROMPT 中"""
+        return f'用户描述："{user_input}"'
     
     def _validate_and_complete_requirements(self, requirements: Dict[str, Any]) -> Dict[str, Any]:
         """验证和补充需求信息"""
@@ -1,39 +1,18 @@
-from openai import OpenAI
 from typing import Dict, Any, Optional
+import hashlib
 import json
 import os
 
+from cache import normalize_text
+from conversation_summary import ConversationSummarizer
+from http_pool import create_openai_client
+from metrics import record_usage, span
+from recipe_patch import RecipePatchError, apply_recipe_patch
+from resilience import UpstreamError, get_upstream_policy
+from single_flight import SingleFlight
 
-class RecipeOptimizer:
-    def __init__(self, api_key: Optional[str] = None):
-        """
-        初始化RecipeOptimizer
-
-        Args:
-            api_key: OpenAI API密钥，如果不提供则从环境变量OPENAI_API_KEY获取
-        """
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
-
-    def optimize_recipe(
-        self,
-        current_recipe: Dict[str, Any],
-        user_request: str,
-        conversation_history: list = None,
-    ) -> Dict[str, Any]:
-        """
-        基于用户的具体需求优化现有菜谱
-
-        Args:
-            current_recipe: 当前的菜谱JSON
-            user_request: 用户的优化需求
-            conversation_history: 对话历史（可选）
-
-        Returns:
-            优化后的菜谱JSON
-        """
-
-        # System Prompt: 定义菜谱优化专家的角色
-        system_prompt = """
+# System Prompt: 定义菜谱优化专家的角色，{output_rule} 为两种模式各自的返回格式要求
+SYSTEM_PROMPT_TEMPLATE = """
 你是一位经验丰富的菜谱优化专家和烹饪顾问。你的任务是根据用户的具体需求，对现有菜谱进行精准的优化和改进。
 
 核心能力：
@@ -49,84 +28,13 @@ class RecipeOptimizer:
 
 重要规则：
 - 如果用户的请求与菜谱优化无关，返回一个特殊的JSON格式表示需要提醒用户
-- 对于菜谱相关请求，必须严格按照完整菜谱JSON格式返回结果
+- {output_rule}
 - JSON的"键"必须是全英文小写蛇形命名法(snake_case)
 - JSON的"值"（菜品名称、描述、步骤等）必须使用简体中文
 - 优化要有针对性，确实体现用户的具体需求
 """
 
-        # 构建优化任务的具体提示词
-        user_prompt = self._build_optimize_prompt(
-            current_recipe, user_request, conversation_history
-        )
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.8,  # 稍微提高创造性
-                max_completion_tokens=1500,
-                response_format={"type": "json_object"},
-            )
-
-            recipe_text = response.choices[0].message.content.strip()
-            return json.loads(recipe_text)
-
-        except Exception as e:
-            raise Exception(f"优化菜谱时发生错误: {str(e)}")
-
-    def _build_optimize_prompt(
-        self,
-        current_recipe: Dict[str, Any],
-        user_request: str,
-        conversation_history: list = None,
-    ) -> str:
-        """构建菜谱优化的提示词"""
-
-        # 提取当前菜谱的关键信息
-        dish_name = current_recipe.get("dish_name", "未知菜品")
-        ingredients = current_recipe.get("ingredients", [])
-        instructions = current_recipe.get("instructions", [])
-
-        ingredients_str = "、".join(
-            [f"{ing['name']}({ing['amount']}{ing['unit']})" for ing in ingredients]
-        )
-        steps_str = "\n".join(
-            [f"{step['step']}. {step['description']}" for step in instructions]
-        )
-
-        # 构建对话上下文（如果有）
-        context_str = ""
-        if conversation_history:
-            recent_messages = conversation_history[-4:]  # 只取最近4条消息
-            context_str = (
-                "\n对话上下文：\n"
-                + "\n".join(
-                    [
-                        f"{'用户' if msg.get('role') == 'user' else 'AI'}: {msg.get('content', '')}"
-                        for msg in recent_messages
-                    ]
-                )
-                + "\n"
-            )
-
-        prompt = f"""
-我需要你优化以下菜谱，请特别关注用户的具体需求：
-
-**当前菜谱信息：**
-菜品名称：{dish_name}
-主要食材：{ingredients_str}
-制作步骤：
-{steps_str}
-
-{context_str}
-**用户的优化需求：**
-"{user_request}"
-
-**首先判断用户需求是否与菜谱优化相关：**
+TOPIC_RULES = """**首先判断用户需求是否与菜谱优化相关：**
 
 **菜谱相关话题包括：**
 - 食材处理方式（切法、腌制、预处理等）
@@ -143,15 +51,73 @@ class RecipeOptimizer:
 - 天气、新闻、政治、娱乐等与烹饪无关的话题
 - 个人生活、工作、学习等非烹饪内容
 - 技术问题、软件使用等
-- 其他与当前菜谱优化无关的任何话题
+- 其他与当前菜谱优化无关的任何话题"""
+
+OFF_TOPIC_RULE = """如果用户的需求与菜谱优化无关，请返回以下格式的JSON（message 中的<当前菜品名称>替换为当前菜谱的菜品名称）：
+{
+    "type": "off_topic_reminder",
+    "message": "我是专门的菜谱优化助手，只能帮您优化当前的菜谱。请告诉我您希望如何改进这道"<当前菜品名称>"，比如：调整口味、改变烹饪方法、增减食材、简化步骤等。"
+}"""
+
+# 两种模式的系统提示词包含全部静态的规则、示例和返回格式，每次请求逐字节相同，上游可以缓存并复用这段前缀；
+# 当前菜谱、对话上下文和用户需求等动态内容都放在其后的用户消息中
+PATCH_SYSTEM_PROMPT = (
+    SYSTEM_PROMPT_TEMPLATE.format(
+        output_rule="对于菜谱相关请求，只返回修改补丁JSON，没有变化的内容不要输出"
+    )
+    + """
+用户消息会给出当前菜谱（步骤按 1..n 编号）、对话上下文（如果有）和用户的优化需求。
+请特别关注用户的具体需求，只返回需要修改的部分（修改补丁），不要重复没有变化的内容。
+
+"""
+    + TOPIC_RULES
+    + "\n\n"
+    + OFF_TOPIC_RULE
+    + """
+
+如果相关，请返回修改补丁，所有字段都是可选的，只包含确实需要修改的字段：
+{
+    "type": "patch",
+    "dish_name": "新的菜品名称（有显著改变时）",
+    "description": "新的简短描述，突出优化的特点",
+    "prep_time_mins": 15,
+    "cook_time_mins": 20,
+    "ingredients": {
+        "remove": ["要删除的食材名称（与当前食材名称完全一致）"],
+        "upsert": [{"name": "新增或修改用量的食材", "amount": 2, "unit": "单位"}]
+    },
+    "instructions": [
+        {"op": "replace", "step": 2, "description": "替换第2步的新描述，体现用户要求的改进"},
+        {"op": "insert_after", "step": 2, "description": "插在第2步之后的新步骤（step 为 0 表示插到最前面）"},
+        {"op": "delete", "step": 3}
+    ],
+    "tips": ["新的全部小贴士（需要修改时）"],
+    "nutritional_info": {"calories_kcal": 350, "protein_g": 30, "carbs_g": 25, "fat_g": 15}
+}
+
+注意：
+1. step 一律使用用户消息中"当前菜谱"的步骤编号，不要自己重新编号，服务端会统一重新编号
+2. 修改已有食材的用量时，在 upsert 中使用相同的名称
+3. 食材、时间变化影响营养时，同时更新 nutritional_info 中变化的字段
+"""
+)
+
+FULL_SYSTEM_PROMPT = (
+    SYSTEM_PROMPT_TEMPLATE.format(
+        output_rule="对于菜谱相关请求，必须严格按照完整菜谱JSON格式返回结果"
+    )
+    + """
+用户消息会给出当前菜谱信息、对话上下文（如果有）和用户的优化需求，请特别关注用户的具体需求。
+
+"""
+    + TOPIC_RULES
+    + """
 
 **处理逻辑：**
 
-如果用户的需求与菜谱优化无关，请返回以下格式的JSON：
-{{
-    "type": "off_topic_reminder",
-    "message": "我是专门的菜谱优化助手，只能帮您优化当前的菜谱。请告诉我您希望如何改进这道"{dish_name}"，比如：调整口味、改变烹饪方法、增减食材、简化步骤等。"
-}}
+"""
+    + OFF_TOPIC_RULE
+    + """
 
 如果用户的需求与菜谱优化相关，请按照以下要求优化菜谱：
 
@@ -169,35 +135,310 @@ class RecipeOptimizer:
 - "增加蔬菜" → 在原有基础上添加适合的蔬菜，调整比例和步骤
 - "改成素食版本" → 用素食食材替换肉类，调整调料和烹饪方法
 
-请使用以下JSON格式返回优化后的菜谱：
-{{
+请使用以下JSON格式返回优化后的菜谱（菜系、难度、份数沿用当前菜谱，除非用户要求修改）：
+{
     "dish_name": "优化后的菜品名称（如果有显著改变）",
     "description": "简短描述，突出优化的特点",
-    "cuisine_type": "{current_recipe.get("cuisine_type", "中式")}",
-    "difficulty": "{current_recipe.get("difficulty", "中等")}",
+    "cuisine_type": "当前菜谱的菜系",
+    "difficulty": "当前菜谱的难度",
     "prep_time_mins": 15,
     "cook_time_mins": 20,
-    "servings": {current_recipe.get("servings", 2)},
+    "servings": 2,
     "ingredients": [
-        {{
+        {
             "name": "食材名称",
             "amount": 2,
             "unit": "单位"
-        }}
+        }
     ],
     "instructions": [
-        {{
+        {
             "step": 1,
             "description": "详细的步骤描述，确保体现用户要求的改进"
-        }}
+        }
     ],
     "tips": ["针对优化内容的实用小贴士"],
-    "nutritional_info": {{
+    "nutritional_info": {
         "calories_kcal": 350,
         "protein_g": 30,
         "carbs_g": 25,
         "fat_g": 15
-    }}
-}}
+    }
+}
+"""
+)
+
+# 优化模式：
+# - patch: 模型只返回修改补丁（输出 token 少得多），在本地应用并校验；补丁无法应用时改用 full
+# - full: 模型重新输出完整菜谱
+OPTIMIZE_MODES = ("patch", "full")
+
+
+class RecipeOptimizer:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        single_flight: Optional[SingleFlight] = None,
+        mode: Optional[str] = None,
+        summarizer: Optional[ConversationSummarizer] = None,
+    ):
+        """
+        初始化RecipeOptimizer
+
+        Args:
+            api_key: OpenAI API密钥，如果不提供则从环境变量OPENAI_API_KEY获取
+            single_flight: 请求合并层（可选），菜谱、需求和对话上下文都相同的并发请求只调用一次上游
+            mode: 优化模式 patch / full，默认读取 RECIPE_OPTIMIZE_MODE（patch）
+            summarizer: 对话摘要器（可选），较早的对话折叠为约束摘要；不提供时只使用最近4条消息
+        """
+        self.client = create_openai_client(api_key or os.getenv("OPENAI_API_KEY"))
+        self.upstream = get_upstream_policy("optimizer")
+        self.single_flight = single_flight
+        self.summarizer = summarizer
+        self.mode = (mode or os.getenv("RECIPE_OPTIMIZE_MODE", "patch")).lower()
+        if self.mode not in OPTIMIZE_MODES:
+            raise ValueError(f"RECIPE_OPTIMIZE_MODE 必须是 {' / '.join(OPTIMIZE_MODES)}")
+        self.patch_applied = 0
+        self.patch_fallbacks = 0
+        self.full_regenerations = 0
+
+    async def optimize_recipe(
+        self,
+        current_recipe: Dict[str, Any],
+        user_request: str,
+        conversation_history: list = None,
+    ) -> Dict[str, Any]:
+        """
+        基于用户的具体需求优化现有菜谱
+
+        Args:
+            current_recipe: 当前的菜谱JSON
+            user_request: 用户的优化需求
+            conversation_history: 对话历史（可选）
+
+        Returns:
+            优化后的菜谱JSON
+        """
+        if self.single_flight is not None:
+            key = self._request_key(current_recipe, user_request, conversation_history)
+            return await self.single_flight.do(
+                key, lambda: self._optimize(current_recipe, user_request, conversation_history)
+            )
+        return await self._optimize(current_recipe, user_request, conversation_history)
+
+    async def _optimize(
+        self,
+        current_recipe: Dict[str, Any],
+        user_request: str,
+        conversation_history: list = None,
+    ) -> Dict[str, Any]:
+        """优先用补丁模式，补丁无法解析或应用时重新生成完整菜谱"""
+        context_str = await self._conversation_context(conversation_history)
+
+        if self.mode == "patch" and self._supports_patch(current_recipe):
+            try:
+                result = await self._request_patch(current_recipe, user_request, context_str)
+                self.patch_applied += 1
+                return result
+            except ValueError as e:
+                # 补丁不是合法JSON或与当前菜谱对不上；上游调用本身的错误直接抛出
+                self.patch_fallbacks += 1
+                print(f"⚠️ 修改补丁无法应用，改为重新生成完整菜谱: {e}")
+
+        self.full_regenerations += 1
+        # 构建优化任务的具体提示词
+        user_prompt = self._build_optimize_prompt(current_recipe, user_request, context_str)
+        return await self._request_optimization(FULL_SYSTEM_PROMPT, user_prompt)
+
+    async def _conversation_context(self, conversation_history: list = None) -> str:
+        """提示词中的对话上下文：较早对话的摘要（启用摘要器时）加最近几条消息的原文"""
+        if self.summarizer is None:
+            return self._format_context((conversation_history or [])[-4:])  # 只取最近4条消息
+        summary, recent_messages = await self.summarizer.build_context(conversation_history)
+        return self._format_context(recent_messages, summary)
+
+    async def _request_patch(
+        self,
+        current_recipe: Dict[str, Any],
+        user_request: str,
+        context_str: str = "",
+    ) -> Dict[str, Any]:
+        """让模型返回修改补丁并在本地应用，返回完整的新菜谱（或非菜谱话题提醒）"""
+        user_prompt = self._build_patch_prompt(current_recipe, user_request, context_str)
+        with span("optimizer", "optimize_patch"):
+            response = await self.upstream.call(
+                lambda: self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": PATCH_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    temperature=0.8,
+                    max_completion_tokens=600,
+                    response_format={"type": "json_object"},
+                )
+            )
+        record_usage("optimizer", response.usage)
+
+        with span("optimizer", "optimize_patch_apply"):
+            content = response.choices[0].message.content
+            # 拒答或空回复时 content 为 None，与无效补丁一样走完整重新生成
+            if not content or not content.strip():
+                raise RecipePatchError("模型没有返回补丁内容")
+            patch = json.loads(content)
+            if isinstance(patch, dict) and patch.get("type") == "off_topic_reminder":
+                return patch
+            return apply_recipe_patch(current_recipe, patch)
+
+    @staticmethod
+    def _supports_patch(current_recipe: Dict[str, Any]) -> bool:
+        """补丁按食材名和步骤编号定位，当前菜谱缺少这些结构时只能重新生成"""
+        ingredients = current_recipe.get("ingredients")
+        instructions = current_recipe.get("instructions")
+        return (
+            isinstance(ingredients, list)
+            and isinstance(instructions, list)
+            and bool(instructions)
+            and all(isinstance(ing, dict) and "name" in ing for ing in ingredients)
+            and all(isinstance(step, dict) and "description" in step for step in instructions)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        attempts = self.patch_applied + self.patch_fallbacks
+        return {
+            "mode": self.mode,
+            "patch_applied": self.patch_applied,
+            "patch_fallbacks": self.patch_fallbacks,
+            "full_regenerations": self.full_regenerations,
+            "patch_success_rate": self.patch_applied / attempts if attempts else 0.0,
+            "summarizer": self.summarizer.stats() if self.summarizer else None,
+        }
+
+    async def _request_optimization(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+        """调用上游重新生成完整菜谱"""
+        try:
+            with span("optimizer", "optimize"):
+                response = await self.upstream.call(
+                    lambda: self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_prompt},
+                        ],
+                        temperature=0.8,  # 稍微提高创造性
+                        max_completion_tokens=1500,
+                        response_format={"type": "json_object"},
+                    )
+                )
+            record_usage("optimizer", response.usage)
+
+            with span("optimizer", "optimize_decode"):
+                recipe_text = response.choices[0].message.content
+                if not recipe_text or not recipe_text.strip():
+                    raise UpstreamError("上游没有返回菜谱内容")
+                return json.loads(recipe_text)
+
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise Exception(f"优化菜谱时发生错误: {str(e)}")
+
+    @staticmethod
+    def _request_key(
+        current_recipe: Dict[str, Any],
+        user_request: str,
+        conversation_history: list = None,
+    ) -> str:
+        """请求合并的键：菜谱、规范化后的优化需求和对话历史（较早的对话也会影响摘要）"""
+        canonical = json.dumps(
+            [current_recipe, normalize_text(user_request), conversation_history or []],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _format_context(recent_messages: list, summary: Optional[str] = None) -> str:
+        """构建对话上下文（如果有）"""
+        context_str = ""
+        if summary:
+            context_str += f"\n此前对话中用户提出的要求（摘要）：{summary}\n"
+        if recent_messages:
+            context_str += (
+                "\n对话上下文：\n"
+                + "\n".join(
+                    [
+                        f"{'用户' if msg.get('role') == 'user' else 'AI'}: {msg.get('content', '')}"
+                        for msg in recent_messages
+                    ]
+                )
+                + "\n"
+            )
+        return context_str
+
+    def _build_patch_prompt(
+        self,
+        current_recipe: Dict[str, Any],
+        user_request: str,
+        context_str: str = "",
+    ) -> str:
+        """构建补丁模式的用户消息：完整的当前菜谱（步骤按 1..n 编号）、对话上下文和用户需求"""
+        dish_name = current_recipe.get("dish_name", "未知菜品")
+        ingredients_str = "\n".join(
+            f"- {ing['name']}：{ing.get('amount', '')}{ing.get('unit', '')}"
+            for ing in current_recipe.get("ingredients", [])
+        )
+        steps_str = "\n".join(
+            f"{i}. {step['description']}"
+            for i, step in enumerate(current_recipe.get("instructions", []), start=1)
+        )
+        nutrition = current_recipe.get("nutritional_info") or {}
+        nutrition_str = "、".join(f"{key}={value}" for key, value in nutrition.items()) or "无"
+        tips_str = "；".join(current_recipe.get("tips") or []) or "无"
+
+        return f"""**当前菜谱：**
+菜品名称：{dish_name}
+描述：{current_recipe.get("description", "")}
+难度：{current_recipe.get("difficulty", "")}  准备时间：{current_recipe.get("prep_time_mins", "")}分钟  烹饪时间：{current_recipe.get("cook_time_mins", "")}分钟  份量：{current_recipe.get("servings", "")}人份
+食材：
+{ingredients_str}
+制作步骤：
+{steps_str}
+小贴士：{tips_str}
+营养信息：{nutrition_str}
+{context_str}
+**用户的优化需求：**
+"{user_request}"
+"""
+
+    def _build_optimize_prompt(
+        self,
+        current_recipe: Dict[str, Any],
+        user_request: str,
+        context_str: str = "",
+    ) -> str:
+        """构建完整模式的用户消息，规则和返回格式在 FULL_SYSTEM_PROMPT 中"""
+
+        # 提取当前菜谱的关键信息
+        dish_name = current_recipe.get("dish_name", "未知菜品")
+        ingredients = current_recipe.get("ingredients", [])
+        instructions = current_recipe.get("instructions", [])
+
+        ingredients_str = "、".join(
+            [f"{ing['name']}({ing['amount']}{ing['unit']})" for ing in ingredients]
+        )
+        steps_str = "\n".join(
+            [f"{step['step']}. {step['description']}" for step in instructions]
+        )
+
+        prompt = f"""**当前菜谱信息：**
+菜品名称：{dish_name}
+菜系：{current_recipe.get("cuisine_type", "中式")}  难度：{current_recipe.get("difficulty", "中等")}  份量：{current_recipe.get("servings", 2)}人份
+主要食材：{ingredients_str}
+制作步骤：
+{steps_str}
+{context_str}
+**用户的优化需求：**
+"{user_request}"
 """
         return prompt
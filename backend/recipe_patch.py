@@ -0,0 +1,197 @@
+import copy
+import math
+from typing import Any, Dict, List
+
+# 补丁可以直接覆盖的顶层字段及其类型
+_SCALAR_FIELDS = {
+    "dish_name": str,
+    "description": str,
+    "cuisine_type": str,
+    "difficulty": str,
+    "prep_time_mins": int,
+    "cook_time_mins": int,
+    "servings": int,
+}
+_NUTRITION_FIELDS = ("calories_kcal", "protein_g", "carbs_g", "fat_g")
+_STEP_OPS = ("replace", "insert_after", "delete")
+
+
+class RecipePatchError(ValueError):
+    """补丁格式不正确，或者与当前菜谱对不上"""
+
+
+def apply_recipe_patch(recipe: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把 LLM 返回的修改补丁应用到菜谱上，返回新的菜谱（不修改传入的菜谱）
+
+    补丁格式：
+        {
+            "dish_name": "...",                      # 以及 description、prep_time_mins 等顶层字段，可选
+            "ingredients": {
+                "remove": ["食材名"],                  # 删除的食材
+                "upsert": [{"name", "amount", "unit"}]  # 同名替换，新食材追加到末尾
+            },
+            "instructions": [                        # step 都是当前菜谱中的步骤编号
+                {"op": "replace", "step": 2, "description": "..."},
+                {"op": "insert_after", "step": 2, "description": "..."},  # step 为 0 表示插到最前面
+                {"op": "delete", "step": 3}
+            ],
+            "tips": ["..."],                         # 可选，替换全部小贴士
+            "nutritional_info": {"calories_kcal": 380}  # 可选，只更新给出的字段
+        }
+
+    应用后步骤重新从 1 编号。补丁引用了不存在的食材或步骤、字段类型不对、
+    结果没有食材或步骤、应用后与原菜谱完全相同时抛出 RecipePatchError。
+    """
+    if not isinstance(patch, dict):
+        raise RecipePatchError("补丁必须是JSON对象")
+
+    result = copy.deepcopy(recipe)
+
+    for field, field_type in _SCALAR_FIELDS.items():
+        if field not in patch or patch[field] is None:
+            continue
+        value = _coerce(patch[field], field_type, field)
+        if field_type is int and value < 0:
+            raise RecipePatchError(f"{field} 不能为负数")
+        result[field] = value
+
+    if patch.get("ingredients"):
+        result["ingredients"] = _apply_ingredients(
+            recipe.get("ingredients") or [], patch["ingredients"]
+        )
+
+    if patch.get("instructions"):
+        result["instructions"] = _apply_instructions(
+            recipe.get("instructions") or [], patch["instructions"]
+        )
+
+    if patch.get("tips") is not None:
+        tips = patch["tips"]
+        if not isinstance(tips, list) or not all(isinstance(tip, str) for tip in tips):
+            raise RecipePatchError("tips 必须是字符串列表")
+        result["tips"] = tips
+
+    if patch.get("nutritional_info"):
+        nutrition = patch["nutritional_info"]
+        if not isinstance(nutrition, dict):
+            raise RecipePatchError("nutritional_info 必须是JSON对象")
+        merged = dict(result.get("nutritional_info") or {})
+        for field in _NUTRITION_FIELDS:
+            if nutrition.get(field) is not None:
+                merged[field] = _coerce(nutrition[field], float, f"nutritional_info.{field}")
+                if float(merged[field]).is_integer():
+                    merged[field] = int(merged[field])
+        result["nutritional_info"] = merged
+
+    # 空的 remove/upsert、空的步骤操作或与原值相同的字段都不算修改，不能保存成新版本
+    if result == recipe:
+        raise RecipePatchError("补丁没有任何修改")
+    if not result.get("ingredients"):
+        raise RecipePatchError("应用补丁后菜谱没有食材")
+    if not result.get("instructions"):
+        raise RecipePatchError("应用补丁后菜谱没有步骤")
+    return result
+
+
+def _coerce(value: Any, field_type: type, field: str) -> Any:
+    if field_type is str:
+        if not isinstance(value, str) or not value.strip():
+            raise RecipePatchError(f"{field} 必须是非空字符串")
+        return value.strip()
+    # 数字字段接受 "15" 这样的字符串，bool 不算数字
+    if isinstance(value, bool):
+        raise RecipePatchError(f"{field} 必须是数字")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RecipePatchError(f"{field} 必须是数字")
+    if not math.isfinite(number):
+        raise RecipePatchError(f"{field} 必须是数字")
+    return int(round(number)) if field_type is int else number
+
+
+def _apply_ingredients(ingredients: List[Dict[str, Any]], patch: Any) -> List[Dict[str, Any]]:
+    if not isinstance(patch, dict):
+        raise RecipePatchError("ingredients 补丁必须是JSON对象")
+
+    result = [dict(ingredient) for ingredient in ingredients]
+    names = [ingredient.get("name") for ingredient in result]
+
+    for name in patch.get("remove") or []:
+        if name not in names:
+            raise RecipePatchError(f"要删除的食材不存在: {name}")
+        index = names.index(name)
+        del result[index]
+        del names[index]
+
+    for ingredient in patch.get("upsert") or []:
+        if not isinstance(ingredient, dict) or not isinstance(ingredient.get("name"), str):
+            raise RecipePatchError("upsert 中的食材必须包含 name")
+        if "amount" not in ingredient or "unit" not in ingredient:
+            raise RecipePatchError(f"食材 {ingredient['name']} 缺少 amount 或 unit")
+        amount = _coerce(ingredient["amount"], float, f"食材 {ingredient['name']} 的 amount")
+        if amount < 0:
+            raise RecipePatchError(f"食材 {ingredient['name']} 的 amount 不能为负数")
+        item = {
+            "name": ingredient["name"].strip(),
+            "amount": int(amount) if amount.is_integer() else amount,
+            "unit": str(ingredient["unit"]),
+        }
+        if item["name"] in names:
+            result[names.index(item["name"])] = item
+        else:
+            result.append(item)
+            names.append(item["name"])
+
+    return result
+
+
+def _apply_instructions(instructions: List[Dict[str, Any]], operations: Any) -> List[Dict[str, Any]]:
+    """按原始步骤编号应用所有操作，最后统一重新编号，操作之间的顺序不影响编号"""
+    if not isinstance(operations, list):
+        raise RecipePatchError("instructions 补丁必须是列表")
+
+    count = len(instructions)
+    descriptions: List[Any] = [step.get("description", "") for step in instructions]
+    replaced = set()
+    deleted = set()
+    # inserted[i]：插在第 i 步之后的新步骤，i 为 0 表示最前面
+    inserted: Dict[int, List[str]] = {}
+
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in _STEP_OPS:
+            raise RecipePatchError(f"不支持的步骤操作: {operation}")
+        op = operation["op"]
+        step = operation.get("step")
+        if isinstance(step, bool) or not isinstance(step, int):
+            raise RecipePatchError(f"步骤编号必须是整数: {operation}")
+
+        lowest = 0 if op == "insert_after" else 1
+        if not lowest <= step <= count:
+            raise RecipePatchError(f"步骤 {step} 不存在（当前共 {count} 步）")
+
+        if op == "delete":
+            if step in replaced:
+                raise RecipePatchError(f"步骤 {step} 同时被替换和删除")
+            deleted.add(step)
+            continue
+
+        description = operation.get("description")
+        if not isinstance(description, str) or not description.strip():
+            raise RecipePatchError(f"{op} 操作缺少 description")
+        if op == "replace":
+            if step in replaced or step in deleted:
+                raise RecipePatchError(f"步骤 {step} 被修改了多次")
+            replaced.add(step)
+            descriptions[step - 1] = description.strip()
+        else:
+            inserted.setdefault(step, []).append(description.strip())
+
+    ordered = list(inserted.get(0, []))
+    for index, description in enumerate(descriptions, start=1):
+        if index not in deleted:
+            ordered.append(description)
+        ordered.extend(inserted.get(index, []))
+
+    return [{"step": i, "description": description} for i, description in enumerate(ordered, start=1)]
@@ -0,0 +1,171 @@
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from cache import CacheBackend, create_backend
+
+# 响应中附加的会话字段，保存菜谱和组装提示词前需要去掉
+SESSION_FIELDS = ("recipe_id", "version", "degradations")
+
+
+def strip_session_fields(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉客户端回传的 recipe_id / version / degradations，只保留菜谱本身"""
+    return {key: value for key, value in recipe.items() if key not in SESSION_FIELDS}
+
+
+class RecipeSessionStore:
+    """
+    服务端保存的菜谱及其版本历史
+
+    生成的菜谱保存为版本 1，每次优化基于某个版本保存一个新版本（parent 指向基础版本），
+    客户端之后只需要传 recipe_id（和可选的 version），不必再上传完整菜谱和对话历史。
+
+    每个会话是存储后端中的一个条目（JSON），按会话数 LRU 淘汰并有过期时间；
+    每个会话最多保留 max_versions 个版本，超出时丢弃最早的版本。
+    版本对应的对话消息也保存在版本上，沿 parent 链拼接得到该版本的对话历史。
+
+    读取和写入之间没有 await，同一进程内不会交错；多个进程共用 SQLite 时，
+    同一会话的并发优化可能丢失其中一个版本，客户端会拿到已丢失版本的 404 并回退到完整上传。
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        max_versions: Optional[int] = None,
+        max_history_messages: Optional[int] = None,
+    ):
+        """
+        初始化菜谱会话存储
+
+        Args:
+            backend: 存储后端（memory / sqlite），条目数上限和过期时间由后端控制
+            max_versions: 每个会话保留的版本数，默认读取 RECIPE_SESSION_MAX_VERSIONS（10）
+            max_history_messages: 返回的对话历史最多包含的消息数，
+                默认读取 RECIPE_SESSION_MAX_HISTORY（40）
+        """
+        self.backend = backend
+        self.max_versions = max_versions or int(os.getenv("RECIPE_SESSION_MAX_VERSIONS", "10"))
+        self.max_history_messages = max_history_messages or int(
+            os.getenv("RECIPE_SESSION_MAX_HISTORY", "40")
+        )
+        self.created = 0
+        self.versions_saved = 0
+        self.hits = 0
+        self.misses = 0
+
+    def save(
+        self,
+        recipe: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        recipe_id: Optional[str] = None,
+        parent: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        保存菜谱的一个版本，返回 {"recipe_id": ..., "version": ...}
+
+        不传 recipe_id，或者会话已过期被淘汰时，创建新的会话。
+        messages 是产生这个版本的对话消息（例如用户的优化要求和AI的回复）。
+        """
+        now = time.time()
+        session = self._load(recipe_id) if recipe_id else None
+        if session is None:
+            recipe_id = uuid.uuid4().hex
+            session = {"recipe_id": recipe_id, "created_at": now, "next_version": 1, "versions": []}
+            parent = None
+            self.created += 1
+
+        version = session["next_version"]
+        session["next_version"] = version + 1
+        session["versions"].append(
+            {
+                "version": version,
+                "parent": parent,
+                "created_at": now,
+                "recipe": strip_session_fields(recipe),
+                "messages": [
+                    {"role": message.get("role"), "content": message.get("content", "")}
+                    for message in messages
+                    if isinstance(message, dict)
+                ],
+            }
+        )
+        session["versions"] = session["versions"][-self.max_versions :]
+        session["updated_at"] = now
+        self.backend.set(recipe_id, json.dumps(session, ensure_ascii=False))
+        self.versions_saved += 1
+        return {"recipe_id": recipe_id, "version": version}
+
+    def get(self, recipe_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        读取某个版本（默认最新版本），会话或版本不存在时返回 None
+
+        返回 {"recipe_id", "version", "latest_version", "recipe", "history"}，
+        history 是从第一个版本到这个版本的对话消息（已被丢弃的版本不包含在内）。
+        """
+        session = self._load(recipe_id)
+        versions = {entry["version"]: entry for entry in session["versions"]} if session else {}
+        if version is None and versions:
+            version = max(versions)
+        entry = versions.get(version)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        chain = []
+        while entry is not None:
+            chain.append(entry)
+            entry = versions.get(entry["parent"])
+        history = [message for entry in reversed(chain) for message in entry["messages"]]
+        return {
+            "recipe_id": recipe_id,
+            "version": version,
+            "latest_version": max(versions),
+            "recipe": versions[version]["recipe"],
+            "history": history[-self.max_history_messages :],
+        }
+
+    def versions(self, recipe_id: str) -> Optional[List[Dict[str, Any]]]:
+        """会话中保留的所有版本的概要，会话不存在时返回 None"""
+        session = self._load(recipe_id)
+        if session is None:
+            return None
+        return [
+            {
+                "version": entry["version"],
+                "parent": entry["parent"],
+                "dish_name": entry["recipe"].get("dish_name"),
+                "created_at": entry["created_at"],
+            }
+            for entry in session["versions"]
+        ]
+
+    def _load(self, recipe_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.backend.get(recipe_id)
+        return json.loads(raw) if raw is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "sessions": len(self.backend),
+            "created": self.created,
+            "versions_saved": self.versions_saved,
+            "hits": self.hits,
+            "misses": self.misses,
+            "max_versions": self.max_versions,
+        }
+
+
+def create_recipe_session_store() -> Optional[RecipeSessionStore]:
+    """
+    根据环境变量创建菜谱会话存储，RECIPE_SESSION_BACKEND=off 时返回 None
+
+    后端配置与缓存相同（RECIPE_SESSION_BACKEND / _SIZE / _TTL / _PATH），
+    默认最多保存 1000 个会话，最后一次保存后 24 小时过期。
+    """
+    backend = create_backend(
+        "recipe_sessions", "RECIPE_SESSION", default_size=1000, default_ttl=86400
+    )
+    return RecipeSessionStore(backend) if backend is not None else None
@@ -0,0 +1,411 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from metrics import record_upstream_attempt
+
+if TYPE_CHECKING:
+    from admission import AdmissionScheduler
+
+T = TypeVar("T")
+
+# 上游返回这些状态码时可以重试（与 openai SDK 的重试条件相同）
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+class UpstreamError(Exception):
+    """上游调用重试后仍然失败，status_code 是返回给客户端的 HTTP 状态码"""
+
+    status_code = 502
+    retry_after: Optional[float] = None
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """上游调用超过截止时间"""
+
+    status_code = 504
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """熔断器打开，不调用上游直接失败"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamOverloadedError(UpstreamError):
+    """等待调用上游的请求太多（限流队列已满或排队超时），或上游重试后仍然返回 429"""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后打开，cooldown_s 秒内的调用直接失败
+
+    冷却结束后进入半开状态，只放行一个探测调用：成功则关闭，失败则重新打开。
+    failure_threshold 为 0 时不熔断。所有 OpenAI 组件调用同一个上游，共用一个熔断器。
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown_s: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def before_call(self) -> bool:
+        """
+        调用上游前检查，熔断时抛出 UpstreamUnavailableError
+
+        Returns:
+            这次调用是否是半开状态下的探测调用
+        """
+        if self.state == "closed":
+            return False
+        remaining = self.opened_at + self.cooldown_s - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        raise UpstreamUnavailableError("上游服务暂时不可用，请稍后再试", max(remaining, 1.0))
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if not self.failure_threshold:
+            return
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"⚠️ 上游 {self.name} 连续失败 {self.consecutive_failures} 次，熔断 {self.cooldown_s:.0f} 秒")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self, is_probe: bool) -> None:
+        """探测调用被取消（没有结果）时，让下一个调用继续探测"""
+        if is_probe:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class UpstreamPolicy:
+    """
+    一个组件调用上游的截止时间、重试、对冲和熔断策略
+
+    - 每次尝试有截止时间 timeout，所有尝试加上退避等待不超过 total_timeout
+    - 超时、连接错误、429 和 5xx 最多重试 max_retries 次，退避时间为带完全抖动的指数退避
+      （上游返回 Retry-After 时至少等待这么久），剩余时间不够时不再重试
+    - 启用对冲时，一次尝试超过最近成功调用的 p95 延迟仍未返回，就再发一个相同的请求，
+      先返回的结果生效，另一个取消；熔断器不是关闭状态时不对冲
+    - 每次尝试前经过服务商的准入调度器（见 admission.py）限流排队，排队时间不算在尝试的截止时间内；
+      对冲请求只在不需要排队时才发出
+    - 每次尝试的结果记入共用的熔断器
+    """
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        scheduler: "AdmissionScheduler",
+        timeout: float,
+        total_timeout: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        hedge: bool,
+        hedge_min_samples: int,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.failures = 0
+        # 最近成功调用的延迟（秒），用于计算对冲等待时间
+        self._latencies: Deque[float] = deque(maxlen=200)
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[T]],
+        hedge: bool = True,
+        budget_s: Optional[float] = None,
+    ) -> T:
+        """
+        按策略执行 func()（发起一次上游调用的函数，每次尝试调用一次）
+
+        流式调用只保护建立连接的部分，传 hedge=False：流已经开始后不能再换一个请求。
+        budget_s 是调用方剩余的时间（例如请求的截止时间），比 total_timeout 短时以它为准。
+
+        Raises:
+            UpstreamUnavailableError: 熔断器打开
+            UpstreamOverloadedError: 限流排队已满或排队超时，或上游重试后仍然返回 429
+            UpstreamTimeoutError: 超过截止时间
+            UpstreamError: 重试后仍然失败
+            其他异常: 不可重试的错误（例如 400）原样抛出
+        """
+        self.calls += 1
+        total_timeout = self.total_timeout if budget_s is None else min(self.total_timeout, budget_s)
+        if total_timeout <= 0:
+            self.failures += 1
+            raise UpstreamTimeoutError("没有剩余时间调用上游")
+        deadline = time.monotonic() + total_timeout
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_retries + 1):
+            tokens = await self.scheduler.acquire(self.name, deadline - time.monotonic())
+            try:
+                return await self._attempt(
+                    func, min(self.timeout, deadline - time.monotonic()), hedge, tokens
+                )
+            except UpstreamUnavailableError:
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                last_error = e
+
+            delay = self._backoff(attempt, last_error)
+            if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                break
+            self.retries += 1
+            print(f"🔁 {self.name} 上游调用失败（{_describe(last_error)}），{delay:.2f} 秒后重试")
+            await asyncio.sleep(delay)
+
+        self.failures += 1
+        if _is_timeout(last_error):
+            raise UpstreamTimeoutError(f"上游服务响应超时: {_describe(last_error)}") from last_error
+        if getattr(last_error, "status_code", None) == 429:
+            raise UpstreamOverloadedError(
+                f"上游服务限流: {_describe(last_error)}", _retry_after(last_error) or 1.0
+            ) from last_error
+        raise UpstreamError(f"上游服务暂时不可用: {_describe(last_error)}") from last_error
+
+    async def _attempt(
+        self, func: Callable[[], Awaitable[T]], timeout: float, hedge: bool, tokens: float
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        first = asyncio.ensure_future(self._timed(func, tokens))
+        tasks = [first]
+        try:
+            hedge_delay = self._hedge_delay() if hedge else None
+            if hedge_delay is not None and hedge_delay < timeout:
+                await asyncio.wait(tasks, timeout=hedge_delay)
+                hedge_tokens = None
+                if not first.done() and self.breaker.state == "closed":
+                    hedge_tokens = self.scheduler.try_acquire(self.name)
+                if hedge_tokens is not None:
+                    self.hedges += 1
+                    record_upstream_attempt(self.name, "hedge")
+                    tasks.append(asyncio.ensure_future(self._timed(func, hedge_tokens)))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=end - loop.time(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.timeouts += 1
+                    # 因为调用方剩余时间不足而缩短的尝试超时，不能说明上游出了问题
+                    if timeout >= self.timeout:
+                        self.breaker.record_failure()
+                    record_upstream_attempt(self.name, "timeout")
+                    raise asyncio.TimeoutError(f"{timeout:.1f} 秒内没有返回")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _timed(self, func: Callable[[], Awaitable[T]], tokens: float) -> T:
+        try:
+            is_probe = self.breaker.before_call()
+        except UpstreamUnavailableError:
+            self.scheduler.settle(self.name, tokens, 0)
+            raise
+        start = time.perf_counter()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # 尝试超时或对冲输掉被取消：拿不到实际用量，与失败一样退回预扣的 token
+            self.scheduler.settle(self.name, tokens, 0)
+            self.breaker.release_probe(is_probe)
+            raise
+        except Exception as e:
+            # 失败的调用基本不消耗 token，退回预扣的部分
+            self.scheduler.settle(self.name, tokens, 0)
+            if getattr(e, "status_code", None) == 429:
+                # 限流说明上游正常但调用太多，由准入调度器暂停放行，不计入熔断
+                self.breaker.release_probe(is_probe)
+                self.scheduler.throttle(_retry_after(e) or 1.0)
+                record_upstream_attempt(self.name, "rate_limited")
+            elif _is_retryable(e):
+                self.breaker.record_failure()
+                record_upstream_attempt(self.name, "error")
+            else:
+                # 400 等错误说明上游可以正常响应
+                self.breaker.record_success()
+                record_upstream_attempt(self.name, "rejected")
+            raise
+        self._latencies.append(time.perf_counter() - start)
+        # 流式调用此时还没有 usage，按预估值计算
+        usage = getattr(result, "usage", None)
+        self.scheduler.settle(self.name, tokens, getattr(usage, "total_tokens", None))
+        self.breaker.record_success()
+        record_upstream_attempt(self.name, "success")
+        return result
+
+    def _hedge_delay(self) -> Optional[float]:
+        """最近成功调用的 p95 延迟，样本不足时不对冲"""
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    def _backoff(self, attempt: int, error: Optional[BaseException]) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def stats(self) -> Dict[str, Any]:
+        hedge_delay = self._hedge_delay()
+        return {
+            "timeout_s": self.timeout,
+            "max_retries": self.max_retries,
+            "hedge": self.hedge,
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": round(hedge_delay * 1000, 1) if hedge_delay is not None else None,
+        }
+
+
+def _is_timeout(error: Optional[BaseException]) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    import openai
+
+    return isinstance(error, openai.APITimeoutError)
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in _RETRYABLE_STATUS or status >= 500
+    # 只有已经在使用 openai SDK 时才会走到这里
+    import openai
+
+    return isinstance(error, openai.APIConnectionError)
+
+
+def _retry_after(error: Optional[BaseException]) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _describe(error: Optional[BaseException]) -> str:
+    return f"{type(error).__name__}: {error}" if error is not None else "未知错误"
+
+
+_BREAKER: Optional[CircuitBreaker] = None
+_POLICIES: Dict[str, UpstreamPolicy] = {}
+
+
+def get_upstream_policy(name: str, timeout: Optional[float] = None) -> UpstreamPolicy:
+    """
+    返回组件的上游调用策略，同名组件共用一个实例
+
+    Args:
+        name: 组件名（parser、generator、optimizer、summarizer、intent、vision）
+        timeout: 这个组件每次尝试的默认截止时间（秒），不传时读取 UPSTREAM_TIMEOUT_S（20）；
+            UPSTREAM_TIMEOUT_S_<组件名大写> 优先
+    """
+    # admission 依赖本模块中的错误类型，在这里导入避免循环导入
+    from admission import get_scheduler
+
+    global _BREAKER
+    if _BREAKER is None:
+        _BREAKER = CircuitBreaker(
+            "openai",
+            failure_threshold=int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5")),
+            cooldown_s=float(os.getenv("UPSTREAM_BREAKER_COOLDOWN_S", "30")),
+        )
+    if name not in _POLICIES:
+        default_timeout = timeout or float(os.getenv("UPSTREAM_TIMEOUT_S", "20"))
+        _POLICIES[name] = UpstreamPolicy(
+            name,
+            _BREAKER,
+            get_scheduler("openai"),
+            timeout=float(os.getenv(f"UPSTREAM_TIMEOUT_S_{name.upper()}", str(default_timeout))),
+            total_timeout=float(os.getenv("UPSTREAM_TOTAL_TIMEOUT_S", "25")),
+            max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "2")),
+            backoff_base=float(os.getenv("UPSTREAM_BACKOFF_BASE_MS", "200")) / 1000,
+            backoff_max=float(os.getenv("UPSTREAM_BACKOFF_MAX_MS", "2000")) / 1000,
+            hedge=os.getenv("UPSTREAM_HEDGE", "false").lower() == "true",
+            hedge_min_samples=int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20")),
+        )
+    return _POLICIES[name]
+
+
+def upstream_stats() -> Optional[Dict[str, Any]]:
+    """熔断器状态和各组件的重试、超时、对冲次数，还没有调用过上游时返回 None"""
+    if _BREAKER is None:
+        return None
+    return {
+        "breaker": _BREAKER.stats(),
+        "components": {name: policy.stats() for name, policy in _POLICIES.items()},
+    }
@@ -0,0 +1,86 @@
+import asyncio
+import copy
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# 所有通过 create_single_flight 创建的实例，用于统一输出统计信息
+_SINGLE_FLIGHT_REGISTRY: List["SingleFlight"] = []
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求（single-flight）
+
+    同一个键的上游调用还没有完成时，后来的调用方不再发起新的调用，而是等待同一个结果。
+    调用完成后立即从进行中列表移除，不缓存结果（缓存由 cache.py 负责）。
+
+    - 上游调用在独立的任务中运行，某个调用方被取消不会影响其他等待者
+    - 上游调用抛出的异常会传给所有等待者
+    - 第一个调用方拿到原始结果，其他调用方拿到深拷贝，互相修改结果不受影响
+    - 调用方有截止时间（budget_s）时，只合并到保证在它的截止时间之前结束的调用上，
+      否则单独调用上游，不会因为等待别人的调用而超时
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        # 键 -> (进行中的调用, 它最晚结束的时间；None 表示没有截止时间)
+        self._in_flight: Dict[str, Tuple[asyncio.Task, Optional[float]]] = {}
+
+    async def do(
+        self, key: str, func: Callable[[], Awaitable[Any]], budget_s: Optional[float] = None
+    ) -> Any:
+        """
+        执行 func()，键相同的并发调用共享同一次执行
+
+        Args:
+            key: 规范化后的请求键
+            func: 返回协程的函数，只有没有可以合并的进行中请求时才会被调用
+            budget_s: 调用方剩余的时间，func() 按它限制上游调用的总时长（见 UpstreamPolicy.call）；
+                不传表示没有截止时间，可以等待任何进行中的调用
+        """
+        self.calls += 1
+        finish_by = time.monotonic() + budget_s if budget_s is not None else None
+        entry = self._in_flight.get(key)
+        if entry is not None:
+            task, task_finish_by = entry
+            if finish_by is None or (task_finish_by is not None and task_finish_by <= finish_by):
+                self.coalesced += 1
+                return copy.deepcopy(await asyncio.shield(task))
+            # 进行中的调用可能在截止时间之后才结束，单独调用，也不替换进行中的调用
+            self.bypassed += 1
+            return await func()
+
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = (task, finish_by)
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "in_flight": len(self._in_flight),
+            "coalesced_rate": self.coalesced / self.calls if self.calls else 0.0,
+        }
+
+
+def create_single_flight(name: str) -> Optional[SingleFlight]:
+    """
+    创建请求合并层，SINGLE_FLIGHT_ENABLED=false 时返回 None（每个请求都单独调用上游）
+    """
+    if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "false":
+        return None
+
+    single_flight = SingleFlight(name)
+    _SINGLE_FLIGHT_REGISTRY.append(single_flight)
+    return single_flight
+
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """所有请求合并层的统计信息"""
+    return {item.name: item.stats() for item in _SINGLE_FLIGHT_REGISTRY}
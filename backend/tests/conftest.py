@@ -0,0 +1,61 @@
+"""
+测试公共夹具
+
+在 backend 目录下运行：
+
+    python -m pytest -q
+
+需要调用上游的测试使用本地模拟上游（benchmarks/mock_upstream.py），整个测试会话只启动一次。
+"""
+
+import os
+import sys
+
+import httpx
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.harness import MOCK_PORT, start_server, stop_server  # noqa: E402
+
+MOCK_URL = f"http://127.0.0.1:{MOCK_PORT}"
+# 每个测试结束后恢复的故障注入配置
+DEFAULT_FAULTS = {
+    "error_rate": 0.0,
+    "error_status": 500,
+    "timeout_rate": 0.0,
+    "timeout_s": 60.0,
+    "latency_ms": 0.0,
+    "rate_limit_rpm": 0.0,
+}
+
+
+@pytest.fixture(scope="session")
+def mock_upstream():
+    """启动模拟上游，返回它的地址"""
+    process = start_server("benchmarks.mock_upstream:app", MOCK_PORT, env={"MOCK_LATENCY_MS": "0"})
+    try:
+        yield MOCK_URL
+    finally:
+        stop_server(process)
+
+
+@pytest.fixture
+def faults(mock_upstream):
+    """修改模拟上游的故障注入配置：faults(error_rate=1.0, error_status=503)，测试结束后恢复"""
+
+    def set_faults(**settings):
+        response = httpx.post(f"{mock_upstream}/mock/faults", json=settings)
+        response.raise_for_status()
+        return response.json()
+
+    yield set_faults
+    set_faults(**DEFAULT_FAULTS)
+
+
+@pytest.fixture
+def upstream_calls(mock_upstream):
+    """返回读取模拟上游至今收到的 Chat Completions 调用数的函数"""
+    return lambda: httpx.get(f"{mock_upstream}/mock/stats").json()["chat_completions"]
@@ -0,0 +1,65 @@
+"""
+生成图片的本地存储：下载大小上限和临时文件清理
+"""
+
+import asyncio
+import os
+
+import httpx
+import pytest
+
+import image_store
+from image_store import ImageDownloadTooLargeError, ImageStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024
+
+
+def use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(image_store, "get_http_client", lambda: client)
+
+
+def test_saves_downloaded_image(tmp_path, monkeypatch):
+    use_transport(
+        monkeypatch,
+        lambda request: httpx.Response(200, content=PNG, headers={"content-type": "image/png"}),
+    )
+    store = ImageStore(directory=str(tmp_path))
+
+    filename = asyncio.run(store.save_from_url("番茄炒蛋", "https://upstream/a.png"))
+
+    assert filename == f"{store.key_for('番茄炒蛋')}.png"
+    assert (tmp_path / filename).read_bytes() == PNG
+    assert store.lookup("番茄炒蛋") == filename
+
+
+def test_rejects_declared_oversized_download(tmp_path, monkeypatch):
+    use_transport(
+        monkeypatch,
+        lambda request: httpx.Response(200, content=PNG, headers={"content-length": str(10 * 1024 * 1024)}),
+    )
+    store = ImageStore(directory=str(tmp_path), max_download_bytes=1024 * 1024)
+
+    with pytest.raises(ImageDownloadTooLargeError):
+        asyncio.run(store.save_from_url("番茄炒蛋", "https://upstream/a.png"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_aborts_undeclared_oversized_download(tmp_path, monkeypatch):
+    chunks_sent = 0
+
+    async def endless():
+        nonlocal chunks_sent
+        while True:
+            chunks_sent += 1
+            yield b"\x00" * 65536
+
+    # 没有 Content-Length 的分块响应
+    use_transport(monkeypatch, lambda request: httpx.Response(200, content=endless()))
+    store = ImageStore(directory=str(tmp_path), max_download_bytes=1024 * 1024)
+
+    with pytest.raises(ImageDownloadTooLargeError):
+        asyncio.run(store.save_from_url("番茄炒蛋", "https://upstream/a.png"))
+    # 超过上限后立即停止读取，临时文件被删除
+    assert chunks_sent <= 1024 * 1024 // 65536 + 2
+    assert os.listdir(tmp_path) == []
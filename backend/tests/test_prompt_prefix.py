@@ -0,0 +1,42 @@
+"""
+各组件发给上游的提示词静态前缀在不同输入的调用之间逐字节相同（检查逻辑见 benchmarks/check_prompt_prefix.py）
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from benchmarks.check_prompt_prefix import SAMPLE_IMAGE, run_checks
+from benchmarks.harness import mock_upstream_env
+
+COMPONENTS = [
+    "parser",
+    "generator",
+    "generator_fused",
+    "optimizer_patch",
+    "optimizer_full",
+    "summarizer",
+    "intent",
+    pytest.param(
+        "vision", marks=pytest.mark.skipif(not os.path.exists(SAMPLE_IMAGE), reason="没有示例图片")
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def prefix_results(mock_upstream):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, value in mock_upstream_env().items():
+            monkeypatch.setenv(name, value)
+        results = asyncio.run(run_checks())
+    return {result["name"]: result for result in results}
+
+
+@pytest.mark.parametrize("name", COMPONENTS)
+def test_static_prefix_is_byte_identical(prefix_results, name):
+    result = prefix_results[name]
+    assert result["calls"] >= 2
+    assert result["distinct_prefixes"] == 1
+    assert result["static_tokens"] > 0
+    assert result["errors"] == []
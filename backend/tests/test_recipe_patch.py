@@ -0,0 +1,49 @@
+"""
+菜谱修改补丁的校验和应用
+"""
+
+import pytest
+
+from benchmarks.mock_upstream import MOCK_RECIPE
+from recipe_patch import RecipePatchError, apply_recipe_patch
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        {},
+        {"ingredients": {"remove": [], "upsert": []}},
+        {"instructions": []},
+        {"dish_name": MOCK_RECIPE["dish_name"]},
+        {"ingredients": {"upsert": [dict(MOCK_RECIPE["ingredients"][0])]}},
+    ],
+)
+def test_no_op_patch_rejected(patch):
+    with pytest.raises(RecipePatchError, match="没有任何修改"):
+        apply_recipe_patch(MOCK_RECIPE, patch)
+
+
+def test_upsert_and_step_operations():
+    patch = {
+        "ingredients": {"remove": ["生抽"], "upsert": [{"name": "牛肉", "amount": "250", "unit": "g"}]},
+        "instructions": [
+            {"op": "delete", "step": 2},
+            {"op": "insert_after", "step": 0, "description": "准备食材。"},
+        ],
+    }
+
+    result = apply_recipe_patch(MOCK_RECIPE, patch)
+
+    assert [ing["name"] for ing in result["ingredients"]] == ["牛肉", "洋葱"]
+    assert result["ingredients"][0]["amount"] == 250
+    assert [step["step"] for step in result["instructions"]] == [1, 2, 3, 4]
+    assert result["instructions"][0]["description"] == "准备食材。"
+    # 不修改传入的菜谱
+    assert len(MOCK_RECIPE["ingredients"]) == 3
+
+
+@pytest.mark.parametrize("amount", ["适量", True, None, float("nan"), -1, {"value": 1}])
+def test_upsert_amount_must_be_number(amount):
+    patch = {"ingredients": {"upsert": [{"name": "牛肉", "amount": amount, "unit": "g"}]}}
+    with pytest.raises(RecipePatchError):
+        apply_recipe_patch(MOCK_RECIPE, patch)
@@ -0,0 +1,244 @@
+"""
+UpstreamPolicy 的重试、超时、对冲和熔断，对模拟上游实际发起调用
+"""
+
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from admission import AdmissionScheduler
+from resilience import (
+    CircuitBreaker,
+    UpstreamError,
+    UpstreamPolicy,
+    UpstreamTimeoutError,
+    UpstreamUnavailableError,
+)
+
+
+def make_policy(breaker=None, scheduler=None, **settings) -> UpstreamPolicy:
+    options = {
+        "timeout": 2.0,
+        "total_timeout": 5.0,
+        "max_retries": 2,
+        "backoff_base": 0.01,
+        "backoff_max": 0.05,
+        "hedge": False,
+        "hedge_min_samples": 5,
+    }
+    options.update(settings)
+    return UpstreamPolicy(
+        "test",
+        breaker or CircuitBreaker("test", failure_threshold=0, cooldown_s=1.0),
+        # 默认不限流
+        scheduler or AdmissionScheduler("test", 0, 0, burst_s=10, max_queue=100, max_wait_s=10),
+        **options,
+    )
+
+
+def run(mock_upstream, scenario):
+    """在新的事件循环中执行 scenario(create)，create() 向模拟上游发起一次 Chat Completions 调用"""
+
+    async def main():
+        async with httpx.AsyncClient() as http_client:
+            client = openai.AsyncOpenAI(
+                api_key="sk-mock",
+                base_url=f"{mock_upstream}/v1",
+                http_client=http_client,
+                max_retries=0,
+            )
+
+            def create():
+                return client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": "今天吃什么"}],
+                )
+
+            return await scenario(create)
+
+    return asyncio.run(main())
+
+
+def test_retries_until_upstream_recovers(mock_upstream, faults, upstream_calls):
+    faults(error_rate=1.0, error_status=503)
+    policy = make_policy()
+    attempts = 0
+
+    async def scenario(create):
+        async def flaky():
+            nonlocal attempts
+            attempts += 1
+            try:
+                return await create()
+            finally:
+                # 第一次尝试失败后上游恢复
+                faults(error_rate=0.0)
+
+        return await policy.call(flaky)
+
+    before = upstream_calls()
+    response = run(mock_upstream, scenario)
+
+    assert response.choices[0].message.content
+    assert attempts == 2
+    assert upstream_calls() - before == 2
+    assert policy.retries == 1
+    assert policy.failures == 0
+
+
+def test_gives_up_after_max_retries(mock_upstream, faults, upstream_calls):
+    faults(error_rate=1.0, error_status=503)
+    policy = make_policy(max_retries=2)
+
+    before = upstream_calls()
+    with pytest.raises(UpstreamError) as error:
+        run(mock_upstream, lambda create: policy.call(create))
+
+    assert error.value.status_code == 502
+    assert upstream_calls() - before == 3
+    assert policy.retries == 2
+    assert policy.failures == 1
+
+
+def test_client_errors_are_not_retried(mock_upstream, faults, upstream_calls):
+    faults(error_rate=1.0, error_status=400)
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown_s=1.0)
+    policy = make_policy(breaker)
+
+    before = upstream_calls()
+    with pytest.raises(openai.BadRequestError):
+        run(mock_upstream, lambda create: policy.call(create))
+
+    assert upstream_calls() - before == 1
+    assert policy.retries == 0
+    # 400 说明上游能正常响应，不计入熔断
+    assert breaker.state == "closed"
+
+
+def test_attempt_timeout(mock_upstream, faults):
+    faults(timeout_rate=1.0, timeout_s=5.0)
+    policy = make_policy(timeout=0.3, max_retries=1)
+
+    start = time.monotonic()
+    with pytest.raises(UpstreamTimeoutError) as error:
+        run(mock_upstream, lambda create: policy.call(create))
+
+    assert error.value.status_code == 504
+    assert policy.timeouts == 2
+    assert time.monotonic() - start < 2.0
+
+
+def test_budget_shorter_than_total_timeout(mock_upstream, faults):
+    faults(timeout_rate=1.0, timeout_s=5.0)
+    policy = make_policy(timeout=2.0, max_retries=2)
+    breaker = policy.breaker
+
+    start = time.monotonic()
+    with pytest.raises(UpstreamTimeoutError):
+        run(mock_upstream, lambda create: policy.call(create, budget_s=0.3))
+
+    assert time.monotonic() - start < 1.5
+    # 因为调用方时间不够而缩短的尝试超时不计入熔断
+    assert breaker.consecutive_failures == 0
+
+
+def test_hedge_wins_over_slow_attempt(mock_upstream, faults):
+    faults(latency_ms=20)
+    policy = make_policy(hedge=True, hedge_min_samples=5)
+    first_slow = True
+
+    async def scenario(create):
+        # 积累延迟样本，之后超过 p95 仍未返回的尝试会被对冲
+        for _ in range(policy.hedge_min_samples):
+            await policy.call(create)
+
+        async def sometimes_slow():
+            nonlocal first_slow
+            if first_slow:
+                first_slow = False
+                await asyncio.sleep(3.0)
+            return await create()
+
+        start = time.monotonic()
+        response = await policy.call(sometimes_slow)
+        return response, time.monotonic() - start
+
+    response, elapsed = run(mock_upstream, scenario)
+
+    assert response.choices[0].message.content
+    assert elapsed < 1.0
+    assert policy.hedges == 1
+    assert policy.hedge_wins == 1
+
+
+def test_no_hedge_without_enough_samples(mock_upstream, faults):
+    faults(latency_ms=200)
+    policy = make_policy(hedge=True, hedge_min_samples=5)
+
+    run(mock_upstream, lambda create: policy.call(create))
+
+    assert policy.hedges == 0
+
+
+def test_breaker_opens_and_recovers(mock_upstream, faults, upstream_calls):
+    faults(error_rate=1.0, error_status=500)
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_s=0.3)
+    policy = make_policy(breaker, max_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            run(mock_upstream, lambda create: policy.call(create))
+    assert breaker.state == "open"
+    assert breaker.times_opened == 1
+
+    # 熔断期间不调用上游
+    before = upstream_calls()
+    with pytest.raises(UpstreamUnavailableError) as error:
+        run(mock_upstream, lambda create: policy.call(create))
+    assert error.value.status_code == 503
+    assert error.value.retry_after >= 1.0
+    assert upstream_calls() == before
+    assert breaker.rejected == 1
+
+    # 冷却结束后的探测调用成功，熔断器关闭
+    faults(error_rate=0.0)
+    time.sleep(0.35)
+    run(mock_upstream, lambda create: policy.call(create))
+    assert breaker.state == "closed"
+    assert breaker.consecutive_failures == 0
+
+
+def test_failed_probe_reopens_breaker(mock_upstream, faults, upstream_calls):
+    faults(error_rate=1.0, error_status=500)
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown_s=0.3)
+    policy = make_policy(breaker, max_retries=0)
+
+    with pytest.raises(UpstreamError):
+        run(mock_upstream, lambda create: policy.call(create))
+    assert breaker.state == "open"
+
+    time.sleep(0.35)
+    before = upstream_calls()
+    with pytest.raises(UpstreamError) as error:
+        run(mock_upstream, lambda create: policy.call(create))
+    # 半开状态放行了一次探测调用，失败后重新打开
+    assert not isinstance(error.value, UpstreamUnavailableError)
+    assert upstream_calls() - before == 1
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+
+
+def test_cancelled_attempts_return_reserved_tokens(mock_upstream, faults):
+    faults(timeout_rate=1.0, timeout_s=5.0)
+    scheduler = AdmissionScheduler("test", 0, 60_000, burst_s=10, max_queue=100, max_wait_s=10)
+    policy = make_policy(scheduler=scheduler, timeout=0.2, max_retries=1)
+    capacity = scheduler.tokens.level
+
+    with pytest.raises(UpstreamTimeoutError):
+        run(mock_upstream, lambda create: policy.call(create))
+
+    # 超时被取消的尝试不能一直占着预扣的 token
+    assert scheduler.tokens.level == pytest.approx(capacity, abs=50)
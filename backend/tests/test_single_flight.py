@@ -0,0 +1,66 @@
+"""
+请求合并：相同请求共享一次上游调用，有截止时间的调用方不等待可能比它更晚结束的调用
+"""
+
+import asyncio
+
+from single_flight import SingleFlight
+
+
+def run_concurrently(single_flight, leader_budget, follower_budget):
+    """先发起一个调用，再在它进行中时发起相同键的调用，返回 (两者的结果, 实际执行次数)"""
+    executions = 0
+
+    async def call():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.05)
+        return {"value": executions}
+
+    async def main():
+        leader = asyncio.ensure_future(single_flight.do("key", call, budget_s=leader_budget))
+        await asyncio.sleep(0)
+        follower = single_flight.do("key", call, budget_s=follower_budget)
+        return await asyncio.gather(leader, follower)
+
+    results = asyncio.run(main())
+    return results, executions
+
+
+def test_concurrent_calls_share_one_execution():
+    single_flight = SingleFlight("test")
+
+    (leader, follower), executions = run_concurrently(single_flight, None, None)
+
+    assert executions == 1
+    assert leader == follower
+    assert leader is not follower
+    assert single_flight.coalesced == 1
+
+
+def test_joins_call_that_ends_before_own_deadline():
+    single_flight = SingleFlight("test")
+
+    _, executions = run_concurrently(single_flight, 5.0, 20.0)
+
+    assert executions == 1
+    assert single_flight.coalesced == 1
+
+
+def test_tighter_deadline_does_not_wait_for_longer_call():
+    single_flight = SingleFlight("test")
+
+    _, executions = run_concurrently(single_flight, 20.0, 5.0)
+
+    assert executions == 2
+    assert single_flight.bypassed == 1
+    assert single_flight.coalesced == 0
+
+
+def test_deadline_does_not_wait_for_unbounded_call():
+    single_flight = SingleFlight("test")
+
+    _, executions = run_concurrently(single_flight, None, 5.0)
+
+    assert executions == 2
+    assert single_flight.bypassed == 1
@@ -0,0 +1,117 @@
+"""
+图片上传的内存占用：上传的原图不整体读入内存，超限的分块上传尽早中止
+"""
+
+import asyncio
+import base64
+import io
+import os
+import tempfile
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException
+
+from benchmarks.bench_upload_memory import noise_jpeg
+from ingredient_analyzer import IngredientAnalyzer
+from upload_limit import UploadSizeLimitMiddleware
+
+UPLOAD_PATH = "/api/v1/ingredients/analyze"
+
+
+def traced_peak(func):
+    """执行 func()，返回 (结果, 执行期间 Python 分配的峰值字节数)"""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+@pytest.fixture(scope="module")
+def upload_file():
+    """与手机原图体积相当的 JPEG（约 6 MB），写入临时文件模拟落盘的上传文件"""
+    data = noise_jpeg(3000, 2250)
+    with tempfile.TemporaryFile() as f:
+        f.write(data)
+        yield f, len(data)
+
+
+def test_preprocess_and_encode_do_not_materialize_upload(upload_file):
+    f, size = upload_file
+    analyzer = IngredientAnalyzer(api_key="unused")
+    # 先处理一张小图，排除首次导入编码器等一次性分配
+    analyzer._encode_image(*analyzer._prepare_image(io.BytesIO(noise_jpeg(64, 64)))[:2])
+
+    def process():
+        f.seek(0)
+        image_data, mime_type, _ = analyzer._prepare_image(f)
+        return analyzer._encode_image(image_data, mime_type)
+
+    data_url, peak = traced_peak(process)
+
+    assert data_url.startswith("data:image/jpeg;base64,")
+    # 原图只从文件解码，Python 对象中不会出现原图的完整拷贝
+    assert peak < size / 2, f"峰值 {peak / 1e6:.1f} MB，上传 {size / 1e6:.1f} MB"
+
+
+def test_encode_image_matches_base64():
+    analyzer = IngredientAnalyzer(api_key="unused")
+    # 长度不是分块大小的整数倍，也不是 3 的倍数
+    image_data = os.urandom(3 * 1024 * 1024 + 1)
+
+    data_url = analyzer._encode_image(image_data, "image/jpeg")
+
+    assert data_url == "data:image/jpeg;base64," + base64.b64encode(image_data).decode("ascii")
+
+
+def test_chunked_upload_aborted_once_limit_exceeded():
+    max_bytes = 1024 * 1024
+    chunk = b"x" * (64 * 1024)
+    chunks_read = 0
+
+    async def receive():
+        nonlocal chunks_read
+        chunks_read += 1
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    async def app(scope, receive, send):
+        # 与 FastAPI 解析请求体一样一直读到结束
+        while (await receive()).get("more_body"):
+            pass
+
+    async def send(message):
+        pass
+
+    middleware = UploadSizeLimitMiddleware(app, max_bytes, [UPLOAD_PATH])
+    scope = {"type": "http", "path": UPLOAD_PATH, "headers": []}
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(middleware(scope, receive, send))
+
+    assert error.value.status_code == 413
+    # 超过上限的那一块读完后立即中止，不会继续读入剩余的请求体
+    assert chunks_read == max_bytes // len(chunk) + 1
+
+
+@pytest.mark.parametrize(
+    "content_length, status", [(b"999999999", 413), (b"12abc", 400)]
+)
+def test_declared_length_rejected_before_reading_body(content_length, status):
+    sent = []
+
+    async def receive():
+        raise AssertionError("不应读取请求体")
+
+    async def app(scope, receive, send):
+        await receive()
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = UploadSizeLimitMiddleware(app, 1024 * 1024, [UPLOAD_PATH])
+    scope = {"type": "http", "path": UPLOAD_PATH, "headers": [(b"content-length", content_length)]}
+    asyncio.run(middleware(scope, receive, send))
+
+    assert sent[0]["status"] == status
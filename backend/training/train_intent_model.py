@@ -0,0 +1,153 @@
+"""
+训练意图识别的本地模型（逻辑回归），输出 backend/intent_model.json
+
+用法（在 backend 目录下运行）：
+
+    python -m training.train_intent_model
+    python -m training.train_intent_model --l2 0.001 --epochs 60
+
+训练数据在 training/intent_corpus.jsonl，每行 {"text": ..., "label": 1/0}，
+1 表示菜谱生成需求。修改语料或 intent_classifier.extract_features 之后需要重新训练。
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+from typing import Dict, List, Tuple
+
+from cache import normalize_text
+from intent_classifier import DEFAULT_MODEL_PATH, IntentModel, extract_features
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_corpus.jsonl")
+
+Example = Tuple[List[str], int]
+
+
+def load_corpus(path: str) -> List[Tuple[str, int]]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], int(row["label"])) for row in rows]
+
+
+def train(
+    examples: List[Example], epochs: int, learning_rate: float, l2: float, seed: int
+) -> Tuple[float, Dict[str, float]]:
+    """带 L2 正则的逻辑回归，随机梯度下降"""
+    rng = random.Random(seed)
+    order = list(examples)
+    bias = 0.0
+    weights: Dict[str, float] = {}
+
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        rate = learning_rate / (1 + epoch * 0.1)
+        for features, label in order:
+            score = bias + sum(weights.get(feature, 0.0) for feature in features)
+            probability = 1.0 / (1.0 + math.exp(-max(min(score, 30.0), -30.0)))
+            error = probability - label
+            bias -= rate * error
+            for feature in features:
+                weight = weights.get(feature, 0.0)
+                weights[feature] = weight - rate * (error + l2 * weight)
+
+    return bias, weights
+
+
+def evaluate(model: IntentModel, rows: List[Tuple[str, int]], threshold: float) -> Dict[str, float]:
+    """准确率，以及置信度达到阈值的样本占比和其中的准确率"""
+    correct = confident = confident_correct = 0
+    for text, label in rows:
+        probability = model.predict_proba(normalize_text(text))
+        predicted = int(probability >= 0.5)
+        correct += predicted == label
+        if max(probability, 1 - probability) >= threshold:
+            confident += 1
+            confident_correct += predicted == label
+    return {
+        "accuracy": correct / len(rows),
+        "confident_rate": confident / len(rows),
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+    }
+
+
+def cross_validate(rows, folds: int, threshold: float, **train_args) -> Dict[str, float]:
+    rng = random.Random(train_args["seed"])
+    shuffled = list(rows)
+    rng.shuffle(shuffled)
+
+    totals = {"accuracy": 0.0, "confident_rate": 0.0, "confident_accuracy": 0.0}
+    for fold in range(folds):
+        held_out = shuffled[fold::folds]
+        training = [row for i, row in enumerate(shuffled) if i % folds != fold]
+        bias, weights = train(
+            [(extract_features(normalize_text(text)), label) for text, label in training],
+            **train_args,
+        )
+        for key, value in evaluate(IntentModel(bias, weights), held_out, threshold).items():
+            totals[key] += value / folds
+    return totals
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--corpus", default=CORPUS_PATH)
+    arg_parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    arg_parser.add_argument("--epochs", type=int, default=40)
+    arg_parser.add_argument("--learning-rate", type=float, default=0.3)
+    arg_parser.add_argument("--l2", type=float, default=0.002)
+    arg_parser.add_argument("--threshold", type=float, default=0.85)
+    arg_parser.add_argument("--folds", type=int, default=5)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+
+    rows = load_corpus(args.corpus)
+    train_args = {
+        "epochs": args.epochs,
+        "learning_rate": args.learning_rate,
+        "l2": args.l2,
+        "seed": args.seed,
+    }
+
+    positives = sum(label for _, label in rows)
+    print(f"语料: {len(rows)} 条（菜谱需求 {positives}，其他 {len(rows) - positives}）")
+
+    validation = cross_validate(rows, args.folds, args.threshold, **train_args)
+    print(
+        f"{args.folds} 折交叉验证: 准确率 {validation['accuracy']:.1%}  "
+        f"置信度≥{args.threshold} 的占比 {validation['confident_rate']:.1%}，"
+        f"其中准确率 {validation['confident_accuracy']:.1%}"
+    )
+
+    bias, weights = train(
+        [(extract_features(normalize_text(text)), label) for text, label in rows],
+        **train_args,
+    )
+    # 丢弃几乎为零的权重，减小模型文件
+    weights = {
+        feature: round(weight, 4)
+        for feature, weight in sorted(weights.items())
+        if abs(weight) >= 0.001
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "type": "logistic_regression",
+                "features": "char unigram + bigram + lexicon categories + length bucket",
+                "trained_on": len(rows),
+                "cross_validation": {key: round(value, 4) for key, value in validation.items()},
+                "bias": round(bias, 4),
+                "weights": weights,
+            },
+            f,
+            ensure_ascii=False,
+            indent=0,
+        )
+        f.write("\n")
+    print(f"✅ 模型已保存: {args.output}（{len(weights)} 个特征）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+from typing import Iterable
+
+from fastapi import HTTPException
+
+
+class UploadSizeLimitMiddleware:
+    """
+    限制指定路径的请求体大小
+
+    - 声明了 Content-Length 且超限的请求在读取请求体之前直接返回 413，Content-Length 不是整数时返回 400
+    - 分块上传（没有 Content-Length）在累计字节数超限时立即中止并返回 413
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                await self._reject(send, 400, "Content-Length 格式错误")
+                return
+            if declared > self.max_bytes:
+                await self._reject(send, 413, self._detail())
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI 解析请求体时会原样抛出 HTTPException，由异常处理返回 413
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"上传文件过大，最大允许 {self.max_bytes // (1024 * 1024)} MB"
+
+    async def _reject(self, send, status: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
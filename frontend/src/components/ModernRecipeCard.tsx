@@ -149,152 +149,154 @@ export default function ModernRecipeCard({ recipe }: ModernRecipeCardProps) {
         </div>
       </div>
 
-      {/* 营养卡片 - 独立成行 */}
-      <div
-        style={{
-          backgroundColor: 'linear-gradient(135deg, #f0fdf4 0%, #ecfeff 100%)',
-          borderRadius: '12px',
-          padding: '24px',
-          marginBottom: '24px',
-          boxShadow:
-            '0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06)',
-          border: '1px solid #e5e7eb',
-        }}
-      >
-        <h3
-          style={{
-            fontSize: '1.25rem',
-            fontWeight: 'bold',
-            color: '#1f2937',
-            marginBottom: '20px',
-            display: 'flex',
-            alignItems: 'center',
-            gap: '8px',
-          }}
-        >
-          📊 营养成分
-        </h3>
-
+      {/* 营养卡片 - 独立成行（时间不够时服务端会省略营养信息） */}
+      {recipe.nutritional_info && (
         <div
           style={{
-            display: 'grid',
-            gridTemplateColumns: 'repeat(auto-fit, minmax(120px, 1fr))',
-            gap: '16px',
+            backgroundColor: 'linear-gradient(135deg, #f0fdf4 0%, #ecfeff 100%)',
+            borderRadius: '12px',
+            padding: '24px',
+            marginBottom: '24px',
+            boxShadow:
+              '0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06)',
+            border: '1px solid #e5e7eb',
           }}
         >
-          <div
+          <h3
             style={{
-              backgroundColor: 'white',
-              borderRadius: '8px',
-              padding: '16px',
-              textAlign: 'center',
-              boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
-              border: '1px solid #f3f4f6',
+              fontSize: '1.25rem',
+              fontWeight: 'bold',
+              color: '#1f2937',
+              marginBottom: '20px',
+              display: 'flex',
+              alignItems: 'center',
+              gap: '8px',
             }}
           >
-            <div style={{ fontSize: '24px', marginBottom: '4px' }}>🔥</div>
-            <div
-              style={{
-                fontSize: '24px',
-                fontWeight: 'bold',
-                color: '#10b981',
-                marginBottom: '4px',
-              }}
-            >
-              {recipe.nutritional_info.calories_kcal}
-            </div>
-            <div
-              style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
-            >
-              千卡
-            </div>
-          </div>
+            📊 营养成分
+          </h3>
 
           <div
             style={{
-              backgroundColor: 'white',
-              borderRadius: '8px',
-              padding: '16px',
-              textAlign: 'center',
-              boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
-              border: '1px solid #f3f4f6',
+              display: 'grid',
+              gridTemplateColumns: 'repeat(auto-fit, minmax(120px, 1fr))',
+              gap: '16px',
             }}
           >
-            <div style={{ fontSize: '24px', marginBottom: '4px' }}>💪</div>
             <div
               style={{
-                fontSize: '24px',
-                fontWeight: 'bold',
-                color: '#3b82f6',
-                marginBottom: '4px',
+                backgroundColor: 'white',
+                borderRadius: '8px',
+                padding: '16px',
+                textAlign: 'center',
+                boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
+                border: '1px solid #f3f4f6',
               }}
             >
-              {recipe.nutritional_info.protein_g}
-            </div>
-            <div
-              style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
-            >
-              蛋白质(g)
+              <div style={{ fontSize: '24px', marginBottom: '4px' }}>🔥</div>
+              <div
+                style={{
+                  fontSize: '24px',
+                  fontWeight: 'bold',
+                  color: '#10b981',
+                  marginBottom: '4px',
+                }}
+              >
+                {recipe.nutritional_info.calories_kcal}
+              </div>
+              <div
+                style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
+              >
+                千卡
+              </div>
             </div>
-          </div>
 
-          <div
-            style={{
-              backgroundColor: 'white',
-              borderRadius: '8px',
-              padding: '16px',
-              textAlign: 'center',
-              boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
-              border: '1px solid #f3f4f6',
-            }}
-          >
-            <div style={{ fontSize: '24px', marginBottom: '4px' }}>🌾</div>
             <div
               style={{
-                fontSize: '24px',
-                fontWeight: 'bold',
-                color: '#f59e0b',
-                marginBottom: '4px',
+                backgroundColor: 'white',
+                borderRadius: '8px',
+                padding: '16px',
+                textAlign: 'center',
+                boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
+                border: '1px solid #f3f4f6',
               }}
             >
-              {recipe.nutritional_info.carbs_g}
-            </div>
-            <div
-              style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
-            >
-              碳水(g)
+              <div style={{ fontSize: '24px', marginBottom: '4px' }}>💪</div>
+              <div
+                style={{
+                  fontSize: '24px',
+                  fontWeight: 'bold',
+                  color: '#3b82f6',
+                  marginBottom: '4px',
+                }}
+              >
+                {recipe.nutritional_info.protein_g}
+              </div>
+              <div
+                style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
+              >
+                蛋白质(g)
+              </div>
             </div>
-          </div>
 
-          <div
-            style={{
-              backgroundColor: 'white',
-              borderRadius: '8px',
-              padding: '16px',
-              textAlign: 'center',
-              boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
-              border: '1px solid #f3f4f6',
-            }}
-          >
-            <div style={{ fontSize: '24px', marginBottom: '4px' }}>🥑</div>
             <div
               style={{
-                fontSize: '24px',
-                fontWeight: 'bold',
-                color: '#8b5cf6',
-                marginBottom: '4px',
+                backgroundColor: 'white',
+                borderRadius: '8px',
+                padding: '16px',
+                textAlign: 'center',
+                boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
+                border: '1px solid #f3f4f6',
               }}
             >
-              {recipe.nutritional_info.fat_g}
+              <div style={{ fontSize: '24px', marginBottom: '4px' }}>🌾</div>
+              <div
+                style={{
+                  fontSize: '24px',
+                  fontWeight: 'bold',
+                  color: '#f59e0b',
+                  marginBottom: '4px',
+                }}
+              >
+                {recipe.nutritional_info.carbs_g}
+              </div>
+              <div
+                style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
+              >
+                碳水(g)
+              </div>
             </div>
+
             <div
-              style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
+              style={{
+                backgroundColor: 'white',
+                borderRadius: '8px',
+                padding: '16px',
+                textAlign: 'center',
+                boxShadow: '0 1px 3px 0 rgba(0, 0, 0, 0.1)',
+                border: '1px solid #f3f4f6',
+              }}
             >
-              脂肪(g)
+              <div style={{ fontSize: '24px', marginBottom: '4px' }}>🥑</div>
+              <div
+                style={{
+                  fontSize: '24px',
+                  fontWeight: 'bold',
+                  color: '#8b5cf6',
+                  marginBottom: '4px',
+                }}
+              >
+                {recipe.nutritional_info.fat_g}
+              </div>
+              <div
+                style={{ fontSize: '12px', color: '#6b7280', fontWeight: '500' }}
+              >
+                脂肪(g)
+              </div>
             </div>
           </div>
         </div>
-      </div>
+      )}
 
       {/* 食材+步骤 响应式布局 */}
       <div
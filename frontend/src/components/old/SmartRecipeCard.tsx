@@ -128,13 +128,17 @@ export default function SmartRecipeCard({ recipe }: SmartRecipeCardProps) {
         ))}
       </ol>
 
-      <h4>营养信息:</h4>
-      <p>
-        热量: {recipe.nutritional_info.calories_kcal} 千卡 | 蛋白质:{' '}
-        {recipe.nutritional_info.protein_g}g | 碳水化合物:{' '}
-        {recipe.nutritional_info.carbs_g}g | 脂肪:{' '}
-        {recipe.nutritional_info.fat_g}g
-      </p>
+      {recipe.nutritional_info && (
+        <>
+          <h4>营养信息:</h4>
+          <p>
+            热量: {recipe.nutritional_info.calories_kcal} 千卡 | 蛋白质:{' '}
+            {recipe.nutritional_info.protein_g}g | 碳水化合物:{' '}
+            {recipe.nutritional_info.carbs_g}g | 脂肪:{' '}
+            {recipe.nutritional_info.fat_g}g
+          </p>
+        </>
+      )}
 
       {recipe.tips && recipe.tips.length > 0 && (
         <>
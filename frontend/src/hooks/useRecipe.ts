@@ -9,6 +9,35 @@ import {
   RECIPE_GENERATE_IMAGE_URL,
 } from '../config/api';
 
+// 优先只发送 recipe_id，服务端会话不存在（404，例如已过期）时再上传完整内容
+async function postWithRecipeId(
+  url: string,
+  recipe: Recipe,
+  byId: Record<string, unknown>,
+  full: Record<string, unknown>
+): Promise<Response> {
+  const post = (body: Record<string, unknown>) =>
+    fetch(url, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body),
+    });
+
+  if (recipe.recipe_id) {
+    const response = await post({
+      ...byId,
+      recipe_id: recipe.recipe_id,
+      version: recipe.version,
+    });
+    if (response.status !== 404) {
+      return response;
+    }
+  }
+  return post(full);
+}
+
 export function useRecipe() {
   const dispatch = useAppDispatch();
   const { simulateProgress, completeProgress, hideProgress } = useProgress();
@@ -82,17 +111,16 @@ export function useRecipe() {
         content: msg.content,
       }));
 
-      const response = await fetch(RECIPE_OPTIMIZE_URL, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
+      const response = await postWithRecipeId(
+        RECIPE_OPTIMIZE_URL,
+        currentRecipe,
+        { user_request: userRequest },
+        {
           current_recipe: currentRecipe,
           user_request: userRequest,
           conversation_history: historyData,
-        }),
-      });
+        }
+      );
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
@@ -148,13 +176,12 @@ export function useRecipe() {
     );
 
     try {
-      const response = await fetch(RECIPE_GENERATE_IMAGE_URL, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ recipe_json: recipe }),
-      });
+      const response = await postWithRecipeId(
+        RECIPE_GENERATE_IMAGE_URL,
+        recipe,
+        {},
+        { recipe_json: recipe }
+      );
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
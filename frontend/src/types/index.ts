@@ -26,9 +26,15 @@ export interface Recipe {
   servings: number;
   ingredients: Ingredient[];
   instructions: Instruction[];
-  tips: string[];
-  nutritional_info: NutritionalInfo;
+  // 生成时间不够时服务端可能省略这两项，见 degradations
+  tips?: string[];
+  nutritional_info?: NutritionalInfo;
   image_url?: string;
+  // 服务端保存的菜谱会话，之后的优化和生成图片只需要传这两个字段
+  recipe_id?: string;
+  version?: number;
+  // 为了在截止时间内返回而采用的降级，例如 local_parse、omit_tips
+  degradations?: string[];
 }
 
 // 对话相关类型